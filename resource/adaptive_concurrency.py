@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+AIMD adaptive concurrency limit for segment streams, per server endpoint.
+
+A static cap is too low on a quiet server and overloads it at peak. Like TCP
+congestion control, AIMDLimiter grows the number of in-flight segment streams by
+about one per window of requests whose TTFB stays under the target, and cuts it
+multiplicatively on a latency spike, timeout or server error. Only one cut is
+taken per window: requests that started before the last cut report latencies
+caused by the old limit, so they cannot cut again. Every change is recorded so
+the limit's history can be reported with the run metrics.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease limit on concurrent streams to one endpoint"""
+    def __init__(self, endpoint: str, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 64,
+                 target_ttfb: float = 0.5, increase: float = 1.0, decrease: float = 0.5):
+        self.endpoint = endpoint
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_ttfb = target_ttfb
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.wait_time = 0.0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = None
+        # (seconds since creation, limit, reason) for every change
+        self._created = time.time()
+        self.history: List[Tuple[float, float, str]] = [(0.0, self.limit, 'initial')]
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns the start time to pass back to release()"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            if not self._has_room():
+                wait_start = time.time()
+                await self._condition.wait_for(self._has_room)
+                self.wait_time += time.time() - wait_start
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.time()
+
+    async def release(self, started: float, ttfb: float = None, failed: bool = False):
+        """
+        Return a slot and adjust the limit from the stream's outcome.
+
+        Args:
+            started: Value returned by acquire()
+            ttfb: Measured time to first chunk, None if unknown (e.g. cancelled)
+            failed: The stream hit a timeout or server error
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            if failed or (ttfb is not None and ttfb > self.target_ttfb):
+                if started >= self._last_decrease:
+                    self._set_limit(max(self.limit * self.decrease, self.min_limit),
+                                    'error' if failed else f'ttfb {ttfb:.3f}s')
+                    self._last_decrease = time.time()
+                    self.decreases += 1
+            elif ttfb is not None:
+                # About +increase per window of `limit` requests under target
+                self._set_limit(min(self.limit + self.increase / self.limit, self.max_limit), 'increase')
+            self._condition.notify_all()
+
+    def _set_limit(self, limit: float, reason: str):
+        if limit == self.limit:
+            return
+        self.limit = limit
+        self.history.append((time.time() - self._created, limit, reason))
+
+    def stats(self) -> dict:
+        limits = [limit for _, limit, _ in self.history]
+        return {
+            'endpoint': self.endpoint,
+            'limit': self.limit,
+            'min_limit_seen': min(limits),
+            'max_limit_seen': max(limits),
+            'decreases': self.decreases,
+            'peak_in_flight': self.peak_in_flight,
+            'wait_time': self.wait_time,
+            'history': list(self.history),
+        }
+
+
+class EndpointLimiters:
+    """One AIMDLimiter per endpoint, created on first use with shared settings"""
+    def __init__(self, **limiter_kwargs):
+        self._limiter_kwargs = limiter_kwargs
+        self._limiters: Dict[str, AIMDLimiter] = {}
+
+    def get(self, endpoint: str) -> AIMDLimiter:
+        if endpoint not in self._limiters:
+            self._limiters[endpoint] = AIMDLimiter(endpoint, **self._limiter_kwargs)
+        return self._limiters[endpoint]
+
+    def stats(self) -> Dict[str, dict]:
+        return {endpoint: limiter.stats() for endpoint, limiter in self._limiters.items()}
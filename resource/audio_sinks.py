@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+Streaming audio sinks for the TTS clients.
+
+Each sink encodes audio chunk-by-chunk as it arrives instead of writing the whole
+result at the end: PCM16 WAV (header patched at close), FLAC and Ogg/Opus through
+libsndfile, raw PCM16 for piping into a player, and 8 kHz G.711 for telephony
+(see telephony.py). Every sink records its
+time-to-first-byte and output size so formats can be compared.
+
+Usage:
+# Compare formats offline by streaming an existing file through every sink
+python3 audio_sinks.py --bench output.wav
+
+# Pipe raw PCM from the client into a player
+python3 client_grpc_simple.py --output-format raw --output-path - | aplay -f S16_LE -r 24000 -c 1
+"""
+
+import argparse
+import functools
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+
+
+def float_to_int16(samples: np.ndarray, dither: bool = True, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Convert float audio in [-1, 1] to int16 in one vectorized pass.
+
+    Args:
+        samples: Float audio samples
+        dither: Add triangular (TPDF) dither of +/-1 LSB before rounding
+        rng: Random generator for the dither noise
+
+    Returns:
+        int16 samples, clipped to the valid range
+    """
+    scaled = np.multiply(samples, 32767.0, dtype=np.float32)
+    if dither and len(scaled):
+        rng = rng or np.random.default_rng()
+        scaled += rng.random(len(scaled), dtype=np.float32)
+        scaled -= rng.random(len(scaled), dtype=np.float32)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+
+def encode_pcm16(samples: np.ndarray, dither: bool = True, rng: np.random.Generator = None) -> bytes:
+    """Encode float audio as little-endian PCM16 bytes"""
+    return float_to_int16(samples, dither, rng).astype('<i2', copy=False).tobytes()
+
+
+class AudioSink:
+    """Base class: incremental write of mono float32 audio with TTFB and size accounting"""
+    format_name = 'base'
+    # Picklable samples -> bytes function when encoding is stateless and may run in another
+    # process; the encoded payload is then handed to write_encoded() in order
+    encode_chunk = None
+    # 'pcm16' when write_encoded() takes little-endian int16 bytes as they are
+    payload_format = None
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.samples_written = 0
+        self.bytes_written = 0
+        self.start_time = time.time()
+        self.first_byte_time = None
+
+    def write(self, samples: np.ndarray):
+        if len(samples) == 0:
+            return
+        self._write(samples)
+        self.samples_written += len(samples)
+        if self.first_byte_time is None:
+            self.first_byte_time = time.time()
+
+    def write_encoded(self, payload: bytes, num_samples: int):
+        """Write a payload produced by `encode_chunk`, possibly in a worker process"""
+        if num_samples == 0:
+            return
+        self._write_payload(payload)
+        self.samples_written += num_samples
+        if self.first_byte_time is None:
+            self.first_byte_time = time.time()
+
+    def end_segment(self):
+        """Called in order between the segments of an utterance; stages that care override it"""
+
+    def close(self):
+        raise NotImplementedError
+
+    def _write(self, samples: np.ndarray):
+        raise NotImplementedError
+
+    def _write_payload(self, payload: bytes):
+        raise NotImplementedError
+
+    @property
+    def time_to_first_byte(self):
+        if self.first_byte_time is None:
+            return None
+        return self.first_byte_time - self.start_time
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Pcm16WavSink(AudioSink):
+    """PCM16 WAV written incrementally; RIFF/data sizes are patched in at close"""
+    format_name = 'wav16'
+    payload_format = 'pcm16'
+
+    def __init__(self, path: str, sample_rate: int, dither: bool = True):
+        super().__init__(sample_rate)
+        self._file = open(path, 'wb')
+        self._dither = dither
+        self._rng = np.random.default_rng()
+        self._data_bytes = 0
+        self._file.write(self._header(0))
+        self.encode_chunk = functools.partial(encode_pcm16, dither=dither)
+
+    def _header(self, data_bytes: int) -> bytes:
+        return (b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE'
+                + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, self.sample_rate,
+                                        self.sample_rate * 2, 2, 16)
+                + b'data' + struct.pack('<I', data_bytes))
+
+    def _write(self, samples: np.ndarray):
+        self._write_payload(encode_pcm16(samples, self._dither, self._rng))
+
+    def _write_payload(self, payload: bytes):
+        self._file.write(payload)
+        self._data_bytes += len(payload)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self._data_bytes))
+        self._file.close()
+        self.bytes_written = self._data_bytes + 44
+
+
+class SoundFileSink(AudioSink):
+    """Compressed or float output encoded incrementally by libsndfile"""
+    def __init__(self, path: str, sample_rate: int, major_format: str, subtype: str, format_name: str,
+                 dither: bool = True):
+        super().__init__(sample_rate)
+        self.format_name = format_name
+        self._path = path
+        # Integer PCM subtypes get our dithered conversion; lossy/float ones take float32 as is
+        self._to_int16 = subtype == 'PCM_16'
+        self._dither = dither
+        self._rng = np.random.default_rng()
+        self._file = sf.SoundFile(path, 'w', samplerate=sample_rate, channels=1,
+                                  format=major_format, subtype=subtype)
+
+    def _write(self, samples: np.ndarray):
+        if self._to_int16:
+            self._file.write(float_to_int16(samples, self._dither, self._rng))
+        else:
+            self._file.write(np.asarray(samples, dtype=np.float32))
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        self.bytes_written = os.path.getsize(self._path)
+
+
+class RawPcmSink(AudioSink):
+    """Headerless PCM16 little-endian, flushed per chunk for piping into a player"""
+    format_name = 'raw'
+    payload_format = 'pcm16'
+
+    def __init__(self, path: str, sample_rate: int, dither: bool = True):
+        super().__init__(sample_rate)
+        self._to_stdout = path == '-'
+        self._file = sys.stdout.buffer if self._to_stdout else open(path, 'wb')
+        self._dither = dither
+        self._rng = np.random.default_rng()
+        self.encode_chunk = functools.partial(encode_pcm16, dither=dither)
+
+    def _write(self, samples: np.ndarray):
+        self._write_payload(encode_pcm16(samples, self._dither, self._rng))
+
+    def _write_payload(self, payload: bytes):
+        self._file.write(payload)
+        self._file.flush()
+        self.bytes_written += len(payload)
+
+    def close(self):
+        if self._to_stdout:
+            self._file.flush()
+        elif not self._file.closed:
+            self._file.close()
+
+
+class TimelineSink(AudioSink):
+    """Discards audio but records (arrival time, samples) per write, for playout simulation"""
+    format_name = 'timeline'
+
+    def __init__(self, sample_rate: int):
+        super().__init__(sample_rate)
+        self.events = []
+
+    def _write(self, samples: np.ndarray):
+        self.events.append((time.time(), len(samples)))
+
+    def close(self):
+        pass
+
+
+# format name -> (libsndfile format, subtype); None marks sinks implemented here
+SINK_FORMATS = {
+    'wav16': None,
+    'wav-float': ('WAV', 'FLOAT'),
+    'flac': ('FLAC', 'PCM_16'),
+    'opus': ('OGG', 'OPUS'),
+    'vorbis': ('OGG', 'VORBIS'),
+    'raw': None,
+    'ulaw': None,
+    'alaw': None,
+}
+
+
+def open_sink(path: str, output_format: str, sample_rate: int, dither: bool = True) -> AudioSink:
+    """Create the streaming sink for an output format name from SINK_FORMATS"""
+    if output_format == 'wav16':
+        return Pcm16WavSink(path, sample_rate, dither)
+    if output_format == 'raw':
+        return RawPcmSink(path, sample_rate, dither)
+    if output_format in ('ulaw', 'alaw'):
+        # 8 kHz G.711 in 20 ms frames; imported here as telephony builds on this module
+        from telephony import TelephonySink
+        return TelephonySink(path, sample_rate, law=output_format, dither=dither)
+    if output_format not in SINK_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    major_format, subtype = SINK_FORMATS[output_format]
+    return SoundFileSink(path, sample_rate, major_format, subtype, output_format, dither)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark streaming sinks: time to first byte and output size per format',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--bench', type=str, required=True, help='Mono audio file to stream through every sink')
+    parser.add_argument('--chunk-duration', type=float, default=0.5, help='Seconds of audio per written chunk')
+    parser.add_argument('--output-dir', type=str, default='.', help='Directory for the encoded files')
+    args = parser.parse_args()
+
+    audio, sample_rate = sf.read(args.bench, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    chunk_samples = max(int(args.chunk_duration * sample_rate), 1)
+    stem = os.path.splitext(os.path.basename(args.bench))[0]
+    extensions = {'wav16': 'wav', 'wav-float': 'f32.wav', 'flac': 'flac', 'opus': 'opus',
+                  'vorbis': 'ogg', 'raw': 'pcm', 'ulaw': 'ulaw.wav', 'alaw': 'alaw.wav'}
+
+    for output_format in SINK_FORMATS:
+        path = os.path.join(args.output_dir, f"{stem}.{extensions[output_format]}")
+        try:
+            sink = open_sink(path, output_format, sample_rate)
+        except (sf.LibsndfileError, RuntimeError) as e:
+            print(f"{output_format:>9}: unsupported here ({e})")
+            continue
+        encode_start = time.perf_counter()
+        with sink:
+            for offset in range(0, len(audio), chunk_samples):
+                sink.write(audio[offset:offset + chunk_samples])
+        encode_time = time.perf_counter() - encode_start
+        print(f"{output_format:>9}: first byte {sink.time_to_first_byte * 1000:7.2f} ms, "
+              f"size {sink.bytes_written / 1024:8.1f} KiB, encode {encode_time * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Offline benchmark of segment reconstruction memory behaviour on a long text.
+
+Replays synthetic chunk streams shaped like a long multi-segment synthesis through
+the original list-and-concatenate reconstruction (float64 cross-fade) and through
+the SegmentBuffer/ChunkReconstructor path of client_grpc_simple.py. Each strategy
+runs in a fresh process so peak RSS is not shared between them.
+
+Usage:
+python3 bench_reconstruction.py --segments 60 --chunks-per-segment 20 --model-name spark_tts
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def legacy_reconstruct(audios, model_name, cross_fade_samples):
+    """Reconstruction as done before SegmentBuffer: list of chunks, repeated concatenation"""
+    if model_name == "spark_tts":
+        fade_out = np.linspace(1, 0, cross_fade_samples)
+        fade_in = np.linspace(0, 1, cross_fade_samples)
+        if len(audios) == 1:
+            return audios[0]
+        reconstructed_audio = audios[0][:-cross_fade_samples]
+        for i in range(1, len(audios)):
+            cross_faded_overlap = (audios[i][:cross_fade_samples] * fade_in +
+                                   audios[i - 1][-cross_fade_samples:] * fade_out)
+            middle_part = audios[i][cross_fade_samples:-cross_fade_samples]
+            reconstructed_audio = np.concatenate([reconstructed_audio, cross_faded_overlap, middle_part])
+        return np.concatenate([reconstructed_audio, audios[-1][-cross_fade_samples:]])
+    return np.concatenate(audios)
+
+
+def chunk_payloads(args):
+    """Raw float32 response payloads, as they arrive in raw_output_contents"""
+    rng = np.random.default_rng(0)
+    payload = rng.standard_normal(args.chunk_samples).astype(np.float32).tobytes()
+    for _ in range(args.segments):
+        yield [payload] * args.chunks_per_segment
+
+
+def run_strategy(args) -> dict:
+    import client_grpc_simple as tts
+
+    cross_fade_samples = int(0.1 * args.sample_rate)
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    segments = []
+    for payloads in chunk_payloads(args):
+        if args.strategy == 'legacy':
+            audios = [np.frombuffer(payload, dtype=np.float32).reshape(-1) for payload in payloads]
+            segments.append(legacy_reconstruct(audios, args.model_name, cross_fade_samples))
+        else:
+            fade = cross_fade_samples if args.model_name == "spark_tts" else 0
+            reconstructor = tts.ChunkReconstructor(tts.SegmentBuffer(args.sample_rate * 10), fade)
+            for payload in payloads:
+                reconstructor.push(np.frombuffer(payload, dtype=np.float32))
+            reconstructor.finish()
+            segments.append(reconstructor.buffer.view())
+    if args.strategy == 'legacy':
+        final_audio = np.concatenate(segments)
+    else:
+        final_audio = np.concatenate(segments, dtype=np.float32)
+    elapsed = time.perf_counter() - start_time
+    _, traced_peak = tracemalloc.get_traced_memory()
+    return {
+        'elapsed': elapsed,
+        'traced_peak_mib': traced_peak / 2**20,
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'output_mib': final_audio.nbytes / 2**20,
+        'dtype': str(final_audio.dtype),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare memory use of legacy vs. buffered segment reconstruction',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--segments', type=int, default=60, help='Segments in the simulated long text')
+    parser.add_argument('--chunks-per-segment', type=int, default=20, help='Streamed chunks per segment')
+    parser.add_argument('--chunk-samples', type=int, default=12000, help='Samples per streamed chunk')
+    parser.add_argument('--sample-rate', type=int, default=24000, help='Output sample rate')
+    parser.add_argument('--model-name', type=str, default='spark_tts',
+                       choices=['f5_tts', 'spark_tts', 'cosyvoice2'],
+                       help='Model whose reconstruction path is exercised')
+    parser.add_argument('--strategy', type=str, default=None, choices=['legacy', 'buffer'],
+                       help='Run a single strategy in this process (used internally)')
+    args = parser.parse_args()
+
+    if args.strategy:
+        result = run_strategy(args)
+        print(' '.join(f"{key}={value}" for key, value in result.items()))
+        return
+
+    for strategy in ('legacy', 'buffer'):
+        output = subprocess.run(
+            [sys.executable, __file__, '--strategy', strategy] + sys.argv[1:],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        result = dict(item.split('=', 1) for item in output)
+        print(f"{strategy:>6}: {float(result['elapsed']):.3f}s, "
+              f"traced peak {float(result['traced_peak_mib']):.1f} MiB, "
+              f"peak RSS {float(result['peak_rss_mib']):.1f} MiB, "
+              f"output {float(result['output_mib']):.1f} MiB {result['dtype']}")
+
+
+if __name__ == "__main__":
+    main()
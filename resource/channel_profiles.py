@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""
+gRPC channel profiles for the TTS clients, and an A/B benchmark of them.
+
+InferenceServerClient's defaults send requests uncompressed, never send keepalive
+pings (idle channels through the high-RTT tunnel get dropped by middleboxes) and
+leave HTTP/2 flow-control windows to BDP probing. A ChannelProfile names one set
+of those settings:
+- request compression (gzip/deflate; padded reference_wav payloads compress well)
+- keepalive time and timeout
+- max send/receive message size
+- HTTP/2 stream window (lookahead) and max frame size
+
+Keepalive pings more often than the server's
+--grpc-http2-min-recv-ping-interval-without-data-ms allows get the channel closed
+with "too_many_pings"; raise that on the server alongside the client profile.
+
+The benchmark runs the same requests through each profile, alternating profiles
+request by request, behind a local byte-counting TCP proxy. It reports the
+bytes on the wire in each direction and the TTFB.
+
+Usage:
+# Use a profile, overriding one setting
+python3 client_grpc_simple.py --channel-profile "tunnel:compression=deflate"
+
+# A/B benchmark against the server
+python3 channel_profiles.py --server-addr localhost --profiles default tunnel --repeats 5
+"""
+
+import argparse
+import asyncio
+import inspect
+import logging
+import socket
+import threading
+from typing import Dict, List
+
+import numpy as np
+import tritonclient.grpc as grpcclient_sync
+
+# tritonclient's own limit when no channel arguments are given
+MAX_GRPC_MESSAGE_SIZE = 2**31 - 1
+COMPRESSION_ALGORITHMS = (None, 'gzip', 'deflate')
+
+
+class ChannelProfile:
+    """Channel arguments and stream compression for InferenceServerClient"""
+    def __init__(
+        self,
+        name: str,
+        compression: str = None,
+        keepalive_time_ms: int = 2**31 - 1,
+        keepalive_timeout_ms: int = 20000,
+        keepalive_permit_without_calls: bool = False,
+        http2_max_pings_without_data: int = 2,
+        max_send_message_length: int = MAX_GRPC_MESSAGE_SIZE,
+        max_receive_message_length: int = MAX_GRPC_MESSAGE_SIZE,
+        stream_window_bytes: int = None,
+        max_frame_size: int = None,
+        bdp_probe: bool = True,
+    ):
+        if compression not in COMPRESSION_ALGORITHMS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.name = name
+        self.compression = compression
+        self.keepalive_time_ms = keepalive_time_ms
+        self.keepalive_timeout_ms = keepalive_timeout_ms
+        self.keepalive_permit_without_calls = keepalive_permit_without_calls
+        self.http2_max_pings_without_data = http2_max_pings_without_data
+        self.max_send_message_length = max_send_message_length
+        self.max_receive_message_length = max_receive_message_length
+        self.stream_window_bytes = stream_window_bytes
+        self.max_frame_size = max_frame_size
+        self.bdp_probe = bdp_probe
+
+    def channel_args(self) -> List[tuple]:
+        """Options for grpc.insecure_channel(); the defaults match tritonclient's own"""
+        args = [
+            ('grpc.max_send_message_length', self.max_send_message_length),
+            ('grpc.max_receive_message_length', self.max_receive_message_length),
+            ('grpc.keepalive_time_ms', self.keepalive_time_ms),
+            ('grpc.keepalive_timeout_ms', self.keepalive_timeout_ms),
+            ('grpc.keepalive_permit_without_calls', int(self.keepalive_permit_without_calls)),
+            ('grpc.http2.max_pings_without_data', self.http2_max_pings_without_data),
+            ('grpc.http2.bdp_probe', int(self.bdp_probe)),
+        ]
+        if self.stream_window_bytes:
+            args.append(('grpc.http2.lookahead_bytes', self.stream_window_bytes))
+        if self.max_frame_size:
+            args.append(('grpc.http2.max_frame_size', self.max_frame_size))
+        return args
+
+    def create_client(self, url: str) -> 'ProfiledClient':
+        return ProfiledClient(url, self)
+
+    def describe(self) -> str:
+        keepalive = (f"keepalive {self.keepalive_time_ms / 1000:g}s/{self.keepalive_timeout_ms / 1000:g}s"
+                     if self.keepalive_time_ms < 2**31 - 1 else "no keepalive")
+        window = f"window {self.stream_window_bytes // 1024} KiB" if self.stream_window_bytes else "BDP window"
+        return f"{self.name}: compression {self.compression or 'none'}, {keepalive}, {window}"
+
+
+class ProfiledClient(grpcclient_sync.InferenceServerClient):
+    """InferenceServerClient whose streams use the profile's compression unless told otherwise"""
+    def __init__(self, url: str, profile: ChannelProfile):
+        super().__init__(url=url, verbose=False, channel_args=profile.channel_args())
+        self.profile = profile
+
+    def start_stream(self, callback, stream_timeout=None, headers=None, compression_algorithm=None):
+        return super().start_stream(callback, stream_timeout, headers,
+                                    compression_algorithm or self.profile.compression)
+
+
+CHANNEL_PROFILES: Dict[str, ChannelProfile] = {
+    'default': ChannelProfile('default'),
+    # High-RTT tunnel: compress uploads, keep idle pooled channels alive, open the stream window up front
+    'tunnel': ChannelProfile(
+        'tunnel',
+        compression='gzip',
+        keepalive_time_ms=30000,
+        keepalive_timeout_ms=10000,
+        keepalive_permit_without_calls=True,
+        http2_max_pings_without_data=0,
+        max_send_message_length=64 * 2**20,
+        max_receive_message_length=64 * 2**20,
+        stream_window_bytes=4 * 2**20,
+    ),
+    # Same host or LAN: compression costs more CPU than the bytes it saves
+    'lan': ChannelProfile(
+        'lan',
+        keepalive_time_ms=60000,
+        keepalive_permit_without_calls=True,
+        max_send_message_length=64 * 2**20,
+        max_receive_message_length=64 * 2**20,
+    ),
+}
+
+
+def _parse_value(key: str, value: str):
+    """An override converted to the type of the ChannelProfile setting it replaces"""
+    parameter = inspect.signature(ChannelProfile).parameters[key]
+    if value.lower() in ('none', ''):
+        if parameter.default is not None:
+            raise ValueError(f"Channel setting {key} cannot be none")
+        return None
+    if parameter.annotation is bool:
+        if value.lower() not in ('true', 'false'):
+            raise ValueError(f"Channel setting {key} takes true or false, not {value!r}")
+        return value.lower() == 'true'
+    if parameter.annotation is int:
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f"Channel setting {key} takes an integer, not {value!r}") from None
+        if number < 0:
+            raise ValueError(f"Channel setting {key} cannot be negative")
+        return number
+    return value
+
+
+def parse_channel_profile(spec: str) -> ChannelProfile:
+    """Parse 'name' or 'name:key=value,key=value' into a profile from CHANNEL_PROFILES"""
+    name, _, overrides = spec.partition(':')
+    if name not in CHANNEL_PROFILES:
+        raise ValueError(f"Unknown channel profile {name!r}, expected one of {sorted(CHANNEL_PROFILES)}")
+    settings = dict(vars(CHANNEL_PROFILES[name]))
+    for item in filter(None, overrides.split(',')):
+        key, _, value = item.partition('=')
+        if key not in settings or key == 'name':
+            raise ValueError(f"Unknown channel setting {key!r}, expected one of "
+                             f"{sorted(setting for setting in settings if setting != 'name')}")
+        settings[key] = _parse_value(key, value)
+    if overrides:
+        settings['name'] = spec
+    return ChannelProfile(**settings)
+
+
+class ByteCountingProxy:
+    """Local TCP relay to the server that counts the bytes crossing it in each direction"""
+    def __init__(self, target_host: str, target_port: int):
+        self._target = (target_host, target_port)
+        self._listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self._listener.getsockname()[1]
+        self._lock = threading.Lock()
+        self.bytes_up = 0
+        self.bytes_down = 0
+
+    @property
+    def url(self) -> str:
+        return f'127.0.0.1:{self.port}'
+
+    def start(self) -> 'ByteCountingProxy':
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            try:
+                downstream, _ = self._listener.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(self._target)
+            for sock in (downstream, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._pump, args=(downstream, upstream, 'bytes_up'), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, downstream, 'bytes_down'), daemon=True).start()
+
+    def _pump(self, source: socket.socket, destination: socket.socket, counter: str):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                destination.sendall(data)
+                with self._lock:
+                    setattr(self, counter, getattr(self, counter) + len(data))
+        except OSError:
+            pass
+        finally:
+            for sock in (source, destination):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def counters(self) -> tuple:
+        with self._lock:
+            return self.bytes_up, self.bytes_down
+
+    def stop(self):
+        self._listener.close()
+
+
+async def benchmark(args, profiles: List[ChannelProfile]) -> Dict[str, dict]:
+    """Alternate the profiles request by request; per profile, collect bytes on the wire and TTFB"""
+    # Imported here: the client imports this module for its profiles
+    import client_grpc_simple as tts
+    # Per-chunk client logs would drown the comparison
+    logging.getLogger().setLevel(logging.WARNING)
+
+    waveform, sample_rate = tts.load_audio(args.reference_audio, target_sample_rate=16000)
+    results = {}
+    lanes = []
+    for profile in profiles:
+        proxy = ByteCountingProxy(args.server_addr, args.server_port).start()
+        pool = tts.TritonClientPool(proxy.url, channel_profile=profile)
+        lanes.append((profile, proxy, pool))
+        results[profile.name] = {
+            'profile': profile.describe(), 'ttfb': [], 'total': [], 'up': [], 'down': [], 'failures': 0,
+        }
+
+    try:
+        for repeat in range(args.repeats):
+            for profile, proxy, pool in lanes:
+                if args.idle and repeat:
+                    await asyncio.sleep(args.idle)
+                up_before, down_before = proxy.counters()
+                audio, total_latency, ttfb = await tts.synthesize_streaming(
+                    proxy.url,
+                    args.model_name,
+                    waveform,
+                    args.reference_text,
+                    args.target_text,
+                    repeat,
+                    sample_rate,
+                    save_sample_rate=args.target_sr,
+                    use_spk2info_cache=args.use_spk2info_cache,
+                    client_pool=pool,
+                )
+                up_after, down_after = proxy.counters()
+                result = results[profile.name]
+                if audio is None:
+                    result['failures'] += 1
+                    continue
+                result['ttfb'].append(ttfb)
+                result['total'].append(total_latency)
+                result['up'].append(up_after - up_before)
+                result['down'].append(down_after - down_before)
+    finally:
+        for _, proxy, pool in lanes:
+            pool.close()
+            proxy.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='A/B benchmark of gRPC channel profiles: bytes on the wire and TTFB',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='localhost', help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, default='cosyvoice2',
+                       choices=['f5_tts', 'spark_tts', 'cosyvoice2'], help='Model name')
+    parser.add_argument('--reference-audio', type=str, required=True, help='Reference audio file')
+    parser.add_argument('--reference-text', type=str, default='', help='Transcript of the reference audio')
+    parser.add_argument('--target-text', type=str,
+                       default='Thanks for calling. Your order shipped yesterday and should arrive on Friday.',
+                       help='Text to synthesize for every request')
+    parser.add_argument('--target-sr', type=int, default=24000, help='Model output sample rate')
+    parser.add_argument('--use-spk2info-cache', action='store_true',
+                       help='Send text only (server-side speaker cache) instead of the reference audio')
+    parser.add_argument('--profiles', type=str, nargs='+', default=['default', 'tunnel'],
+                       help='Profiles to compare, each "name" or "name:key=value,..."')
+    parser.add_argument('--repeats', type=int, default=5, help='Requests per profile')
+    parser.add_argument('--idle', type=float, default=0.0,
+                       help='Seconds to leave each pooled channel idle between requests (exposes dropped channels)')
+    args = parser.parse_args()
+
+    try:
+        profiles = [parse_channel_profile(spec) for spec in args.profiles]
+    except ValueError as e:
+        parser.error(str(e))
+    results = asyncio.run(benchmark(args, profiles))
+
+    print(f"{args.repeats} requests per profile to {args.server_addr}:{args.server_port} ({args.model_name})")
+    for name, result in results.items():
+        print(f"  {result['profile']}")
+        if not result['ttfb']:
+            print(f"    all {result['failures']} requests failed")
+            continue
+        print(f"    wire bytes/request: up {np.mean(result['up']) / 1024:8.1f} KiB, "
+              f"down {np.mean(result['down']) / 1024:8.1f} KiB; "
+              f"TTFB mean {np.mean(result['ttfb']):.3f}s, p50 {np.median(result['ttfb']):.3f}s, "
+              f"max {np.max(result['ttfb']):.3f}s; total {np.mean(result['total']):.3f}s"
+              + (f"; {result['failures']} failed" if result['failures'] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,23 +15,72 @@ python3 client_grpc_simple.py \
     --output-path output.wav \
     --min-words 5 \
     --max-words 20
+
+# Route segments across models: fast model for the first segment's 300 ms TTFB budget, best quality after
+python3 client_grpc_simple.py --router-models cosyvoice2,f5_tts,spark_tts --ttfb-budget 0.3 --target-sr 24000
+
+# Stream the text word by word and speculate on clauses before their segment is final
+python3 client_grpc_simple.py --speculate --llm-words-per-second 4 --llm-revision-rate 0.05
+
+# Real-time playout through the adaptive jitter buffer (see jitter_buffer.py)
+python3 client_grpc_simple.py --playout --target-underrun 0.01 --save-timeline run1.json
+
+# Record the server's stream timing once, then replay it offline (see stream_trace.py)
+python3 client_grpc_simple.py --record-trace tunnel.trace
+python3 client_grpc_simple.py --replay-trace tunnel.trace --replay-time-scale 1.0
+
+# Tunnel channel settings: gzip uploads, keepalive for pooled channels (see channel_profiles.py)
+python3 client_grpc_simple.py --channel-profile tunnel
+
+# Tight reference padding buckets, in the datatype the model declares (see reference_payload.py)
+python3 client_grpc_simple.py --padding-ladder 2 4 8 16 --reference-dtype auto
+
+# Send only the best 3-8 s voiced window of a long reference (see reference_window.py)
+python3 client_grpc_simple.py --reference-window --reference-window-text "Transcript of the window"
+
+# Drop leading/trailing silence and cap pauses between segments (see silence_trim.py)
+python3 client_grpc_simple.py --trim-silence --max-pause 0.25
 """
 
 import argparse
 import asyncio
+import collections
 import functools
+import json
 import logging
 import queue
 import random
 import re
+import resource
+import tempfile
+import threading
 import time
+import tracemalloc
 import uuid
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, Tuple
 
 import numpy as np
 import soundfile as sf
 import tritonclient.grpc as grpcclient_sync
-from tritonclient.utils import np_to_triton_dtype, InferenceServerException
+from tritonclient.grpc import service_pb2
+from tritonclient.utils import np_to_triton_dtype, triton_to_np_dtype, InferenceServerException
+
+from adaptive_concurrency import EndpointLimiters
+from audio_sinks import SINK_FORMATS, AudioSink, open_sink
+from channel_profiles import ChannelProfile, parse_channel_profile
+from fair_scheduler import ScheduledSession
+from jitter_buffer import AdaptivePreroll, JitterBufferSink
+from model_introspection import DEFAULT_CACHE_PATH, KNOWN_SAMPLE_RATES, ModelInfoCache, accepts_reference, uses_spk2info
+from model_router import ModelRouter, resample_segment
+from postprocess import POOL_KINDS, EventLoopLagMonitor, PooledSink, PostProcessor, log_stage_metrics
+from prompt_archive import PromptArchive, write_prompt
+from reference_payload import WIRE_DTYPES, ReferencePayloadOptimizer, choose_wire_dtype, legacy_padded_samples
+from reference_window import DEFAULT_WINDOW_RANGE, window_reference
+from silence_trim import SilenceTrimmer, SilenceTrimSink
+from stream_trace import ReplayClientPool, TraceRecorder, load_trace
+from telephony import StreamingResampler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -39,32 +88,598 @@ logging.basicConfig(
 )
 
 
+BACKPRESSURE_POLICIES = ('block', 'spill', 'drop')
+# Runs OrderedAudioEmitter.finish() off the event loop; kept apart from the default executor,
+# where segment streams hold threads and a queued flush would wait for one of them to end
+_EMITTER_FINISH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='emitter-finish')
+
+
+class ChunkDropped(Exception):
+    """Delivered to the consumer when the drop policy discarded a chunk and the stream must be cancelled"""
+
+
+class SegmentCancelled(Exception):
+    """Delivered to the consumer when its utterance was cancelled, e.g. on barge-in"""
+
+
+class FlowController:
+    """
+    Flow control between chunk receipt and consumers, shared by all in-flight segments.
+    
+    Each segment gets a bounded ChunkChannel; all channels also draw from one global
+    byte budget. When a channel or the budget is full the policy decides:
+    'block' stalls the gRPC reader thread (and with it HTTP/2 flow control),
+    'spill' moves chunks to a temporary file, 'drop' discards the chunk and has
+    the consumer cancel the stream.
+    """
+    def __init__(self, max_queued_chunks: int = 64, max_bytes: int = 256 * 2**20,
+                 policy: str = 'block', spill_dir: str = None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.max_queued_chunks = max_queued_chunks
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self._condition = threading.Condition()
+        self.bytes_in_use = 0
+        self.peak_bytes = 0
+        self.blocked_time = 0.0
+        self.spilled_chunks = 0
+        self.spilled_bytes = 0
+        self.dropped_segments = 0
+
+    def open_channel(self) -> 'ChunkChannel':
+        return ChunkChannel(self)
+
+    def _fits(self, nbytes: int) -> bool:
+        # A single chunk larger than the whole budget is still let through when nothing else is queued
+        return self.max_bytes <= 0 or self.bytes_in_use == 0 or self.bytes_in_use + nbytes <= self.max_bytes
+
+    def reserve(self, nbytes: int, blocking: bool, aborted: Callable[[], bool] = None) -> bool:
+        """Account `nbytes` of queued audio against the budget; waits for room when blocking"""
+        with self._condition:
+            if not self._fits(nbytes):
+                if not blocking:
+                    return False
+                wait_start = time.time()
+                self._condition.wait_for(lambda: self._fits(nbytes) or (aborted and aborted()), timeout=None)
+                self.blocked_time += time.time() - wait_start
+                if aborted and aborted():
+                    return False
+            self.bytes_in_use += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.bytes_in_use)
+            return True
+
+    def release(self, nbytes: int):
+        with self._condition:
+            self.bytes_in_use -= nbytes
+            self._condition.notify_all()
+
+    def wake(self):
+        """Re-check blocked producers, e.g. after a channel was closed"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def record(self, counter: str, amount=1):
+        with self._condition:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self) -> dict:
+        return {
+            'policy': self.policy,
+            'peak_bytes': self.peak_bytes,
+            'blocked_time': self.blocked_time,
+            'spilled_chunks': self.spilled_chunks,
+            'spilled_bytes': self.spilled_bytes,
+            'dropped_segments': self.dropped_segments,
+        }
+
+
+_SPILLED = object()
+
+
+class ChunkChannel:
+    """Bounded, order-preserving chunk queue for one segment; a drop-in for queue.Queue put/get"""
+    def __init__(self, flow: FlowController):
+        self._flow = flow
+        self._condition = threading.Condition()
+        # Entries are (item, nbytes) in memory or (_SPILLED, (offset, length)) for spilled chunks
+        self._entries = collections.deque()
+        self._in_memory = 0
+        self._spilled_pending = 0
+        self._spill_file = None
+        self._dropped = False
+        self._closed = False
+
+    def put(self, item):
+        if not isinstance(item, grpcclient_sync.InferResult):
+            # Errors are never subject to flow control
+            self._append(item, 0)
+            return
+        if self._dropped or self._closed:
+            return
+        nbytes = sum(len(raw) for raw in item.get_response().raw_output_contents)
+        flow = self._flow
+
+        if flow.policy == 'block':
+            with self._condition:
+                if not self._has_room():
+                    wait_start = time.time()
+                    self._condition.wait_for(lambda: self._has_room() or self._closed)
+                    flow.record('blocked_time', time.time() - wait_start)
+            if flow.reserve(nbytes, blocking=True, aborted=lambda: self._closed):
+                self._append(item, nbytes)
+            return
+
+        # Once spilling starts, keep spilling until the backlog drains, so chunk order is preserved
+        with self._condition:
+            fits = not self._spilled_pending and self._has_room() and flow.reserve(nbytes, blocking=False)
+        if fits:
+            self._append(item, nbytes)
+        elif flow.policy == 'spill':
+            self._spill(item)
+        else:
+            self._dropped = True
+            flow.record('dropped_segments')
+            self._append(ChunkDropped(f"chunk of {nbytes} bytes dropped by flow control"), 0)
+
+    def _has_room(self) -> bool:
+        return self._flow.max_queued_chunks <= 0 or self._in_memory < self._flow.max_queued_chunks
+
+    def _append(self, item, nbytes: int):
+        with self._condition:
+            if self._closed:
+                if nbytes:
+                    self._flow.release(nbytes)
+                return
+            self._entries.append((item, nbytes))
+            if isinstance(item, grpcclient_sync.InferResult):
+                self._in_memory += 1
+            self._condition.notify_all()
+
+    def _spill(self, item):
+        payload = item.get_response().SerializeToString()
+        with self._condition:
+            if self._closed:
+                return
+            if self._spill_file is None:
+                self._spill_file = tempfile.TemporaryFile(dir=self._flow.spill_dir)
+            self._spill_file.seek(0, 2)
+            self._entries.append((_SPILLED, (self._spill_file.tell(), len(payload))))
+            self._spill_file.write(payload)
+            self._spilled_pending += 1
+            self._condition.notify_all()
+        self._flow.record('spilled_chunks')
+        self._flow.record('spilled_bytes', len(payload))
+
+    def get(self, timeout: float = None):
+        nbytes = 0
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._entries, timeout=timeout):
+                raise queue.Empty
+            item, info = self._entries.popleft()
+            if item is _SPILLED:
+                offset, length = info
+                self._spill_file.seek(offset)
+                item = grpcclient_sync.InferResult(
+                    service_pb2.ModelInferResponse.FromString(self._spill_file.read(length))
+                )
+                self._spilled_pending -= 1
+                if not self._spilled_pending:
+                    self._spill_file.truncate(0)
+            elif isinstance(item, grpcclient_sync.InferResult):
+                nbytes = info
+                self._in_memory -= 1
+                self._condition.notify_all()
+        if nbytes:
+            self._flow.release(nbytes)
+        return item
+
+    def close(self):
+        """Discard queued chunks, return their budget and unblock a waiting producer"""
+        with self._condition:
+            self._closed = True
+            released = sum(info for item, info in self._entries if item is not _SPILLED)
+            self._entries.clear()
+            self._in_memory = 0
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+            self._condition.notify_all()
+        if released:
+            self._flow.release(released)
+        self._flow.wake()
+
+
 class UserData:
     """User data for streaming inference callback"""
-    def __init__(self):
-        self._completed_requests = queue.Queue()
+    def __init__(self, flow_controller: FlowController = None):
+        self._completed_requests = flow_controller.open_channel() if flow_controller else queue.Queue()
         self._first_chunk_time = None
         self._start_time = None
+        self.received_samples = 0
+        self.cancelled = False
+        # Callback arrival times, kept only while a trace is recorded
+        self.arrivals = None
 
     def record_start_time(self):
         self._start_time = time.time()
 
+    def cancel(self, reason: str):
+        """Ask the consuming thread to stop its stream; wakes it if it is waiting for a chunk"""
+        self.cancelled = True
+        self._completed_requests.put(SegmentCancelled(reason))
+
+    def close(self):
+        """Release flow-control resources and unblock the gRPC reader if it is waiting on us"""
+        if isinstance(self._completed_requests, ChunkChannel):
+            self._completed_requests.close()
+
     def get_first_chunk_latency(self):
         if self._first_chunk_time and self._start_time:
             return self._first_chunk_time - self._start_time
         return None
 
 
+class TritonClientPool:
+    """Pool of warm gRPC clients; each client carries one channel and one active stream"""
+    def __init__(self, server_url: str, max_idle: int = 16, channel_profile: ChannelProfile = None):
+        self._server_url = server_url
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._channel_profile = channel_profile
+
+    def _create(self) -> grpcclient_sync.InferenceServerClient:
+        if self._channel_profile:
+            return self._channel_profile.create_client(self._server_url)
+        return grpcclient_sync.InferenceServerClient(url=self._server_url, verbose=False)
+
+    def prewarm(self, count: int):
+        """Open `count` channels and complete their HTTP/2 handshake before real work arrives"""
+        for _ in range(count):
+            client = self._create()
+            client.is_server_live()
+            self.release(client)
+
+    def acquire(self) -> grpcclient_sync.InferenceServerClient:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._create()
+
+    def release(self, client: grpcclient_sync.InferenceServerClient):
+        try:
+            self._idle.put_nowait(client)
+        except queue.Full:
+            client.close()
+
+    def discard(self, client: grpcclient_sync.InferenceServerClient):
+        client.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
 def callback(user_data, result, error):
     """Callback for streaming inference"""
     if user_data._first_chunk_time is None and not error:
         user_data._first_chunk_time = time.time()
+    if user_data.arrivals is not None:
+        user_data.arrivals.append(time.time())
     if error:
         user_data._completed_requests.put(error)
     else:
         user_data._completed_requests.put(result)
 
 
+def decode_waveform_chunk(response, output_name: str = "waveform") -> np.ndarray:
+    """View the raw output bytes of a ModelInferResponse as a 1D array without copying"""
+    for index, output in enumerate(response.outputs):
+        if output.name == output_name:
+            if index < len(response.raw_output_contents):
+                return np.frombuffer(response.raw_output_contents[index],
+                                     dtype=triton_to_np_dtype(output.datatype))
+            break
+    return np.empty(0, dtype=np.float32)
+
+
+class SegmentBuffer:
+    """Growable float32 buffer; each received sample is written into it exactly once"""
+    def __init__(self, capacity: int = 48000):
+        self._data = np.empty(max(capacity, 1), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, num_samples: int) -> np.ndarray:
+        """Reserve `num_samples` at the end and return the writable region"""
+        required = self._size + num_samples
+        if required > len(self._data):
+            grown = np.empty(max(required, 2 * len(self._data)), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        region = self._data[self._size:required]
+        self._size = required
+        return region
+
+    def append(self, samples: np.ndarray) -> np.ndarray:
+        region = self.extend(len(samples))
+        region[:] = samples
+        return region
+
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+
+@lru_cache(maxsize=8)
+def _fade_curves(num_samples: int) -> Tuple[np.ndarray, np.ndarray]:
+    fade_in = np.linspace(0, 1, num_samples, dtype=np.float32)
+    return fade_in, fade_in[::-1].copy()
+
+
+class ChunkReconstructor:
+    """
+    Incremental segment reconstruction, writing straight into a SegmentBuffer.
+    
+    With cross-fading (spark_tts) the tail of each chunk is held back and blended
+    with the head of the next one, producing the same samples as cross-fading the
+    complete chunk list at the end, but in float32 and without re-concatenation.
+    """
+    def __init__(self, buffer: SegmentBuffer, cross_fade_samples: int = 0):
+        self.buffer = buffer
+        self._cross_fade_samples = cross_fade_samples
+        self._held_tail = None
+
+    def push(self, chunk: np.ndarray) -> np.ndarray:
+        """Add a received chunk and return the newly finalized samples (a view into the buffer)"""
+        start = len(self.buffer)
+        fade = self._cross_fade_samples
+        if fade <= 0 or len(chunk) < 2 * fade:
+            self._flush_tail()
+            self.buffer.append(chunk)
+        elif self._held_tail is None:
+            self.buffer.append(chunk[:-fade])
+            self._held_tail = chunk[-fade:]
+        else:
+            fade_in, fade_out = _fade_curves(fade)
+            region = self.buffer.extend(len(chunk) - fade)
+            np.multiply(chunk[:fade], fade_in, out=region[:fade])
+            region[:fade] += self._held_tail * fade_out
+            region[fade:] = chunk[fade:-fade]
+            self._held_tail = chunk[-fade:]
+        return self.buffer.view()[start:]
+
+    def _flush_tail(self):
+        if self._held_tail is not None:
+            self.buffer.append(self._held_tail)
+            self._held_tail = None
+
+    def finish(self) -> np.ndarray:
+        """Flush the held-back tail and return the newly finalized samples"""
+        start = len(self.buffer)
+        self._flush_tail()
+        return self.buffer.view()[start:]
+
+
+class OrderedAudioEmitter:
+    """
+    Forwards reconstructed audio to a sink in segment order while segments stream concurrently.
+    
+    Audio of the segment currently being played out goes straight to the sink; audio of
+    later segments is held (as buffer views, not copies) until all earlier segments finish.
+    """
+    def __init__(self, sink: AudioSink):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self._next_segment = 0
+        self._pending = {}
+        self._finished = set()
+        self._discarded = set()
+
+    def push(self, segment_id: int, samples: np.ndarray):
+        if len(samples) == 0:
+            return
+        with self._lock:
+            if segment_id in self._discarded:
+                return
+            if segment_id == self._next_segment:
+                self.sink.write(samples)
+            else:
+                self._pending.setdefault(segment_id, []).append(samples)
+
+    def finish(self, segment_id: int):
+        """Mark a segment complete (or failed) and flush any later segments that were waiting"""
+        with self._lock:
+            self._finished.add(segment_id)
+            while self._next_segment in self._finished:
+                self._finished.discard(self._next_segment)
+                self._next_segment += 1
+                self.sink.end_segment()
+                for samples in self._pending.pop(self._next_segment, []):
+                    self.sink.write(samples)
+
+    async def finish_async(self, segment_id: int):
+        """
+        finish() for coroutines: flushing the held later segments encodes and writes them,
+        and the sink may block on post-processing backpressure, so it runs off the event loop.
+        """
+        await asyncio.get_running_loop().run_in_executor(_EMITTER_FINISH_POOL, self.finish, segment_id)
+
+    def discard(self, segment_id: int):
+        """Drop held audio of a cancelled segment and ignore anything it pushes later"""
+        with self._lock:
+            self._pending.pop(segment_id, None)
+            self._discarded.add(segment_id)
+
+
+class UtteranceController:
+    """
+    Cancellation handle for one utterance synthesized as concurrent segment streams.
+    
+    On barge-in, cancel() stops every segment and cancel_after() stops the segments
+    that would play after a playback position. A streaming segment's consumer thread
+    stops its stream with cancel_requests=True so the server abandons the request;
+    segments not launched yet are never sent. Saved audio and server time are
+    estimates, extrapolated from the segments that completed.
+    """
+    def __init__(self, sample_rate: int, seconds_per_word: float = 0.4):
+        self.sample_rate = sample_rate
+        # Speech-rate fallback until a segment has completed
+        self.seconds_per_word = seconds_per_word
+        self._lock = threading.Lock()
+        self._segments = {}
+        self._discarded = set()
+        self._emitter = None
+        self.cancelled_from = None
+        self.cancel_time = None
+        self.cancel_reason = None
+
+    def start(self, segments: List[str], emitter: OrderedAudioEmitter = None):
+        """Register the utterance's segments, in playback order"""
+        with self._lock:
+            self._emitter = emitter
+            self._segments = {segment_id: self._new_segment(text) for segment_id, text in enumerate(segments)}
+
+    def add_segment(self, segment_id: int, text: str):
+        """Register a segment that became known while the utterance is already streaming"""
+        with self._lock:
+            self._segments[segment_id] = self._new_segment(text)
+
+    @staticmethod
+    def _new_segment(text: str) -> dict:
+        return {'words': len(text.split()), 'state': 'pending', 'user_data': None,
+                'start_time': None, 'end_time': None, 'samples': 0, 'server_time': None}
+
+    def is_cancelled(self, segment_id: int) -> bool:
+        if segment_id in self._discarded:
+            return True
+        return self.cancelled_from is not None and segment_id >= self.cancelled_from
+
+    def attach(self, segment_id: int, user_data: UserData) -> bool:
+        """Called when a segment's stream starts; returns False if it must not be sent"""
+        with self._lock:
+            if self.is_cancelled(segment_id):
+                return False
+            segment = self._segments.setdefault(segment_id, {'words': 0, 'samples': 0, 'server_time': None})
+            segment.update(state='streaming', user_data=user_data, start_time=time.time(), end_time=None)
+            return True
+
+    def detach(self, segment_id: int, audio: np.ndarray, server_time: float):
+        """Called when a segment's stream ended, whether completed, failed or cancelled"""
+        with self._lock:
+            segment = self._segments.get(segment_id)
+            if segment is None or segment['state'] != 'streaming':
+                return
+            user_data = segment.pop('user_data')
+            segment['end_time'] = time.time()
+            if audio is not None:
+                segment.update(state='done', samples=len(audio), server_time=server_time)
+            else:
+                segment.update(state='cancelled' if user_data.cancelled else 'failed',
+                               samples=user_data.received_samples)
+
+    def cancel(self, reason: str = 'barge-in'):
+        """Cancel the whole utterance"""
+        self._cancel_from(0, reason)
+
+    def cancel_after(self, playback_position: float, reason: str = 'barge-in'):
+        """
+        Cancel every segment that would start playing after `playback_position` seconds.
+        
+        The segment being played at that position is kept. Playback cannot have passed
+        a segment that is still streaming, so everything after it is cancelled too.
+        """
+        position = int(playback_position * self.sample_rate)
+        with self._lock:
+            end = 0
+            first_cancelled = len(self._segments)
+            for segment_id in sorted(self._segments):
+                if segment_id in self._discarded:
+                    continue
+                segment = self._segments[segment_id]
+                end += segment['samples'] if segment['state'] == 'done' else self._received(segment)
+                if end > position or segment['state'] != 'done':
+                    first_cancelled = segment_id + 1
+                    break
+        self._cancel_from(first_cancelled, reason)
+
+    @staticmethod
+    def _received(segment: dict) -> int:
+        user_data = segment.get('user_data')
+        return user_data.received_samples if user_data else segment['samples']
+
+    def cancel_segment(self, segment_id: int, reason: str):
+        """Cancel and discard one segment, e.g. a failed speculation, leaving the rest playing"""
+        with self._lock:
+            self._discarded.add(segment_id)
+            if self._emitter:
+                self._emitter.discard(segment_id)
+            segment = self._segments.get(segment_id)
+            if segment and segment['state'] == 'streaming':
+                segment['user_data'].cancel(reason)
+            elif segment and segment['state'] == 'pending':
+                segment['state'] = 'dropped'
+
+    def _cancel_from(self, first_segment: int, reason: str):
+        with self._lock:
+            if self.cancelled_from is not None and self.cancelled_from <= first_segment:
+                return
+            self.cancelled_from = first_segment
+            self.cancel_time = time.time()
+            self.cancel_reason = reason
+            for segment_id, segment in self._segments.items():
+                if segment_id < first_segment:
+                    continue
+                if self._emitter:
+                    self._emitter.discard(segment_id)
+                if segment['state'] == 'streaming':
+                    segment['user_data'].cancel(reason)
+                elif segment['state'] == 'pending':
+                    segment['state'] = 'dropped'
+        logging.info(f"Utterance cancelled ({reason}) from segment {first_segment}")
+
+    def report(self) -> dict:
+        """Estimate what the cancellation saved; durations in seconds"""
+        with self._lock:
+            segments = [(segment_id, segment) for segment_id, segment in sorted(self._segments.items())
+                        if segment_id not in self._discarded]
+        done = [s for _, s in segments if s['state'] == 'done' and s['samples']]
+        done_words = sum(s['words'] for s in done)
+        done_audio = sum(s['samples'] for s in done) / self.sample_rate
+        seconds_per_word = done_audio / done_words if done_words else self.seconds_per_word
+        # Server seconds per second of audio, from completed segments
+        server_rtf = sum(s['server_time'] for s in done) / done_audio if done_audio else None
+
+        report = {'cancelled_segments': 0, 'dropped_segments': 0, 'audio_discarded': 0.0,
+                  'audio_saved': 0.0, 'server_time_saved': None, 'teardown_time': None}
+        if self.cancelled_from is None:
+            return report
+        server_time_saved = 0.0
+        for segment_id, segment in segments:
+            if segment_id < self.cancelled_from:
+                continue
+            received = segment['samples'] / self.sample_rate
+            # Audio generated after the cut is thrown away, including completed segments
+            report['audio_discarded'] += received
+            if segment['state'] == 'done':
+                continue
+            report['dropped_segments' if segment['state'] == 'dropped' else 'cancelled_segments'] += 1
+            unsent = max(segment['words'] * seconds_per_word - received, 0.0)
+            report['audio_saved'] += unsent
+            if server_rtf is not None:
+                server_time_saved += unsent * server_rtf
+            if segment['end_time'] and segment['start_time'] and segment['start_time'] < self.cancel_time:
+                teardown = segment['end_time'] - self.cancel_time
+                report['teardown_time'] = max(report['teardown_time'] or 0.0, teardown)
+        if server_rtf is not None:
+            report['server_time_saved'] = server_time_saved
+        return report
+
+
 def split_text_by_punctuation(text: str, min_words: int = 10, max_words: int = 30) -> List[str]:
     """
     Split text at punctuation marks with min_words and max_words constraints.
@@ -131,6 +746,80 @@ def split_text_by_punctuation(text: str, min_words: int = 10, max_words: int = 3
     return [s.strip() for s in segments if s.strip()]
 
 
+# Same tokenization as split_text_by_punctuation
+PUNCTUATION_PATTERN = r'([,.:;!?。，！？；：])'
+CLAUSE_PUNCTUATION = ',:;，；：'
+SENTENCE_PUNCTUATION = '.!?。！？'
+
+
+def _count_parts(text: str) -> int:
+    """Number of text parts between punctuation marks, as split_text_by_punctuation sees them"""
+    return sum(1 for part in re.split(PUNCTUATION_PATTERN, text)
+               if part.strip() and not re.match(r'^[,.:;!?。，！？；：]$', part.strip()))
+
+
+class IncrementalSplitter:
+    """
+    Applies split_text_by_punctuation() to text that is still being generated.
+    
+    Every segment except the last is final; the last one is final too once any further
+    word would start a new segment (it was closed by its punctuation), and pending
+    otherwise. Finalized text is never re-split, so a revision of the stream may only
+    touch the pending tail.
+    """
+    def __init__(self, min_words: int = 10, max_words: int = 30):
+        self.min_words = min_words
+        self.max_words = max_words
+        self._consumed = 0
+        self.pending = ''
+
+    def update(self, text: str, done: bool = False) -> List[str]:
+        """Take the current full text; returns segments that became final"""
+        tail = text[self._consumed:]
+        segments = split_text_by_punctuation(tail, self.min_words, self.max_words)
+        final = segments if done else segments[:-1]
+        if not done and segments:
+            # Probe with one more word: if it lands in a new segment, the last one is closed
+            probe = split_text_by_punctuation(tail + ' _', self.min_words, self.max_words)
+            if probe[:-1] == segments:
+                final = segments
+        # A tail of only whitespace (e.g. an empty network chunk) leaves nothing pending
+        self.pending = '' if final is segments or not segments else segments[-1]
+        if done:
+            self._consumed = len(text)
+        elif final:
+            # A final segment ends at a part boundary: skip to the start of the next part
+            consumed_parts = sum(_count_parts(segment) for segment in final)
+            offset = 0
+            for part in re.split(PUNCTUATION_PATTERN, tail):
+                stripped = part.strip()
+                if stripped and not re.match(r'^[,.:;!?。，！？；：]$', stripped):
+                    if consumed_parts == 0:
+                        offset += len(part) - len(part.lstrip())
+                        break
+                    consumed_parts -= 1
+                offset += len(part)
+            self._consumed += offset
+        return final
+
+
+def clause_boundary_confidence(clause: str) -> float:
+    """
+    Heuristic confidence that the final segment text will also break after `clause`.
+    
+    A sentence end that did not close a segment (too few words) is the strongest hint,
+    clause punctuation next; a bare word count is a weak guess.
+    """
+    clause = clause.rstrip()
+    if not clause:
+        return 0.0
+    if clause[-1] in SENTENCE_PUNCTUATION:
+        return 0.9
+    if clause[-1] in CLAUSE_PUNCTUATION:
+        return 0.7
+    return 0.3
+
+
 def load_audio(wav_path: str, target_sample_rate: int = 16000) -> Tuple[np.ndarray, int]:
     """Load audio file and resample if necessary"""
     waveform, sample_rate = sf.read(wav_path)
@@ -148,26 +837,37 @@ def prepare_request_input_output(
     target_text: str,
     sample_rate: int = 16000,
     padding_duration: int = 10,
-    use_spk2info_cache: bool = False
+    use_spk2info_cache: bool = False,
+    payload_optimizer: ReferencePayloadOptimizer = None,
+    model_name: str = None,
 ):
-    """Prepares inputs for Triton streaming inference."""
+    """
+    Prepares inputs for Triton streaming inference.
+    
+    With a payload_optimizer, reference_wav is padded to the optimizer's ladder and
+    sent in the datatype it chose for model_name, instead of 10 s buckets of FP32.
+    """
+    outputs = [protocol_client.InferRequestedOutput("waveform")]
+    if use_spk2info_cache:
+        # The server holds the speaker prompt, so only the target text is sent
+        inputs = [protocol_client.InferInput("target_text", [1, 1], "BYTES")]
+        input_data_numpy = np.array([target_text], dtype=object).reshape((1, 1))
+        inputs[0].set_data_from_numpy(input_data_numpy)
+        logging.warning(f"Using spk2info cache: {use_spk2info_cache}, inputs: {[inp.name() for inp in inputs]}")
+        return inputs, outputs
+
     assert len(waveform.shape) == 1, "waveform should be 1D"
     lengths = np.array([[len(waveform)]], dtype=np.int32)
 
-    # Apply padding for streaming
-    duration = len(waveform) / sample_rate
-    # Estimate target duration based on text length ratio
-    if reference_text:
-        estimated_target_duration = duration / len(reference_text) * len(target_text)
+    # Apply padding for streaming, sized from the estimated reference + target duration
+    legacy_samples = legacy_padded_samples(len(waveform), sample_rate, reference_text, target_text, padding_duration)
+    if payload_optimizer:
+        padded_samples = payload_optimizer.padded_samples(len(waveform), sample_rate, reference_text, target_text)
+        samples = payload_optimizer.encode(waveform, padded_samples, payload_optimizer.wire_dtype(model_name))
+        payload_optimizer.record(samples.nbytes, legacy_samples * np.dtype(np.float32).itemsize)
     else:
-        estimated_target_duration = duration
-
-    # Calculate required samples based on estimated total duration
-    required_total_samples = padding_duration * sample_rate * (
-        (int(estimated_target_duration + duration) // padding_duration) + 1
-    )
-    samples = np.zeros((1, required_total_samples), dtype=np.float32)
-    samples[0, : len(waveform)] = waveform
+        samples = np.zeros((1, legacy_samples), dtype=np.float32)
+        samples[0, : len(waveform)] = waveform
 
     # Create input tensors
     inputs = [
@@ -189,9 +889,6 @@ def prepare_request_input_output(
     input_data_numpy = input_data_numpy.reshape((1, 1))
     inputs[3].set_data_from_numpy(input_data_numpy)
 
-    outputs = [protocol_client.InferRequestedOutput("waveform")]
-    if use_spk2info_cache:
-        inputs = inputs[-1:]
     logging.warning(f"Using spk2info cache: {use_spk2info_cache}, inputs: {[inp.name() for inp in inputs]}")
     return inputs, outputs
 
@@ -206,10 +903,24 @@ def run_sync_streaming_inference(
     chunk_overlap_duration: float,
     save_sample_rate: int,
     segment_id: int = 0,
+    on_audio: Callable[[np.ndarray], None] = None,
+    recorder: TraceRecorder = None,
 ) -> Tuple[np.ndarray, float, float]:
-    """Run synchronous streaming inference and receive audio chunks in real-time"""
+    """
+    Run synchronous streaming inference and receive audio chunks in real-time.
+    
+    With a recorder, the request and every response with its callback arrival time
+    are written to the trace.
+    """
     start_time_total = time.time()
     user_data.record_start_time()
+    if user_data.cancelled:
+        return None, None, None
+
+    trace = None
+    if recorder:
+        user_data.arrivals = collections.deque()
+        trace = recorder.begin(model_name, request_id, segment_id, inputs, start_time_total)
 
     # Establish stream
     sync_triton_client.start_stream(callback=functools.partial(callback, user_data))
@@ -224,25 +935,55 @@ def run_sync_streaming_inference(
     )
 
     # Process results in real-time
-    audios = []
+    cross_fade_samples = int(chunk_overlap_duration * save_sample_rate) if model_name == "spark_tts" else 0
+    reconstructor = ChunkReconstructor(SegmentBuffer(save_sample_rate * 10), cross_fade_samples)
     chunk_count = 0
+    received_samples = 0
     while True:
         try:
             result = user_data._completed_requests.get(timeout=30)
+            # Checked before anything else so chunks still queued are not processed after a barge-in
+            if user_data.cancelled:
+                logging.info(f"[Segment {segment_id}] Cancelled, stopping stream after {chunk_count} chunks")
+                user_data.close()
+                sync_triton_client.stop_stream(cancel_requests=True)
+                if trace is not None:
+                    recorder.end(trace, 'cancelled')
+                return None, None, None
+            if isinstance(result, ChunkDropped):
+                logging.error(f"[Segment {segment_id}] Consumer too slow, cancelling stream: {result}")
+                user_data.close()
+                sync_triton_client.stop_stream(cancel_requests=True)
+                if trace is not None:
+                    recorder.end(trace, 'dropped')
+                return None, None, None
+            arrival = user_data.arrivals.popleft() if trace is not None else None
             if isinstance(result, InferenceServerException):
                 logging.error(f"[Segment {segment_id}] RPC error: {result}")
+                user_data.close()
                 sync_triton_client.stop_stream()
+                if trace is not None:
+                    recorder.error(trace, arrival, str(result))
+                    recorder.end(trace, 'error')
                 return None, None, None
 
             response = result.get_response()
+            if trace is not None:
+                recorder.response(trace, arrival, response)
             final = response.parameters["triton_final_response"].bool_param
             if final is True:
+                if trace is not None:
+                    recorder.end(trace, 'final')
                 break
 
-            audio_chunk = result.as_numpy("waveform").reshape(-1)
+            audio_chunk = decode_waveform_chunk(response)
             if audio_chunk.size > 0:
                 chunk_count += 1
-                audios.append(audio_chunk)
+                received_samples += len(audio_chunk)
+                user_data.received_samples = received_samples
+                finalized = reconstructor.push(audio_chunk)
+                if on_audio:
+                    on_audio(finalized)
                 
                 # Log real-time chunk reception
                 if chunk_count == 1:
@@ -253,11 +994,14 @@ def run_sync_streaming_inference(
                 else:
                     logging.info(f"[Segment {segment_id}] Chunk {chunk_count} received, "
                                f"size: {len(audio_chunk)} samples, "
-                               f"total so far: {sum(len(a) for a in audios)} samples")
+                               f"total so far: {received_samples} samples")
 
         except queue.Empty:
             logging.error(f"[Segment {segment_id}] Timeout waiting for response")
+            user_data.close()
             sync_triton_client.stop_stream()
+            if trace is not None:
+                recorder.end(trace, 'timeout')
             return None, None, None
 
     sync_triton_client.stop_stream()
@@ -265,31 +1009,14 @@ def run_sync_streaming_inference(
     total_request_latency = end_time_total - start_time_total
     first_chunk_latency = user_data.get_first_chunk_latency()
 
-    # Reconstruct audio
-    if audios:
-        if model_name == "spark_tts":
-            # Use cross-fade for spark_tts
-            cross_fade_samples = int(chunk_overlap_duration * save_sample_rate)
-            fade_out = np.linspace(1, 0, cross_fade_samples)
-            fade_in = np.linspace(0, 1, cross_fade_samples)
-            
-            if len(audios) == 1:
-                reconstructed_audio = audios[0]
-            else:
-                reconstructed_audio = audios[0][:-cross_fade_samples]
-                for i in range(1, len(audios)):
-                    cross_faded_overlap = (audios[i][:cross_fade_samples] * fade_in +
-                                         audios[i - 1][-cross_fade_samples:] * fade_out)
-                    middle_part = audios[i][cross_fade_samples:-cross_fade_samples]
-                    reconstructed_audio = np.concatenate([reconstructed_audio, cross_faded_overlap, middle_part])
-                reconstructed_audio = np.concatenate([reconstructed_audio, audios[-1][-cross_fade_samples:]])
-        else:
-            reconstructed_audio = np.concatenate(audios)
-        
+    # The reconstructed segment is a view of its buffer, no final concatenation
+    finalized = reconstructor.finish()
+    if on_audio:
+        on_audio(finalized)
+    reconstructed_audio = reconstructor.buffer.view()
+    if chunk_count:
         logging.info(f"[Segment {segment_id}] ✓ Synthesis completed in {total_request_latency:.3f}s, "
                    f"total audio: {len(reconstructed_audio)} samples, chunks: {chunk_count}")
-    else:
-        reconstructed_audio = np.array([], dtype=np.float32)
 
     return reconstructed_audio, total_request_latency, first_chunk_latency
 
@@ -305,12 +1032,25 @@ async def synthesize_streaming(
     chunk_overlap_duration: float = 0.1,
     save_sample_rate: int = 24000,
     padding_duration: int = 10,
-    use_spk2info_cache: bool = False
+    use_spk2info_cache: bool = False,
+    client_pool: TritonClientPool = None,
+    on_audio: Callable[[np.ndarray], None] = None,
+    flow_controller: FlowController = None,
+    controller: UtteranceController = None,
+    recorder: TraceRecorder = None,
+    payload_optimizer: ReferencePayloadOptimizer = None,
 ) -> Tuple[np.ndarray, float, float]:
     """Synthesize audio using streaming mode with real-time chunk reception"""
     sync_triton_client = None
+    user_data = None
+    attached = False
+    reusable = False
+    audio, total_latency = None, None
     try:
-        sync_triton_client = grpcclient_sync.InferenceServerClient(url=server_url, verbose=False)
+        if client_pool:
+            sync_triton_client = client_pool.acquire()
+        else:
+            sync_triton_client = grpcclient_sync.InferenceServerClient(url=server_url, verbose=False)
         
         inputs, outputs = prepare_request_input_output(
             grpcclient_sync,
@@ -319,11 +1059,19 @@ async def synthesize_streaming(
             target_text,
             sample_rate,
             padding_duration=padding_duration,
-            use_spk2info_cache=use_spk2info_cache
+            use_spk2info_cache=use_spk2info_cache,
+            payload_optimizer=payload_optimizer,
+            model_name=model_name,
         )
         
         request_id = str(uuid.uuid4())
-        user_data = UserData()
+        user_data = UserData(flow_controller)
+        if controller:
+            attached = controller.attach(segment_id, user_data)
+            if not attached:
+                logging.info(f"[Segment {segment_id}] Cancelled before start, not sent")
+                reusable = True
+                return None, None, None
         
         audio, total_latency, first_chunk_latency = await asyncio.to_thread(
             run_sync_streaming_inference,
@@ -336,13 +1084,25 @@ async def synthesize_streaming(
             chunk_overlap_duration,
             save_sample_rate,
             segment_id,
+            on_audio,
+            recorder,
         )
+        reusable = True
         
         return audio, total_latency, first_chunk_latency
         
     finally:
+        if attached:
+            controller.detach(segment_id, audio, total_latency)
+        if user_data:
+            user_data.close()
         if sync_triton_client:
-            sync_triton_client.close()
+            if client_pool and reusable:
+                client_pool.release(sync_triton_client)
+            elif client_pool:
+                client_pool.discard(sync_triton_client)
+            else:
+                sync_triton_client.close()
 
 
 async def synthesize_with_splitting(
@@ -350,9 +1110,31 @@ async def synthesize_with_splitting(
     waveform: np.ndarray,
     reference_text: str,
     target_text: str,
-    sample_rate: int = 16000
+    sample_rate: int = 16000,
+    client_pool: TritonClientPool = None,
+    simulate_llm_delay: bool = True,
+    sink: AudioSink = None,
+    flow_controller: FlowController = None,
+    controller: UtteranceController = None,
+    router: ModelRouter = None,
+    limiters: EndpointLimiters = None,
+    recorder: TraceRecorder = None,
+    payload_optimizer: ReferencePayloadOptimizer = None,
+    scheduling: ScheduledSession = None,
 ) -> Tuple[np.ndarray, float, dict]:
-    """Synthesize with text splitting and concurrent streaming"""
+    """
+    Synthesize with text splitting and concurrent streaming.
+    
+    With a sink, audio is written in order as chunks arrive and no combined array is
+    assembled; the returned audio is then empty and the sink holds the result.
+    A controller lets the caller cancel the utterance (barge-in) while it streams.
+    With a router, each segment goes to the model it picks and is resampled from that
+    model's rate to args.target_sr. With limiters, segment streams wait for a slot
+    under their endpoint's adaptive concurrency limit. A recorder traces every stream;
+    a payload_optimizer sizes and encodes the reference sent with each segment.
+    With scheduling (this utterance's session on a FairScheduler shared with other
+    sessions), each segment stream first waits for the scheduler to admit it.
+    """
     segments = split_text_by_punctuation(target_text, args.min_words, args.max_words)
     
     logging.info(f"Text split into {len(segments)} segments:")
@@ -361,38 +1143,90 @@ async def synthesize_with_splitting(
     
     overall_start_time = time.time()
     results = {}
+    emitter = OrderedAudioEmitter(sink) if sink else None
+    if controller:
+        controller.start(segments, emitter)
     
     async def synthesize_segment(segment_id: int, segment_text: str):
         """Synthesize a single segment with streaming"""
         logging.info(f"[Segment {segment_id}] Starting streaming synthesis: '{segment_text[:50]}...'")
+        segment_start_time = time.time()
+        server_url = f"{args.server_addr}:{args.server_port}"
+        limiter = limiters.get(server_url) if limiters else None
+        # Only what was actually acquired is released, even if the task is cancelled while waiting
+        ticket = None
+        started = None
+        routed = False
+        first_chunk_latency = None
+        failed = True
         
         try:
+            if scheduling:
+                ticket = await scheduling.acquire(len(segment_text.split()))
+            if limiter:
+                started = await limiter.acquire()
+            model_name = router.choose(segment_id, segment_text) if router else args.model_name
+            routed = router is not None
+            model_rate = router.sample_rate(model_name) if router else args.target_sr
+            push = functools.partial(emitter.push, segment_id) if emitter else None
+            resampler = None
+            on_audio = push
+            if push and model_rate != args.target_sr:
+                resampler = StreamingResampler(model_rate, args.target_sr)
+                on_audio = lambda samples: push(resampler.process(samples))
+            
             audio, total_latency, first_chunk_latency = await synthesize_streaming(
-                f"{args.server_addr}:{args.server_port}",
-                args.model_name,
+                server_url,
+                model_name,
                 waveform,
                 reference_text,
                 segment_text,
                 segment_id,
                 sample_rate,
                 args.chunk_overlap_duration,
-                args.target_sr,
+                model_rate,
                 padding_duration=10,
-                use_spk2info_cache=args.use_spk2info_cache
+                use_spk2info_cache=args.use_spk2info_cache,
+                client_pool=client_pool,
+                on_audio=on_audio,
+                flow_controller=flow_controller,
+                controller=controller,
+                recorder=recorder,
+                payload_optimizer=payload_optimizer,
             )
-            return (segment_id, audio, total_latency, first_chunk_latency)
+            # Cancellation is our decision, not a sign of server overload
+            failed = audio is None and not (controller and controller.is_cancelled(segment_id))
+            if audio is not None and model_rate != args.target_sr:
+                if resampler:
+                    push(resampler.flush())
+                else:
+                    audio = resample_segment(audio, model_rate, args.target_sr)
+            segment_wall_time = time.time() - segment_start_time
+            return (segment_id, audio, total_latency, first_chunk_latency, segment_wall_time)
                 
         except Exception as e:
             logging.error(f"[Segment {segment_id}] Failed: {str(e)}")
             raise
+        finally:
+            if started is not None:
+                await limiter.release(started, first_chunk_latency, failed)
+            if ticket:
+                scheduling.release(ticket, first_chunk_latency)
+            if routed:
+                router.record(segment_id, first_chunk_latency)
+            if emitter:
+                await emitter.finish_async(segment_id)
     
     # Launch tasks concurrently
     tasks = []
     for i, segment_text in enumerate(segments):
-        if i > 0:
+        if i > 0 and simulate_llm_delay:
             delay = random.uniform(1.0, 2.0)
             logging.info(f"[Segment {i}] Simulating LLM generation delay: {delay:.2f}s...")
             await asyncio.sleep(delay)
+        if controller and controller.is_cancelled(i):
+            logging.info(f"Utterance cancelled, not launching segments {i}-{len(segments) - 1}")
+            break
         task = asyncio.create_task(synthesize_segment(i, segment_text))
         tasks.append(task)
     
@@ -404,28 +1238,37 @@ async def synthesize_with_splitting(
     # Process results
     total_first_chunk_latency = 0
     successful_segments = 0
+    request_latencies = []
+    segment_wall_times = []
     for result in completed_results:
         if isinstance(result, Exception):
             logging.error(f"Synthesis task failed: {result}")
             continue
-        segment_id, audio_bytes, total_latency, first_chunk_latency = result
-        results[segment_id] = audio_bytes
+        segment_id, audio_bytes, total_latency, first_chunk_latency, segment_wall_time = result
+        if audio_bytes is not None:
+            results[segment_id] = audio_bytes
         if first_chunk_latency:
             total_first_chunk_latency += first_chunk_latency
             successful_segments += 1
+        if total_latency is not None:
+            request_latencies.append(total_latency)
+            segment_wall_times.append(segment_wall_time)
     
     # Combine audio in order
     logging.info("Combining audio segments in chronological order...")
     combined_audio = []
     for i in range(len(segments)):
-        if i in results:
+        if controller and controller.is_cancelled(i):
+            logging.info(f"  Segment {i} cancelled")
+        elif i not in results:
+            logging.error(f"  Missing audio for segment {i}")
+        elif not emitter:
             combined_audio.append(results[i])
             logging.info(f"  Added segment {i} to final audio ({len(results[i])} samples)")
-        else:
-            logging.error(f"  Missing audio for segment {i}")
     
     if combined_audio:
-        final_audio = np.concatenate(combined_audio)
+        # Single copy from the per-segment buffers into the final float32 output
+        final_audio = np.concatenate(combined_audio, dtype=np.float32)
     else:
         final_audio = np.array([], dtype=np.float32)
     
@@ -435,12 +1278,509 @@ async def synthesize_with_splitting(
     stats = {
         'total_time': total_time,
         'num_segments': len(segments),
-        'avg_first_chunk_latency': avg_first_chunk_latency
+        'avg_first_chunk_latency': avg_first_chunk_latency,
+        'request_latencies': request_latencies,
+        'segment_wall_times': segment_wall_times,
     }
+    if limiters:
+        stats['concurrency_limits'] = limiters.stats()
+    if scheduling:
+        stats['scheduling'] = scheduling.scheduler.stats()
+    
+    return final_audio, total_time, stats
+
+
+async def simulate_text_stream(text: str, words_per_second: float = 4.0, revision_rate: float = 0.0,
+                               seed: int = None):
+    """
+    Replay `text` word by word like a streaming LLM, yielding (text so far, done).
+    
+    With `revision_rate`, a decoy word (sometimes ending a clause) is emitted and then
+    retracted on the next step, modelling rollbacks or late normalization of the tail.
+    """
+    rng = random.Random(seed)
+    words = text.split()
+    emitted = []
+    for word in words:
+        await asyncio.sleep(1.0 / words_per_second)
+        if emitted and rng.random() < revision_rate:
+            decoy = rng.choice(words).strip(',.:;!?') + rng.choice(['', ','])
+            yield ' '.join(emitted + [decoy]), False
+            await asyncio.sleep(1.0 / words_per_second)
+        emitted.append(word)
+        yield ' '.join(emitted), False
+    yield ' '.join(emitted), True
+
+
+async def synthesize_speculative(
+    args,
+    waveform: np.ndarray,
+    reference_text: str,
+    target_text: str,
+    sample_rate: int = 16000,
+    client_pool: TritonClientPool = None,
+    sink: AudioSink = None,
+    flow_controller: FlowController = None,
+    controller: UtteranceController = None,
+    recorder: TraceRecorder = None,
+    payload_optimizer: ReferencePayloadOptimizer = None,
+) -> Tuple[np.ndarray, float, dict]:
+    """
+    Synthesize text as it streams from the LLM, speculating on clauses of unfinished segments.
+    
+    Once the pending segment holds a clause of at least `args.speculate_min_words` words
+    whose boundary confidence reaches `args.speculate_confidence`, that clause is sent
+    right away. When the segment is final, speculations that are a prefix of its text
+    are kept and only the remainder is synthesized; a speculation the text diverged
+    from is cancelled and its audio discarded, as soon as the divergence shows.
     
+    Returns the same (audio, total time, stats) as synthesize_with_splitting(); stats
+    add hit rate, latency saved by kept speculations and stream time spent on discarded ones.
+    """
+    overall_start_time = time.time()
+    emitter = OrderedAudioEmitter(sink) if sink else None
+    controller = controller or UtteranceController(args.target_sr)
+    controller.start([], emitter)
+    splitter = IncrementalSplitter(args.min_words, args.max_words)
+    tasks = []
+    records = {}
+    # Speculations on the current pending segment, in text order
+    speculations = []
+
+    async def synthesize_segment(segment_id: int, segment_text: str):
+        try:
+            return await synthesize_streaming(
+                f"{args.server_addr}:{args.server_port}",
+                args.model_name,
+                waveform,
+                reference_text,
+                segment_text,
+                segment_id,
+                sample_rate,
+                args.chunk_overlap_duration,
+                args.target_sr,
+                padding_duration=10,
+                use_spk2info_cache=args.use_spk2info_cache,
+                client_pool=client_pool,
+                on_audio=functools.partial(emitter.push, segment_id) if emitter else None,
+                flow_controller=flow_controller,
+                controller=controller,
+                recorder=recorder,
+                payload_optimizer=payload_optimizer,
+            )
+        finally:
+            records[segment_id]['end_time'] = time.time()
+            if emitter:
+                await emitter.finish_async(segment_id)
+
+    def launch(segment_text: str, speculative: bool) -> int:
+        segment_id = len(records)
+        records[segment_id] = {'text': segment_text, 'speculative': speculative, 'launch_time': time.time(),
+                               'end_time': None, 'final_time': None, 'kept': not speculative}
+        controller.add_segment(segment_id, segment_text)
+        logging.info(f"[Segment {segment_id}] {'Speculating on' if speculative else 'Starting'}: "
+                     f"'{segment_text[:50]}...'")
+        tasks.append(asyncio.create_task(synthesize_segment(segment_id, segment_text)))
+        return segment_id
+
+    def matched_prefix(segment_text: str, now: float = None) -> str:
+        """Keep speculations that prefix `segment_text`, cancel the rest; returns the unspoken remainder"""
+        remainder = segment_text
+        for index, segment_id in enumerate(speculations):
+            speculated = records[segment_id]['text']
+            if remainder.startswith(speculated):
+                remainder = remainder[len(speculated):].lstrip()
+                if now:
+                    records[segment_id].update(kept=True, final_time=now)
+                continue
+            for diverged in speculations[index:]:
+                logging.info(f"[Segment {diverged}] Text diverged from speculation, cancelling")
+                controller.cancel_segment(diverged, 'speculation diverged')
+            del speculations[index:]
+            break
+        return remainder
+
+    async for text, done in simulate_text_stream(target_text, args.llm_words_per_second,
+                                                 args.llm_revision_rate, seed=args.llm_seed):
+        for segment_text in splitter.update(text, done):
+            remainder = matched_prefix(segment_text, now=time.time())
+            speculations.clear()
+            # Nothing left to say if the speculations covered every word
+            if re.search(r'\w', remainder):
+                launch(remainder, speculative=False)
+        if done:
+            break
+        # Cancel as soon as the pending text stops agreeing with what was speculated
+        unspoken = matched_prefix(splitter.pending)
+        clause_end = max(unspoken.rfind(mark) for mark in CLAUSE_PUNCTUATION + SENTENCE_PUNCTUATION)
+        clause = unspoken[:clause_end + 1] if clause_end >= 0 else unspoken
+        if (len(clause.split()) >= args.speculate_min_words
+                and clause_boundary_confidence(clause) >= args.speculate_confidence):
+            speculations.append(launch(clause.strip(), speculative=True))
+
+    logging.info(f"Text stream complete, {len(tasks)} streams launched")
+    completed_results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = {}
+    first_chunk_latencies = []
+    request_latencies = []
+    for segment_id, result in enumerate(completed_results):
+        if isinstance(result, Exception):
+            logging.error(f"[Segment {segment_id}] Failed: {result}")
+            continue
+        audio, total_latency, first_chunk_latency = result
+        records[segment_id]['first_chunk_latency'] = first_chunk_latency
+        if audio is not None and records[segment_id]['kept']:
+            results[segment_id] = audio
+            if first_chunk_latency:
+                first_chunk_latencies.append(first_chunk_latency)
+            if total_latency is not None:
+                request_latencies.append(total_latency)
+
+    combined_audio = [] if emitter else [results[i] for i in sorted(results)]
+    if combined_audio:
+        final_audio = np.concatenate(combined_audio, dtype=np.float32)
+    else:
+        final_audio = np.array([], dtype=np.float32)
+
+    speculative = [r for r in records.values() if r['speculative']]
+    kept = [r for r in speculative if r['kept']]
+    # A kept speculation saves the wait between its launch and the segment turning
+    # final, but never more than the TTFB the segment would have paid afterwards
+    latency_saved = [
+        min(r['final_time'] - r['launch_time'], r.get('first_chunk_latency') or 0.0)
+        for r in kept if r['final_time']
+    ]
+    wasted = [r['end_time'] - r['launch_time'] for r in speculative if not r['kept'] and r['end_time']]
+    total_time = time.time() - overall_start_time
+    stats = {
+        'total_time': total_time,
+        'num_segments': len(results),
+        'avg_first_chunk_latency': float(np.mean(first_chunk_latencies)) if first_chunk_latencies else 0,
+        'request_latencies': request_latencies,
+        'segment_wall_times': request_latencies,
+        'speculations': len(speculative),
+        'speculation_hits': len(kept),
+        'speculation_hit_rate': len(kept) / len(speculative) if speculative else 0.0,
+        'speculation_latency_saved': sum(latency_saved),
+        'speculation_stream_time_wasted': sum(wasted),
+        'stream_time_total': sum(r['end_time'] - r['launch_time'] for r in records.values() if r['end_time']),
+    }
     return final_audio, total_time, stats
 
 
+async def warm_up(
+    server_url: str,
+    model_name: str,
+    client_pool: TritonClientPool,
+    speakers: List[Tuple[np.ndarray, str]],
+    num_channels: int,
+    warmup_text: str = "Hello.",
+    sample_rate: int = 16000,
+    chunk_overlap_duration: float = 0.1,
+    save_sample_rate: int = 24000,
+    use_spk2info_cache: bool = False,
+) -> dict:
+    """
+    Warm the client engine before real work: readiness probe, channels, one throwaway synthesis per speaker.
+    
+    Args:
+        client_pool: Pool whose channels are pre-established and reused by the real run
+        speakers: (reference waveform, reference text) per configured speaker; ignored with spk2info cache
+        num_channels: Channels to open ahead of time (one per expected concurrent segment)
+        warmup_text: Throwaway text synthesized per speaker
+        
+    Returns:
+        Warm-up report with model readiness (and why the check failed), channel setup time
+        and cold vs. warm TTFB
+    """
+    report = {'model_ready': False, 'error': None, 'channel_setup_time': None, 'cold_ttfb': None, 'warm_ttfb': None}
+    warmup_start_time = time.time()
+    client = client_pool.acquire()
+    try:
+        report['model_ready'] = client.is_model_ready(model_name)
+    except InferenceServerException as e:
+        # Server unreachable or the readiness check refused: reported, not raised
+        report['error'] = str(e)
+    finally:
+        client_pool.release(client)
+    if not report['model_ready']:
+        logging.error(f"Model {model_name} is not ready on {server_url}"
+                      + (f": {report['error']}" if report['error'] else ""))
+        return report
+
+    channel_start_time = time.time()
+    client_pool.prewarm(num_channels)
+    report['channel_setup_time'] = time.time() - channel_start_time
+
+    if use_spk2info_cache:
+        speakers = [(None, '')]
+    # The first request per speaker is cold; a repeat on the first speaker measures the warm path
+    ttfbs = []
+    for speaker_id, (waveform, reference_text) in enumerate(speakers + speakers[:1]):
+        _, _, first_chunk_latency = await synthesize_streaming(
+            server_url,
+            model_name,
+            waveform,
+            reference_text,
+            warmup_text,
+            -(speaker_id + 1),
+            sample_rate,
+            chunk_overlap_duration,
+            save_sample_rate,
+            padding_duration=10,
+            use_spk2info_cache=use_spk2info_cache,
+            client_pool=client_pool,
+        )
+        ttfbs.append(first_chunk_latency)
+    report['cold_ttfb'] = ttfbs[0]
+    report['warm_ttfb'] = ttfbs[-1]
+    report['warmup_time'] = time.time() - warmup_start_time
+    return report
+
+
+SERVER_STAT_PHASES = ('queue', 'compute_input', 'compute_infer', 'compute_output')
+
+
+def snapshot_inference_statistics(
+    sync_triton_client: grpcclient_sync.InferenceServerClient,
+    model_name: str,
+) -> dict:
+    """Snapshot cumulative server-side ModelStatistics durations (nanoseconds) for a model"""
+    response = sync_triton_client.get_inference_statistics(model_name=model_name)
+    snapshot = {'timestamp': time.time(), 'success_count': 0, 'success_ns': 0}
+    for phase in SERVER_STAT_PHASES:
+        snapshot[f'{phase}_ns'] = 0
+    # Sum over all loaded versions of the model
+    for model_stats in response.model_stats:
+        inference_stats = model_stats.inference_stats
+        snapshot['success_count'] += inference_stats.success.count
+        snapshot['success_ns'] += inference_stats.success.ns
+        for phase in SERVER_STAT_PHASES:
+            snapshot[f'{phase}_ns'] += getattr(inference_stats, phase).ns
+    return snapshot
+
+
+def diff_inference_statistics(before: dict, after: dict) -> dict:
+    """Difference of two statistics snapshots, i.e. the server work done in between"""
+    return {key: after[key] - before[key] for key in after}
+
+
+class ServerStatsPoller:
+    """Snapshots ModelStatistics before/after a run, optionally polling in the background"""
+    def __init__(self, server_url: str, model_name: str, interval: float = 0.0):
+        self._server_url = server_url
+        self._model_name = model_name
+        self._interval = interval
+        self._client = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.snapshots = []
+
+    def _snapshot(self):
+        self.snapshots.append(snapshot_inference_statistics(self._client, self._model_name))
+
+    def _poll(self):
+        while not self._stop_event.wait(self._interval):
+            try:
+                self._snapshot()
+            except InferenceServerException as e:
+                logging.warning(f"ModelStatistics poll failed: {e}")
+
+    def start(self):
+        """Take the first snapshot; if it fails the channel is closed and the error re-raised"""
+        self._client = grpcclient_sync.InferenceServerClient(url=self._server_url, verbose=False)
+        try:
+            self._snapshot()
+        except BaseException:
+            self._client.close()
+            self._client = None
+            raise
+        if self._interval > 0:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> dict:
+        """Take the final snapshot and return the server work done during the run"""
+        if self._thread:
+            self._stop_event.set()
+            self._thread.join()
+        try:
+            self._snapshot()
+        finally:
+            self._client.close()
+        return diff_inference_statistics(self.snapshots[0], self.snapshots[-1])
+
+    def peak_queue_latency(self) -> float:
+        """Highest mean queue time (seconds) over any single polling interval"""
+        peak = 0.0
+        for before, after in zip(self.snapshots, self.snapshots[1:]):
+            delta = diff_inference_statistics(before, after)
+            if delta['success_count'] > 0:
+                peak = max(peak, delta['queue_ns'] / delta['success_count'] / 1e9)
+        return peak
+
+
+def attribute_latency(stats: dict, server_delta: dict) -> dict:
+    """
+    Split the mean per-segment latency into client, network, server queue and model execution.
+    
+    Args:
+        stats: Stats returned by synthesize_with_splitting()
+        server_delta: Server work during the run, from ServerStatsPoller.stop()
+        
+    Returns:
+        Mean seconds per segment for each component, or an empty dict if not attributable
+    """
+    request_latencies = stats.get('request_latencies') or []
+    server_requests = server_delta.get('success_count', 0)
+    if not request_latencies or server_requests <= 0:
+        return {}
+    if server_requests > len(request_latencies):
+        logging.warning(f"Server completed {server_requests} requests during the run but this client "
+                        f"sent {len(request_latencies)}; other traffic is included in the attribution")
+
+    mean_request = sum(request_latencies) / len(request_latencies)
+    mean_wall = sum(stats['segment_wall_times']) / len(stats['segment_wall_times'])
+    server_total = server_delta['success_ns'] / server_requests / 1e9
+    server_queue = server_delta['queue_ns'] / server_requests / 1e9
+    model_execution = sum(
+        server_delta[f'{phase}_ns'] for phase in SERVER_STAT_PHASES if phase != 'queue'
+    ) / server_requests / 1e9
+
+    return {
+        'segment_latency': mean_wall,
+        'client': max(mean_wall - mean_request, 0.0),
+        'network': max(mean_request - server_total, 0.0),
+        'server_queue': server_queue,
+        'model_execution': model_execution,
+        'server_other': max(server_total - server_queue - model_execution, 0.0),
+        'server_requests': server_requests,
+    }
+
+
+def load_split_config(path: str) -> dict:
+    """Recommended {'min_words', 'max_words', 'concurrency'} from a tune_split.py result file"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['recommended']
+
+
+async def simulate_barge_in(controller: UtteranceController, sink: AudioSink, after: float):
+    """Interrupt `after` seconds into playback, assuming playback starts with the first output byte"""
+    while sink.first_byte_time is None:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(max(after - (time.time() - sink.first_byte_time), 0.0))
+    controller.cancel_after(after)
+
+
+def serve_from_archive(args) -> bool:
+    """
+    Write the target text from --prompt-archive if it is a prerendered prompt.
+    
+    Runs before anything touches the server, so a hit costs a hash lookup and a
+    file write. Returns whether the text was served.
+    """
+    lookup_start = time.perf_counter()
+    archive = PromptArchive(args.prompt_archive)
+    try:
+        if args.target_sr is not None and args.target_sr != archive.sample_rate:
+            logging.warning(f"{args.prompt_archive} holds {archive.sample_rate} Hz audio, not --target-sr "
+                            f"{args.target_sr}; synthesizing")
+            return False
+        # Only the voice this run asks for; with the input set still undecided, either one
+        voices = []
+        if args.use_spk2info_cache is not False:
+            voices.append(None)
+        if args.use_spk2info_cache is not True:
+            voices.append(args.reference_audio)
+        if not any(archive.has_voice(args.model_name, reference) for reference in voices):
+            logging.info(f"{args.prompt_archive} holds {archive.metadata.get('model_name')} audio of speaker "
+                         f"{archive.speaker} ({archive.metadata.get('reference_audio') or 'spk2info cache'}), "
+                         f"not the requested voice; synthesizing")
+            return False
+        samples = archive.lookup(args.target_text)
+        lookup_time = time.perf_counter() - lookup_start
+        if samples is None:
+            logging.info(f"Not in {args.prompt_archive} ({archive.count} prompts), synthesizing")
+            return False
+        start_time = time.time()
+        sink = open_sink(args.output_path, args.output_format, archive.sample_rate, dither=not args.no_dither)
+        sink.start_time = start_time
+        write_prompt(sink, samples)
+        sink.close()
+        del samples
+    finally:
+        archive.close()
+    
+    logging.info(f"\n{'='*60}")
+    logging.info(f"✓ Served from prompt archive {args.prompt_archive} (speaker {archive.speaker})")
+    logging.info(f"{'='*60}")
+    logging.info(f"  Open and lookup: {lookup_time * 1e6:.0f} us")
+    logging.info(f"  Audio saved to: {args.output_path} ({args.output_format}, "
+                 f"{sink.bytes_written / 1024:.1f} KiB)")
+    logging.info(f"  Output time to first byte: {sink.time_to_first_byte:.3f}s")
+    logging.info(f"  Audio duration: {sink.samples_written / archive.sample_rate:.2f}s")
+    logging.info(f"{'='*60}\n")
+    return True
+
+
+def resolve_model_info(args) -> dict:
+    """
+    Fill in settings left to the models: output rate, input set and streaming support.
+    
+    Probes ModelConfig/ModelMetadata through the on-disk cache (a replay only reads
+    the cache). Explicit settings that contradict a model are corrected with a warning.
+    
+    Returns:
+        Model name -> probed info for the models this run uses, or None if the
+        model cannot serve this client
+    """
+    server_url = f"{args.server_addr}:{args.server_port}"
+    model_names = [name.strip() for name in args.router_models.split(',')] if args.router_models \
+        else [args.model_name]
+    cache = ModelInfoCache(args.model_cache, refresh=args.refresh_model_info)
+    model_infos = {}
+    for model_name in model_names:
+        try:
+            info = cache.lookup(server_url, model_name) if args.replay_trace else cache.get(server_url, model_name)
+        except InferenceServerException as e:
+            logging.warning(f"Could not probe {model_name}, using built-in defaults: {e}")
+            info = None
+        if info is None:
+            continue
+        if not info['decoupled']:
+            logging.error(f"Model {model_name} is not decoupled; this client needs streaming responses")
+            return None
+        model_infos[model_name] = info
+    if model_infos:
+        logging.info(f"Model info ({cache.hits} cached, {cache.probes} probed): " + ', '.join(
+            f"{name} {info['sample_rate']} Hz" for name, info in model_infos.items()
+        ))
+    
+    info = model_infos.get(args.model_name)
+    model_rate = info['sample_rate'] if info else KNOWN_SAMPLE_RATES.get(args.model_name)
+    if args.target_sr is None:
+        args.target_sr = model_rate or 24000
+    elif model_rate and args.target_sr != model_rate and not args.router_models:
+        # Without routing nothing resamples, so the header must carry the model's rate
+        logging.warning(f"--target-sr {args.target_sr} does not match {args.model_name}'s "
+                        f"{model_rate} Hz output; writing {model_rate} Hz")
+        args.target_sr = model_rate
+    
+    # One input set serves every model the run can route to
+    needs_reference = [name for name, info in model_infos.items() if not uses_spk2info(info)]
+    takes_reference = [name for name, info in model_infos.items() if accepts_reference(info)]
+    if args.use_spk2info_cache is None:
+        args.use_spk2info_cache = not needs_reference
+    elif args.use_spk2info_cache and needs_reference:
+        logging.warning(f"{', '.join(needs_reference)} requires reference inputs; not using the spk2info cache")
+        args.use_spk2info_cache = False
+    elif not args.use_spk2info_cache and model_infos and not takes_reference:
+        logging.warning(f"{', '.join(model_infos)} takes no reference inputs; using the spk2info cache")
+        args.use_spk2info_cache = True
+    return model_infos
+
+
 async def main():
     parser = argparse.ArgumentParser(
         description='Streaming TTS client with text splitting for real-time synthesis',
@@ -451,8 +1791,7 @@ async def main():
     parser.add_argument('--server-addr', type=str, default='speechlab-tunnel.southeastasia.cloudapp.azure.com', help='Server address')
     parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
     parser.add_argument('--model-name', type=str, default='cosyvoice2',
-                       choices=['f5_tts', 'spark_tts', 'cosyvoice2'],
-                       help='Model name')
+                       help='Model name; its inputs, datatypes and output rate are read from the server')
     
     # Audio settings
     parser.add_argument('--reference-audio', default="103-1240-0038.wav", type=str,
@@ -465,9 +1804,42 @@ async def main():
                                'real-time text generation from an LLM. The final audio will be combined '
                                'in the correct chronological order!', type=str, help='Text to synthesize')
     parser.add_argument('--output-path', type=str, default='output.wav',
-                       help='Output audio file path')
-    parser.add_argument('--target-sr', type=int, default=24000,
-                       help='Target sample rate (24000 for cosyvoice2, 16000 for spark_tts)')
+                       help="Output audio file path ('-' with --output-format raw for stdout)")
+    parser.add_argument('--output-format', type=str, default='wav16', choices=list(SINK_FORMATS),
+                       help='Streaming output encoding, written chunk-by-chunk as audio arrives')
+    parser.add_argument('--no-dither', action='store_true',
+                       help='Disable TPDF dither when converting to 16-bit PCM')
+    parser.add_argument('--encode-pool', type=str, default='thread', choices=list(POOL_KINDS),
+                       help='Where output encoding runs: inline on the receive path, or a thread/process pool')
+    parser.add_argument('--postprocess-workers', type=int, default=2,
+                       help='Post-processing pool size')
+    parser.add_argument('--postprocess-queue', type=int, default=64,
+                       help='Max in-flight post-processing jobs before the receive path is blocked')
+    parser.add_argument('--max-queued-chunks', type=int, default=64,
+                       help='Per-segment bound on received chunks awaiting the consumer (0 = unbounded)')
+    parser.add_argument('--memory-budget-mb', type=float, default=256,
+                       help='Global budget for queued chunk audio across in-flight segments (0 = unbounded)')
+    parser.add_argument('--backpressure-policy', type=str, default='block', choices=list(BACKPRESSURE_POLICIES),
+                       help='When queues are full: block the gRPC reader, spill to disk, or drop and cancel')
+    parser.add_argument('--spill-dir', type=str, default=None,
+                       help='Directory for spilled chunks (default: system temp dir)')
+    parser.add_argument('--target-sr', type=int, default=None,
+                       help="Output sample rate; default: the model's, from its config")
+    parser.add_argument('--adaptive-concurrency', action='store_true',
+                       help='Cap in-flight segment streams per endpoint with an AIMD limit driven by TTFB')
+    parser.add_argument('--concurrency-initial', type=float, default=4,
+                       help='Initial adaptive concurrency limit')
+    parser.add_argument('--concurrency-max', type=float, default=32,
+                       help='Upper bound for the adaptive concurrency limit')
+    parser.add_argument('--target-ttfb', type=float, default=0.5,
+                       help='TTFB above which the adaptive limit is cut (seconds)')
+    parser.add_argument('--router-models', type=str, default='',
+                       help='Route each segment across these models, best quality first '
+                            '(e.g. cosyvoice2,f5_tts,spark_tts); empty uses --model-name for all')
+    parser.add_argument('--ttfb-budget', type=float, default=0.3,
+                       help='TTFB budget of the first segment when routing (seconds)')
+    parser.add_argument('--router-load-penalty', type=float, default=0.25,
+                       help='Predicted TTFB increase per stream already in flight on a model')
     
     # Streaming settings
     parser.add_argument('--chunk-overlap-duration', type=float, default=0.1,
@@ -478,33 +1850,311 @@ async def main():
                        help='Minimum words per segment when splitting')
     parser.add_argument('--max-words', type=int, default=30,
                        help='Maximum words per segment when splitting')
+    parser.add_argument('--split-config', type=str, default=None,
+                       help='Use min/max words and concurrency recommended by tune_split.py (JSON)')
     
     # Advanced settings
-    parser.add_argument('--use-spk2info-cache', type=bool, default=True,
-                       help='Use speaker info cache')
+    parser.add_argument('--use-spk2info-cache', type=lambda value: value.lower() in ('1', 'true', 'yes'),
+                       default=None,
+                       help="Use speaker info cache (true/false); default: whenever the model's reference inputs "
+                            "are optional")
+    parser.add_argument('--model-cache', type=str, default=DEFAULT_CACHE_PATH,
+                       help='File caching the ModelConfig/ModelMetadata probe results')
+    parser.add_argument('--refresh-model-info', action='store_true',
+                       help='Probe the models again even if the cache is fresh')
+    parser.add_argument('--server-stats', type=str, default='snapshot',
+                       choices=['off', 'snapshot', 'poll'],
+                       help='Attribute latency using server ModelStatistics (before/after or polled)')
+    parser.add_argument('--stats-poll-interval', type=float, default=1.0,
+                       help='ModelStatistics polling interval for --server-stats poll (seconds)')
+    parser.add_argument('--warmup', action='store_true',
+                       help='Probe model readiness, pre-open channels and run throwaway synthesis before real work')
+    parser.add_argument('--warmup-text', type=str, default='Hello.',
+                       help='Throwaway text synthesized per speaker during warm-up')
+    parser.add_argument('--warmup-channels', type=int, default=None,
+                       help='Channels to pre-establish (default: one per text segment)')
+    parser.add_argument('--profile-memory', action='store_true',
+                       help='Report traced peak allocation and peak RSS of the run')
+    parser.add_argument('--speculate', action='store_true',
+                       help='Stream the target text word by word and speculatively synthesize clauses '
+                            'of segments that are not final yet')
+    parser.add_argument('--speculate-min-words', type=int, default=4,
+                       help='Minimum words in a clause before it is speculated on')
+    parser.add_argument('--speculate-confidence', type=float, default=0.6,
+                       help='Minimum boundary confidence to speculate (0.9 sentence end, 0.7 clause '
+                            'punctuation, 0.3 word count alone)')
+    parser.add_argument('--llm-words-per-second', type=float, default=4.0,
+                       help='Simulated LLM generation speed for --speculate')
+    parser.add_argument('--llm-revision-rate', type=float, default=0.0,
+                       help='Probability per word that the simulated LLM emits and then retracts a decoy word')
+    parser.add_argument('--llm-seed', type=int, default=None,
+                       help='Random seed for the simulated LLM stream')
+    parser.add_argument('--barge-in-after', type=float, default=None,
+                       help='Simulate the user interrupting this many seconds into playback '
+                            '(playback assumed to start at the first output byte)')
+    parser.add_argument('--playout', action='store_true',
+                       help='Play the output in real time through an adaptive jitter buffer '
+                            '(the output file then fills at playback speed)')
+    parser.add_argument('--target-underrun', type=float, default=0.01,
+                       help='Per-chunk underrun probability the --playout pre-roll is sized for')
+    parser.add_argument('--initial-preroll', type=float, default=0.2,
+                       help='--playout pre-roll until enough chunk gaps have been observed (seconds)')
+    parser.add_argument('--save-timeline', type=str, default=None,
+                       help='Save the chunk arrival timeline seen by --playout, for jitter_buffer.py --simulate')
+    
+    parser.add_argument('--record-trace', type=str, default=None,
+                       help='Record every stream (request metadata, response timing and payloads) '
+                            'to this binary trace file')
+    parser.add_argument('--replay-trace', type=str, default=None,
+                       help='Answer requests from a recorded trace instead of the server')
+    parser.add_argument('--replay-time-scale', type=float, default=1.0,
+                       help='Stretch the recorded response timing by this factor (0.5 = twice as fast)')
+    
+    parser.add_argument('--channel-profile', type=str, default=None,
+                       help='gRPC channel profile (default, tunnel, lan), optionally with overrides as '
+                            '"name:key=value,..."; segment streams then reuse pooled channels')
+    parser.add_argument('--padding-ladder', type=float, nargs='+', default=None,
+                       help='Pad the reference to the smallest of these bucket sizes (seconds) that fits '
+                            'the estimated speech, e.g. 2 4 8 16; default: legacy 10 s multiples')
+    parser.add_argument('--reference-dtype', type=str, default='FP32', choices=['auto'] + sorted(WIRE_DTYPES),
+                       help="reference_wav wire datatype; 'auto' uses what the model's metadata declares")
+    parser.add_argument('--reference-window', action='store_true',
+                       help='Send the best voiced window of the reference instead of the whole file')
+    parser.add_argument('--reference-window-range', type=float, nargs=2, default=list(DEFAULT_WINDOW_RANGE),
+                       metavar=('MIN', 'MAX'), help='Reference window length range in seconds')
+    parser.add_argument('--reference-window-text', type=str, default=None,
+                       help='Transcript of the selected window; without it, a window that drops speech '
+                            'falls back to trimming edge silence so --reference-text stays aligned')
+    parser.add_argument('--trim-silence', action='store_true',
+                       help='Trim leading/trailing silence while streaming and cap pauses between segments')
+    parser.add_argument('--silence-threshold-db', type=float, default=-45.0,
+                       help='--trim-silence: peak level (dBFS) below which a sample counts as silence')
+    parser.add_argument('--max-pause', type=float, default=0.25,
+                       help='--trim-silence: longest pause between segments (seconds)')
+    parser.add_argument('--max-internal-pause', type=float, default=1.0,
+                       help='--trim-silence: longest pause inside a segment (seconds)')
+    parser.add_argument('--prompt-archive', type=str, default=None,
+                       help='Archive of prerendered prompts (prompt_archive.py build); a target text found '
+                            'in it is written from the archive without contacting the server')
     
     args = parser.parse_args()
+    channel_profile = None
+    if args.channel_profile:
+        try:
+            channel_profile = parse_channel_profile(args.channel_profile)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.save_timeline and not args.playout:
+        parser.error("--save-timeline requires --playout")
+    if args.replay_trace and (args.record_trace or args.warmup):
+        parser.error("--replay-trace cannot be combined with --record-trace or --warmup")
+    if args.speculate and args.router_models:
+        parser.error("--router-models is not supported with --speculate")
+    split_concurrency = None
+    if args.split_config:
+        split_config = load_split_config(args.split_config)
+        args.min_words, args.max_words = split_config['min_words'], split_config['max_words']
+        split_concurrency = split_config.get('concurrency')
+        logging.info(f"Split config from {args.split_config}: {split_config}")
+    if args.prompt_archive and serve_from_archive(args):
+        return
+    model_infos = resolve_model_info(args)
+    if model_infos is None:
+        return
+    router = None
+    if args.router_models:
+        try:
+            router = ModelRouter(
+                [name.strip() for name in args.router_models.split(',')],
+                ttfb_budget=args.ttfb_budget,
+                load_penalty=args.router_load_penalty,
+                sample_rates={name: info['sample_rate'] for name, info in model_infos.items()},
+            )
+        except ValueError as e:
+            parser.error(str(e))
+    if args.profile_memory:
+        tracemalloc.start()
     
     # Load reference audio
     logging.info(f"Loading reference audio: {args.reference_audio}")
     waveform, sample_rate = load_audio(args.reference_audio, target_sample_rate=16000)
     logging.info(f"Reference audio loaded: {len(waveform)} samples at {sample_rate}Hz")
+    if args.reference_window and not args.use_spk2info_cache:
+        full_duration = len(waveform) / sample_rate
+        waveform, args.reference_text, window = window_reference(
+            waveform, sample_rate, args.reference_text, args.reference_window_text, *args.reference_window_range
+        )
+        logging.info(f"Reference window ({window['mode']}): {window['start'] / sample_rate:.2f}-"
+                     f"{window['end'] / sample_rate:.2f}s, {full_duration:.2f}s -> {window['duration']:.2f}s, "
+                     f"{window['voiced']:.2f}s voiced")
+    
+    client_pool = None
+    warmup_report = None
+    recorder = None
+    if args.replay_trace:
+        streams = load_trace(args.replay_trace)
+        client_pool = ReplayClientPool(streams, args.replay_time_scale)
+        # There is no server behind a replay to ask for statistics
+        args.server_stats = 'off'
+        logging.info(f"Replaying {len(streams)} streams from {args.replay_trace} "
+                     f"at time scale {args.replay_time_scale}")
+    elif args.record_trace:
+        recorder = TraceRecorder(args.record_trace)
+    payload_optimizer = None
+    if not args.use_spk2info_cache and (args.padding_ladder or args.reference_dtype != 'FP32'):
+        wire_dtypes = {}
+        if args.reference_dtype != 'FP32':
+            for model_name, info in model_infos.items():
+                if accepts_reference(info):
+                    wire_dtypes[model_name] = choose_wire_dtype(model_name, info['inputs']['reference_wav'],
+                                                                args.reference_dtype)
+            if not model_infos:
+                logging.warning("No model metadata, sending FP32 references")
+        payload_optimizer = ReferencePayloadOptimizer(args.padding_ladder, wire_dtypes=wire_dtypes)
+        padding = f"ladder {list(payload_optimizer.ladder)} s" if payload_optimizer.ladder else "legacy 10 s multiples"
+        logging.info(f"Reference payload: padding {padding}, wire datatypes {wire_dtypes or 'FP32'}")
+    if channel_profile and not client_pool:
+        client_pool = TritonClientPool(f"{args.server_addr}:{args.server_port}", channel_profile=channel_profile)
+        logging.info(f"Channel profile {channel_profile.describe()}")
+    if args.warmup:
+        server_url = f"{args.server_addr}:{args.server_port}"
+        client_pool = client_pool or TritonClientPool(server_url)
+        num_channels = args.warmup_channels or len(
+            split_text_by_punctuation(args.target_text, args.min_words, args.max_words)
+        )
+        logging.info(f"Warming up {args.model_name}: {num_channels} channels, throwaway synthesis...")
+        warmup_report = await warm_up(
+            server_url,
+            args.model_name,
+            client_pool,
+            [(waveform, args.reference_text)],
+            num_channels,
+            warmup_text=args.warmup_text,
+            sample_rate=sample_rate,
+            chunk_overlap_duration=args.chunk_overlap_duration,
+            save_sample_rate=args.target_sr,
+            use_spk2info_cache=args.use_spk2info_cache,
+        )
+        if not warmup_report['model_ready']:
+            client_pool.close()
+            return
+        logging.info(f"Warm-up done in {warmup_report['warmup_time']:.3f}s "
+                     f"(channels {warmup_report['channel_setup_time']:.3f}s)")
+    
+    stats_poller = None
+    if args.server_stats != 'off':
+        stats_poller = ServerStatsPoller(
+            f"{args.server_addr}:{args.server_port}",
+            # An empty name covers every model, as routed segments span several
+            '' if args.router_models else args.model_name,
+            interval=args.stats_poll_interval if args.server_stats == 'poll' else 0.0,
+        )
+        try:
+            stats_poller.start()
+        except InferenceServerException as e:
+            logging.warning(f"ModelStatistics unavailable, skipping latency attribution: {e}")
+            stats_poller = None
     
     start_time = time.time()
+    sink = open_sink(args.output_path, args.output_format, args.target_sr, dither=not args.no_dither)
+    sink.start_time = start_time
+    postprocessor = None
+    output_sink = sink
+    if args.encode_pool != 'inline':
+        postprocessor = PostProcessor(
+            workers=args.postprocess_workers,
+            max_pending=args.postprocess_queue,
+            operation_pools={'encode': args.encode_pool},
+        )
+        output_sink = PooledSink(sink, postprocessor)
+    playout = None
+    if args.playout:
+        playout = JitterBufferSink(
+            output_sink,
+            AdaptivePreroll(args.target_underrun, initial_preroll=args.initial_preroll),
+        )
+        output_sink = playout
+    trimmer = None
+    if args.trim_silence:
+        # Before the jitter buffer, so it buffers and paces only audible audio
+        trimmer = SilenceTrimmer(args.target_sr, args.silence_threshold_db, args.max_pause, args.max_internal_pause)
+        output_sink = SilenceTrimSink(output_sink, trimmer)
+    flow_controller = FlowController(
+        max_queued_chunks=args.max_queued_chunks,
+        max_bytes=int(args.memory_budget_mb * 2**20),
+        policy=args.backpressure_policy,
+        spill_dir=args.spill_dir,
+    )
+    lag_monitor = EventLoopLagMonitor()
+    lag_monitor.start()
+    controller = UtteranceController(args.target_sr)
+    limiters = None
+    if args.adaptive_concurrency:
+        limiters = EndpointLimiters(
+            initial_limit=split_concurrency or args.concurrency_initial,
+            max_limit=args.concurrency_max,
+            target_ttfb=args.target_ttfb,
+        )
+    elif split_concurrency:
+        # A tuned static limit: AIMD pinned to a single value
+        limiters = EndpointLimiters(
+            initial_limit=split_concurrency, min_limit=split_concurrency, max_limit=split_concurrency,
+        )
+    barge_in_task = None
+    if args.barge_in_after is not None:
+        barge_in_task = asyncio.create_task(simulate_barge_in(controller, sink, args.barge_in_after))
     
     # Synthesize with text splitting and streaming
     logging.info(f"\n{'='*60}")
     logging.info("Starting streaming synthesis with text splitting...")
     logging.info(f"{'='*60}\n")
     
-    final_audio, total_time, stats = await synthesize_with_splitting(
-        args, waveform, args.reference_text, args.target_text, sample_rate
-    )
+    try:
+        if args.speculate:
+            synthesis = synthesize_speculative(
+                args, waveform, args.reference_text, args.target_text, sample_rate,
+                client_pool=client_pool,
+                sink=output_sink,
+                flow_controller=flow_controller,
+                controller=controller,
+                recorder=recorder,
+                payload_optimizer=payload_optimizer,
+            )
+        else:
+            synthesis = synthesize_with_splitting(
+                args, waveform, args.reference_text, args.target_text, sample_rate,
+                client_pool=client_pool,
+                sink=output_sink,
+                flow_controller=flow_controller,
+                controller=controller,
+                router=router,
+                limiters=limiters,
+                recorder=recorder,
+                payload_optimizer=payload_optimizer,
+            )
+        _, total_time, stats = await synthesis
+    finally:
+        if barge_in_task:
+            barge_in_task.cancel()
+        output_sink.close()
+        await lag_monitor.stop()
+        if postprocessor:
+            postprocessor.shutdown()
+        if client_pool:
+            client_pool.close()
+        if recorder:
+            recorder.close()
+    
+    attribution = {}
+    if stats_poller:
+        try:
+            attribution = attribute_latency(stats, stats_poller.stop())
+        except InferenceServerException as e:
+            logging.warning(f"ModelStatistics unavailable after run: {e}")
     
-    # Save audio
-    if final_audio is not None and len(final_audio) > 0:
-        sf.write(args.output_path, final_audio, args.target_sr)
-        duration = len(final_audio) / args.target_sr
+    # Audio was already written by the streaming sink
+    if sink.samples_written > 0:
+        duration = sink.samples_written / args.target_sr
         total_time = time.time() - start_time
         rtf = total_time / duration
         
@@ -514,9 +2164,88 @@ async def main():
         logging.info(f"  Total time: {total_time:.2f}s")
         logging.info(f"  Segments processed: {stats['num_segments']}")
         logging.info(f"  Average first chunk latency: {stats['avg_first_chunk_latency']:.3f}s")
-        logging.info(f"  Audio saved to: {args.output_path}")
+        if warmup_report and warmup_report['cold_ttfb'] is not None:
+            logging.info(f"  Warm-up TTFB: cold {warmup_report['cold_ttfb']:.3f}s, "
+                         f"warm {warmup_report['warm_ttfb']:.3f}s")
+        logging.info(f"  Audio saved to: {args.output_path} ({args.output_format}, "
+                     f"{sink.bytes_written / 1024:.1f} KiB)")
+        logging.info(f"  Output time to first byte: {sink.time_to_first_byte:.3f}s")
         logging.info(f"  Audio duration: {duration:.2f}s")
         logging.info(f"  Real-time factor: {rtf:.3f}")
+        if attribution:
+            logging.info(f"  Mean segment latency: {attribution['segment_latency']:.3f}s "
+                         f"over {attribution['server_requests']} server requests")
+            logging.info(f"    Client:          {attribution['client']:.3f}s")
+            logging.info(f"    Network:         {attribution['network']:.3f}s")
+            logging.info(f"    Server queue:    {attribution['server_queue']:.3f}s")
+            logging.info(f"    Model execution: {attribution['model_execution']:.3f}s")
+            logging.info(f"    Server other:    {attribution['server_other']:.3f}s")
+            if args.server_stats == 'poll':
+                logging.info(f"    Peak interval queue: {stats_poller.peak_queue_latency():.3f}s")
+        log_stage_metrics(postprocessor, lag_monitor)
+        if payload_optimizer:
+            payload = payload_optimizer.stats()
+            logging.info(f"  Reference payload: {payload['bytes_sent'] / 1024:.1f} KiB sent over "
+                         f"{payload['requests']} requests, {payload['bytes_saved_per_request'] / 1024:.1f} KiB "
+                         f"saved per request vs. 10 s FP32 padding")
+        if recorder:
+            logging.info(f"  Trace recorded to: {args.record_trace} ({recorder.bytes_written / 1024:.1f} KiB)")
+        if args.replay_trace:
+            logging.info(f"  Trace replay: {client_pool.replayed} streams replayed, "
+                         f"{client_pool.unmatched} requests without a recorded stream")
+        if trimmer:
+            trimmed = trimmer.stats()
+            logging.info(f"  Silence trimmed: first sound {trimmed['leading_ms']:.0f} ms sooner, "
+                         f"{trimmed['boundary_ms']:.0f} ms between segments, {trimmed['internal_ms']:.0f} ms "
+                         f"inside segments, {trimmed['trailing_ms']:.0f} ms at the end "
+                         f"({trimmed['input_duration']:.2f}s -> {trimmed['output_duration']:.2f}s)")
+        if playout:
+            jitter = playout.stats()
+            start_latency = f"{jitter['start_latency'] * 1000:.0f} ms" if jitter['start_latency'] is not None else "n/a"
+            logging.info(f"  Playout: start {start_latency} after first chunk, {jitter['underruns']} underruns "
+                         f"({jitter['stall_time']:.2f}s stalled), pre-roll now {jitter['preroll'] * 1000:.0f} ms")
+            logging.info(f"    Buffered: mean {jitter['mean_buffered'] * 1000:.0f} ms, "
+                         f"max {jitter['max_buffered'] * 1000:.0f} ms")
+            if args.save_timeline:
+                playout.save_timeline(args.save_timeline)
+                logging.info(f"    Timeline saved to: {args.save_timeline}")
+        flow = flow_controller.stats()
+        logging.info(f"  Flow control ({flow['policy']}): peak queued {flow['peak_bytes'] / 2**20:.2f} MiB, "
+                     f"reader blocked {flow['blocked_time']:.3f}s, spilled {flow['spilled_chunks']} chunks "
+                     f"({flow['spilled_bytes'] / 2**20:.2f} MiB), dropped segments {flow['dropped_segments']}")
+        for endpoint, limit in stats.get('concurrency_limits', {}).items():
+            history = ' -> '.join(f"{limit_value:.1f}@{offset:.1f}s" for offset, limit_value, _ in limit['history'][-8:])
+            logging.info(f"  Concurrency limit {endpoint}: now {limit['limit']:.1f} "
+                         f"(range {limit['min_limit_seen']:.1f}-{limit['max_limit_seen']:.1f}, "
+                         f"{limit['decreases']} cuts), peak in flight {limit['peak_in_flight']}, "
+                         f"total wait for slots {limit['wait_time']:.3f}s")
+            logging.info(f"    Recent limit history: {history}")
+        if router:
+            for model_name, routed in router.report().items():
+                mean_ttfb = f"{routed['mean_ttfb']:.3f}s" if routed['mean_ttfb'] is not None else "n/a"
+                logging.info(f"  Routed to {model_name} ({router.sample_rate(model_name)} Hz): "
+                             f"{routed['segments']} segments, mean TTFB {mean_ttfb}, "
+                             f"over budget {routed['budget_misses']}")
+        if args.speculate:
+            logging.info(f"  Speculation: {stats['speculation_hits']}/{stats['speculations']} kept "
+                         f"(hit rate {stats['speculation_hit_rate'] * 100:.0f}%), "
+                         f"latency saved {stats['speculation_latency_saved']:.3f}s")
+            logging.info(f"    Stream time on discarded speculations: {stats['speculation_stream_time_wasted']:.3f}s "
+                         f"of {stats['stream_time_total']:.3f}s total")
+        if controller.cancel_time is not None:
+            saved = controller.report()
+            server_saved = (f"{saved['server_time_saved']:.2f}s" if saved['server_time_saved'] is not None
+                            else "n/a (no completed segment)")
+            teardown = f"{saved['teardown_time'] * 1000:.0f} ms" if saved['teardown_time'] is not None else "n/a"
+            logging.info(f"  Barge-in ({controller.cancel_reason}): {saved['cancelled_segments']} streams cancelled "
+                         f"(teardown {teardown}), {saved['dropped_segments']} segments never sent")
+            logging.info(f"    Audio discarded: {saved['audio_discarded']:.2f}s, est. audio not generated: "
+                         f"{saved['audio_saved']:.2f}s, est. server time saved: {server_saved}")
+        if args.profile_memory:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            # ru_maxrss is reported in kilobytes on Linux
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            logging.info(f"  Peak traced allocation: {traced_peak / 2**20:.1f} MiB, peak RSS: {peak_rss:.1f} MiB")
         logging.info(f"{'='*60}\n")
     else:
         logging.error("\n✗ Failed to synthesize audio")
@@ -14,24 +14,26 @@ python3 client_grpc_simple_no_reference_spk.py \
     --output-path output.wav \
     --min-words 5 \
     --max-words 20
+
+# IVR prompt as 8 kHz G.711 mu-law in 20 ms frames
+python3 client_grpc_simple_no_reference_spk.py --output-format ulaw --output-path prompt_ulaw.wav
 """
 
 import argparse
 import asyncio
 import functools
 import logging
-import queue
 import random
 import re
 import time
 import uuid
-from typing import List, Tuple
+from typing import Callable, List, Tuple
 
 import numpy as np
-import soundfile as sf
 import tritonclient.grpc as grpcclient_sync
-from tritonclient.utils import np_to_triton_dtype, InferenceServerException
-import ipdb
+
+from audio_sinks import SINK_FORMATS, AudioSink, open_sink
+from client_grpc_simple import OrderedAudioEmitter, UserData, run_sync_streaming_inference
 
 logging.basicConfig(
     level=logging.INFO,
@@ -39,32 +41,6 @@ logging.basicConfig(
 )
 
 
-class UserData:
-    """User data for streaming inference callback"""
-    def __init__(self):
-        self._completed_requests = queue.Queue()
-        self._first_chunk_time = None
-        self._start_time = None
-
-    def record_start_time(self):
-        self._start_time = time.time()
-
-    def get_first_chunk_latency(self):
-        if self._first_chunk_time and self._start_time:
-            return self._first_chunk_time - self._start_time
-        return None
-
-
-def callback(user_data, result, error):
-    """Callback for streaming inference"""
-    if user_data._first_chunk_time is None and not error:
-        user_data._first_chunk_time = time.time()
-    if error:
-        user_data._completed_requests.put(error)
-    else:
-        user_data._completed_requests.put(result)
-
-
 def split_text_by_punctuation(text: str, min_words: int = 10, max_words: int = 30) -> List[str]:
     """
     Split text at punctuation marks with min_words and max_words constraints.
@@ -79,7 +55,6 @@ def split_text_by_punctuation(text: str, min_words: int = 10, max_words: int = 3
     """
     # Split by sentence-ending punctuation while keeping the punctuation
     sentences = re.split(r'([,.:;!?。，！？；：])', text)
-    # ipdb.set_trace()
     segments = []
     current_segment = []
     current_word_count = 0
@@ -155,104 +130,6 @@ def prepare_request_input_output(
     return inputs, outputs
 
 
-def run_sync_streaming_inference(
-    sync_triton_client: grpcclient_sync.InferenceServerClient,
-    model_name: str,
-    inputs: list,
-    outputs: list,
-    request_id: str,
-    user_data: UserData,
-    chunk_overlap_duration: float,
-    save_sample_rate: int,
-    segment_id: int = 0,
-) -> Tuple[np.ndarray, float, float]:
-    """Run synchronous streaming inference and receive audio chunks in real-time"""
-    start_time_total = time.time()
-    user_data.record_start_time()
-
-    # Establish stream
-    sync_triton_client.start_stream(callback=functools.partial(callback, user_data))
-
-    # Send request
-    sync_triton_client.async_stream_infer(
-        model_name,
-        inputs,
-        request_id=request_id,
-        outputs=outputs,
-        enable_empty_final_response=True,
-    )
-
-    # Process results in real-time
-    audios = []
-    chunk_count = 0
-    while True:
-        try:
-            result = user_data._completed_requests.get(timeout=30)
-            if isinstance(result, InferenceServerException):
-                logging.error(f"[Segment {segment_id}] RPC error: {result}")
-                sync_triton_client.stop_stream()
-                return None, None, None
-
-            response = result.get_response()
-            final = response.parameters["triton_final_response"].bool_param
-            if final is True:
-                break
-
-            audio_chunk = result.as_numpy("waveform").reshape(-1)
-            if audio_chunk.size > 0:
-                chunk_count += 1
-                audios.append(audio_chunk)
-                
-                # Log real-time chunk reception
-                if chunk_count == 1:
-                    first_chunk_latency = user_data.get_first_chunk_latency()
-                    logging.info(f"[Segment {segment_id}] 🎯 First chunk received! "
-                               f"Latency: {first_chunk_latency:.3f}s (TTFB), "
-                               f"size: {len(audio_chunk)} samples")
-                else:
-                    logging.info(f"[Segment {segment_id}] Chunk {chunk_count} received, "
-                               f"size: {len(audio_chunk)} samples, "
-                               f"total so far: {sum(len(a) for a in audios)} samples")
-
-        except queue.Empty:
-            logging.error(f"[Segment {segment_id}] Timeout waiting for response")
-            sync_triton_client.stop_stream()
-            return None, None, None
-
-    sync_triton_client.stop_stream()
-    end_time_total = time.time()
-    total_request_latency = end_time_total - start_time_total
-    first_chunk_latency = user_data.get_first_chunk_latency()
-
-    # Reconstruct audio
-    if audios:
-        if model_name == "spark_tts":
-            # Use cross-fade for spark_tts
-            cross_fade_samples = int(chunk_overlap_duration * save_sample_rate)
-            fade_out = np.linspace(1, 0, cross_fade_samples)
-            fade_in = np.linspace(0, 1, cross_fade_samples)
-            
-            if len(audios) == 1:
-                reconstructed_audio = audios[0]
-            else:
-                reconstructed_audio = audios[0][:-cross_fade_samples]
-                for i in range(1, len(audios)):
-                    cross_faded_overlap = (audios[i][:cross_fade_samples] * fade_in +
-                                         audios[i - 1][-cross_fade_samples:] * fade_out)
-                    middle_part = audios[i][cross_fade_samples:-cross_fade_samples]
-                    reconstructed_audio = np.concatenate([reconstructed_audio, cross_faded_overlap, middle_part])
-                reconstructed_audio = np.concatenate([reconstructed_audio, audios[-1][-cross_fade_samples:]])
-        else:
-            reconstructed_audio = np.concatenate(audios)
-        
-        logging.info(f"[Segment {segment_id}] ✓ Synthesis completed in {total_request_latency:.3f}s, "
-                   f"total audio: {len(reconstructed_audio)} samples, chunks: {chunk_count}")
-    else:
-        reconstructed_audio = np.array([], dtype=np.float32)
-
-    return reconstructed_audio, total_request_latency, first_chunk_latency
-
-
 async def synthesize_streaming(
     server_url: str,
     model_name: str,
@@ -260,6 +137,7 @@ async def synthesize_streaming(
     segment_id: int,
     chunk_overlap_duration: float = 0.1,
     save_sample_rate: int = 24000,
+    on_audio: Callable[[np.ndarray], None] = None,
 ) -> Tuple[np.ndarray, float, float]:
     """Synthesize audio using streaming mode with real-time chunk reception"""
     sync_triton_client = None
@@ -285,6 +163,7 @@ async def synthesize_streaming(
             chunk_overlap_duration,
             save_sample_rate,
             segment_id,
+            on_audio,
         )
         
         return audio, total_latency, first_chunk_latency
@@ -297,8 +176,9 @@ async def synthesize_streaming(
 async def synthesize_with_splitting(
     args,
     target_text: str,
+    sink: AudioSink = None,
 ) -> Tuple[np.ndarray, float, dict]:
-    """Synthesize with text splitting and concurrent streaming"""
+    """Synthesize with text splitting and concurrent streaming, writing to `sink` in order when given"""
     segments = split_text_by_punctuation(target_text, args.min_words, args.max_words)
     
     logging.info(f"Text split into {len(segments)} segments:")
@@ -307,6 +187,7 @@ async def synthesize_with_splitting(
     
     overall_start_time = time.time()
     results = {}
+    emitter = OrderedAudioEmitter(sink) if sink else None
     
     async def synthesize_segment(segment_id: int, segment_text: str):
         """Synthesize a single segment with streaming"""
@@ -320,12 +201,16 @@ async def synthesize_with_splitting(
                 segment_id,
                 args.chunk_overlap_duration,
                 args.target_sr,
+                on_audio=functools.partial(emitter.push, segment_id) if emitter else None,
             )
             return (segment_id, audio, total_latency, first_chunk_latency)
                 
         except Exception as e:
             logging.error(f"[Segment {segment_id}] Failed: {str(e)}")
             raise
+        finally:
+            if emitter:
+                await emitter.finish_async(segment_id)
     
     # Launch tasks concurrently
     tasks = []
@@ -359,11 +244,11 @@ async def synthesize_with_splitting(
     logging.info("Combining audio segments in chronological order...")
     combined_audio = []
     for i in range(len(segments)):
-        if i in results:
+        if i not in results:
+            logging.error(f"  Missing audio for segment {i}")
+        elif not emitter:
             combined_audio.append(results[i])
             logging.info(f"  Added segment {i} to final audio ({len(results[i])} samples)")
-        else:
-            logging.error(f"  Missing audio for segment {i}")
     
     if combined_audio:
         final_audio = np.concatenate(combined_audio)
@@ -398,7 +283,9 @@ async def main():
     # Audio settings
     parser.add_argument('--target-text', default='Please call the DBS lost and stolen hotline. You will need your NRIC for verification.', type=str, help='Text to synthesize')
     parser.add_argument('--output-path', type=str, default='output_DBS_yizhou.wav',
-                       help='Output audio file path')
+                       help="Output audio file path ('-' with --output-format raw/ulaw/alaw for stdout)")
+    parser.add_argument('--output-format', type=str, default='wav16', choices=list(SINK_FORMATS),
+                       help='Streaming output encoding; ulaw/alaw produce 8 kHz G.711 in 20 ms frames')
     parser.add_argument('--target-sr', type=int, default=24000,
                        help='Target sample rate (24000 for cosyvoice2, 16000 for spark_tts)')
     
@@ -415,20 +302,24 @@ async def main():
     args = parser.parse_args()
     
     start_time = time.time()
+    sink = open_sink(args.output_path, args.output_format, args.target_sr)
+    sink.start_time = start_time
     
     # Synthesize with text splitting and streaming
     logging.info(f"\n{'='*60}")
     logging.info("Starting streaming synthesis with cached speaker info...")
     logging.info(f"{'='*60}\n")
     
-    final_audio, total_time, stats = await synthesize_with_splitting(
-        args, args.target_text
-    )
+    try:
+        _, total_time, stats = await synthesize_with_splitting(
+            args, args.target_text, sink=sink
+        )
+    finally:
+        sink.close()
     
-    # Save audio
-    if final_audio is not None and len(final_audio) > 0:
-        sf.write(args.output_path, final_audio, args.target_sr)
-        duration = len(final_audio) / args.target_sr
+    # Audio was already written by the streaming sink
+    if sink.samples_written > 0:
+        duration = sink.samples_written / args.target_sr
         total_time = time.time() - start_time
         rtf = total_time / duration
         
@@ -438,7 +329,9 @@ async def main():
         logging.info(f"  Total time: {total_time:.2f}s")
         logging.info(f"  Segments processed: {stats['num_segments']}")
         logging.info(f"  Average first chunk latency: {stats['avg_first_chunk_latency']:.3f}s")
-        logging.info(f"  Audio saved to: {args.output_path}")
+        logging.info(f"  Audio saved to: {args.output_path} ({args.output_format}, "
+                     f"{sink.bytes_written / 1024:.1f} KiB)")
+        logging.info(f"  Output time to first byte: {sink.time_to_first_byte:.3f}s")
         logging.info(f"  Audio duration: {duration:.2f}s")
         logging.info(f"  Real-time factor: {rtf:.3f}")
         logging.info(f"{'='*60}\n")
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+"""
+Weighted fair scheduling of segment streams across sessions sharing one Triton pool.
+
+synthesize_with_splitting() launches every segment of an utterance at once. When
+sessions share a server, a 200-segment document from one caller fills the queue
+ahead of every interactive user's first segment. FairScheduler admits segment
+streams under one shared in-flight budget:
+- each session has its own FIFO, and each tenant's sessions are served round robin
+- tenants share the budget by deficit round robin (DRR), weighted per tenant. A
+  segment costs its word count, so tenants with long segments are not favoured
+- priority classes: a queued interactive segment is always admitted before queued
+  bulk ones, and interactive_reserve slots are never given to bulk streams, so an
+  interactive first segment does not wait for long bulk streams to finish. Bulk
+  streams already running are not cancelled: that would waste the server time
+  they have used
+Queue wait, TTFB (queue wait + stream TTFB) and each session's first-segment TTFB
+are reported per class.
+
+Usage:
+# FIFO vs DRR: one bulk document and a stream of interactive sessions against a local server
+python3 fair_scheduler.py --server-addr localhost --bulk-segments 200 --interactive-sessions 10 --max-in-flight 4
+
+# In the gateway
+python3 tts_gateway.py serve --max-in-flight 8 --tenant-weights acme=2 free=1
+"""
+
+import argparse
+import asyncio
+import collections
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+PRIORITY_CLASSES = ('interactive', 'bulk')
+SCHEDULING_POLICIES = ('drr', 'fifo')
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    return float(np.percentile(values, q)) if values else None
+
+
+class _Ticket:
+    """One segment stream waiting for, or holding, a slot"""
+    __slots__ = ('session', 'cost', 'future', 'enqueued', 'granted', 'first')
+
+    def __init__(self, session: 'ScheduledSession', cost: float, future: asyncio.Future, first: bool):
+        self.session = session
+        self.cost = cost
+        self.future = future
+        self.enqueued = time.time()
+        self.granted = None
+        self.first = first
+
+
+class _TenantQueue:
+    """A tenant's waiting segments: one FIFO per session, sessions served round robin"""
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.deficit = 0.0
+        self.sessions: Dict[str, collections.deque] = collections.OrderedDict()
+
+    def push(self, ticket: _Ticket):
+        self.sessions.setdefault(ticket.session.key, collections.deque()).append(ticket)
+
+    def peek(self) -> _Ticket:
+        return next(iter(self.sessions.values()))[0]
+
+    def pop(self) -> _Ticket:
+        key, queue = next(iter(self.sessions.items()))
+        ticket = queue.popleft()
+        if queue:
+            self.sessions.move_to_end(key)
+        else:
+            del self.sessions[key]
+        return ticket
+
+    def remove(self, ticket: _Ticket) -> bool:
+        queue = self.sessions.get(ticket.session.key)
+        if queue is None or ticket not in queue:
+            return False
+        queue.remove(ticket)
+        if not queue:
+            del self.sessions[ticket.session.key]
+        return True
+
+
+class _ClassQueue:
+    """Deficit round robin over the tenants of one priority class"""
+    def __init__(self, quantum: float, weights: Dict[str, float]):
+        self.quantum = quantum
+        self.weights = weights
+        self.tenants: Dict[str, _TenantQueue] = {}
+        # Tenants with waiting segments, in service order
+        self.active = collections.deque()
+        self.waiting = 0
+
+    def push(self, ticket: _Ticket):
+        tenant = ticket.session.tenant
+        queue = self.tenants.get(tenant)
+        if queue is None:
+            queue = self.tenants[tenant] = _TenantQueue(self.weights.get(tenant, 1.0))
+        if not queue.sessions:
+            self.active.append(tenant)
+        queue.push(ticket)
+        self.waiting += 1
+
+    def pop(self) -> _Ticket:
+        while True:
+            queue = self.tenants[self.active[0]]
+            ticket = queue.peek()
+            if queue.deficit >= ticket.cost:
+                queue.deficit -= ticket.cost
+                queue.pop()
+                self.waiting -= 1
+                if not queue.sessions:
+                    # An idle tenant does not bank credit
+                    queue.deficit = 0.0
+                    self.active.popleft()
+                return ticket
+            # Credit for the tenant's next turn, which comes after every other active tenant's
+            queue.deficit += self.quantum * queue.weight
+            self.active.rotate(-1)
+
+    def remove(self, ticket: _Ticket):
+        queue = self.tenants.get(ticket.session.tenant)
+        if queue is None or not queue.remove(ticket):
+            return
+        self.waiting -= 1
+        if not queue.sessions:
+            queue.deficit = 0.0
+            self.active.remove(ticket.session.tenant)
+
+
+class FairScheduler:
+    """
+    Admits segment streams from many sessions under one in-flight budget.
+
+    Args:
+        max_in_flight: Segment streams allowed to run at once across all sessions
+        quantum: Words of credit a tenant of weight 1 gets per DRR round
+        tenant_weights: Tenant name -> share weight; unlisted tenants weigh 1
+        interactive_reserve: Slots bulk streams never take
+        policy: 'drr', or 'fifo' (arrival order, no classes) as a baseline
+    """
+    def __init__(self, max_in_flight: int = 8, quantum: float = 20.0, tenant_weights: Dict[str, float] = None,
+                 interactive_reserve: int = 1, policy: str = 'drr'):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+        # A tenant's deficit must grow every round, or _ClassQueue.pop() never returns
+        if not quantum >= 1:
+            raise ValueError(f"quantum must be at least one word, got {quantum}")
+        for tenant, weight in (tenant_weights or {}).items():
+            if not (weight > 0 and math.isfinite(weight)):
+                raise ValueError(f"Weight of tenant {tenant!r} must be a positive number, got {weight}")
+        self.max_in_flight = max_in_flight
+        self.interactive_reserve = min(interactive_reserve, max_in_flight - 1)
+        self.policy = policy
+        weights = dict(tenant_weights or {})
+        self._queues = {name: _ClassQueue(quantum, weights) for name in PRIORITY_CLASSES}
+        self._fifo = collections.deque()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.bulk_in_flight = 0
+        self.bulk_preemptions = 0
+        self._records = {name: {'segments': 0, 'wait': [], 'ttfb': [], 'first_ttfb': []} for name in PRIORITY_CLASSES}
+
+    def session(self, key: str, tenant: str = 'default', priority: str = 'interactive') -> 'ScheduledSession':
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        return ScheduledSession(self, str(key), tenant, priority)
+
+    def _waiting(self, priority: str) -> int:
+        return self._queues[priority].waiting
+
+    def _next(self) -> Optional[_Ticket]:
+        if self.policy == 'fifo':
+            return self._fifo.popleft() if self._fifo else None
+        if self._waiting('interactive'):
+            if self._waiting('bulk'):
+                self.bulk_preemptions += 1
+            return self._queues['interactive'].pop()
+        if self._waiting('bulk') and self.in_flight < self.max_in_flight - self.interactive_reserve:
+            return self._queues['bulk'].pop()
+        return None
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight:
+            ticket = self._next()
+            if ticket is None:
+                return
+            if ticket.future.cancelled():
+                continue
+            ticket.granted = time.time()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if ticket.session.priority == 'bulk':
+                self.bulk_in_flight += 1
+            ticket.future.set_result(None)
+
+    async def _acquire(self, session: 'ScheduledSession', cost: float, first: bool) -> _Ticket:
+        ticket = _Ticket(session, max(cost, 1.0), asyncio.get_running_loop().create_future(), first)
+        if self.policy == 'fifo':
+            self._fifo.append(ticket)
+        else:
+            self._queues[session.priority].push(ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.granted is not None:
+                self._release(ticket, None)
+            elif self.policy == 'fifo':
+                if ticket in self._fifo:
+                    self._fifo.remove(ticket)
+            else:
+                self._queues[session.priority].remove(ticket)
+            raise
+        return ticket
+
+    def _release(self, ticket: _Ticket, ttfb: float = None):
+        self.in_flight -= 1
+        if ticket.session.priority == 'bulk':
+            self.bulk_in_flight -= 1
+        records = self._records[ticket.session.priority]
+        records['segments'] += 1
+        wait = ticket.granted - ticket.enqueued
+        records['wait'].append(wait)
+        if ttfb is not None:
+            records['ttfb'].append(wait + ttfb)
+            if ticket.first:
+                records['first_ttfb'].append(wait + ttfb)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        classes = {}
+        for name, records in self._records.items():
+            classes[name] = {
+                'segments': records['segments'],
+                'queue_wait_mean': float(np.mean(records['wait'])) if records['wait'] else None,
+                'queue_wait_p95': _percentile(records['wait'], 95),
+                'ttfb_p50': _percentile(records['ttfb'], 50),
+                'ttfb_p95': _percentile(records['ttfb'], 95),
+                'first_ttfb_p50': _percentile(records['first_ttfb'], 50),
+                'first_ttfb_p95': _percentile(records['first_ttfb'], 95),
+            }
+        return {
+            'policy': self.policy,
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'waiting': len(self._fifo) + sum(queue.waiting for queue in self._queues.values()),
+            'bulk_preemptions': self.bulk_preemptions,
+            'classes': classes,
+        }
+
+
+class ScheduledSession:
+    """A session's handle on the scheduler: acquire a slot per segment stream, release it when the stream ends"""
+    def __init__(self, scheduler: FairScheduler, key: str, tenant: str, priority: str):
+        self.scheduler = scheduler
+        self.key = key
+        self.tenant = tenant
+        self.priority = priority
+        self._started = False
+
+    async def acquire(self, cost: float = 1.0) -> _Ticket:
+        """Wait for a slot for one segment stream costing `cost` (its word count)"""
+        first = not self._started
+        self._started = True
+        return await self.scheduler._acquire(self, cost, first)
+
+    def release(self, ticket: _Ticket, ttfb: float = None):
+        """Return the slot; ttfb is the stream's time to first chunk, None if it produced no audio"""
+        self.scheduler._release(ticket, ttfb)
+
+
+def parse_tenant_weights(specs: List[str]) -> Dict[str, float]:
+    """'tenant=weight' strings -> {tenant: weight}"""
+    weights = {}
+    for spec in specs or []:
+        tenant, _, weight = spec.partition('=')
+        if not tenant or not weight:
+            raise ValueError(f"Tenant weight must be tenant=weight: {spec!r}")
+        try:
+            weights[tenant] = float(weight)
+        except ValueError:
+            raise ValueError(f"Tenant weight must be a number: {spec!r}") from None
+        if not (weights[tenant] > 0 and math.isfinite(weights[tenant])):
+            raise ValueError(f"Tenant weight must be positive: {spec!r}")
+    return weights
+
+
+async def run_mix(args, policy: str) -> dict:
+    """One bulk document and interactive sessions arriving over time, scheduled by `policy`"""
+    # Imported here: the client imports this module for scheduling
+    import client_grpc_simple as tts
+    # Per-chunk client logs would drown the comparison
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server_url = f"{args.server_addr}:{args.server_port}"
+    pool = tts.TritonClientPool(server_url)
+    scheduler = FairScheduler(args.max_in_flight, args.quantum, interactive_reserve=args.interactive_reserve,
+                              policy=policy)
+    segment_text = "Your order shipped yesterday and should arrive on Friday, weather permitting."
+    start = time.time()
+
+    async def run_segment(session: ScheduledSession, segment_id: int):
+        ticket = await session.acquire(len(segment_text.split()))
+        ttfb = None
+        try:
+            audio, _, ttfb = await tts.synthesize_streaming(
+                server_url, args.model_name, None, '', segment_text, segment_id, 16000, 0.1, args.target_sr,
+                use_spk2info_cache=True, client_pool=pool,
+            )
+            ttfb = ttfb if audio is not None else None
+        finally:
+            session.release(ticket, ttfb)
+
+    async def run_session(session: ScheduledSession, segments: int, delay: float = 0.0):
+        await asyncio.sleep(delay)
+        # Every segment is submitted at once, as synthesize_with_splitting() does
+        await asyncio.gather(*(run_segment(session, segment_id) for segment_id in range(segments)))
+        return time.time() - start
+
+    bulk = scheduler.session('document', tenant='batch', priority='bulk')
+    interactive = [scheduler.session(f'chat-{index}', tenant=f'user-{index}', priority='interactive')
+                   for index in range(args.interactive_sessions)]
+    try:
+        bulk_task = asyncio.create_task(run_session(bulk, args.bulk_segments))
+        await asyncio.gather(*(run_session(session, args.interactive_segments, (index + 1) * args.arrival_interval)
+                               for index, session in enumerate(interactive)))
+        bulk_time = await bulk_task
+    finally:
+        pool.close()
+    stats = scheduler.stats()
+    stats['bulk_time'] = bulk_time
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare FIFO and weighted fair scheduling of a bulk document against interactive sessions',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='localhost', help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, default='cosyvoice2', help='Model name')
+    parser.add_argument('--target-sr', type=int, default=None,
+                       help='Model output sample rate (default: probed from the model)')
+    parser.add_argument('--model-cache', type=str, default=None,
+                       help="File caching model probe results (default: the client's cache)")
+    parser.add_argument('--max-in-flight', type=int, default=4, help='Shared segment-stream budget')
+    parser.add_argument('--quantum', type=float, default=20.0, help='DRR words of credit per round')
+    parser.add_argument('--interactive-reserve', type=int, default=1, help='Slots bulk streams never take')
+    parser.add_argument('--bulk-segments', type=int, default=200, help='Segments in the bulk document')
+    parser.add_argument('--interactive-sessions', type=int, default=10, help='Interactive sessions')
+    parser.add_argument('--interactive-segments', type=int, default=2, help='Segments per interactive session')
+    parser.add_argument('--arrival-interval', type=float, default=1.0,
+                       help='Seconds between interactive session arrivals')
+    parser.add_argument('--policies', type=str, nargs='+', default=list(SCHEDULING_POLICIES),
+                       choices=SCHEDULING_POLICIES, help='Policies to compare')
+    args = parser.parse_args()
+    if args.quantum < 1:
+        parser.error("--quantum must be at least one word")
+    if args.max_in_flight < 1:
+        parser.error("--max-in-flight must be at least 1")
+    if args.target_sr is None:
+        # Imported here: only the comparison talks to a server
+        from model_introspection import DEFAULT_CACHE_PATH, ModelInfoCache, model_output_rate
+        args.target_sr = model_output_rate(ModelInfoCache(args.model_cache or DEFAULT_CACHE_PATH),
+                                           f"{args.server_addr}:{args.server_port}", args.model_name)
+        if args.target_sr is None:
+            parser.error(f"unknown output rate of {args.model_name}; pass --target-sr")
+
+    async def run_all():
+        # Streams hold executor threads; the default pool would cap the budget below max_in_flight
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.max_in_flight + 4))
+        return {policy: await run_mix(args, policy) for policy in args.policies}
+
+    results = asyncio.run(run_all())
+    print(f"{args.bulk_segments} bulk segments + {args.interactive_sessions} interactive sessions of "
+          f"{args.interactive_segments} segments, budget {args.max_in_flight} streams")
+    for policy, stats in results.items():
+        print(f"  {policy}: bulk done after {stats['bulk_time']:.1f}s, "
+              f"{stats['bulk_preemptions']} interactive segments admitted ahead of queued bulk")
+        for name, result in stats['classes'].items():
+            if not result['segments']:
+                continue
+            print(f"    {name:>11}: first-segment TTFB p50 {result['first_ttfb_p50'] or 0:.3f}s "
+                  f"p95 {result['first_ttfb_p95'] or 0:.3f}s; queue wait mean {result['queue_wait_mean']:.3f}s "
+                  f"p95 {result['queue_wait_p95']:.3f}s ({result['segments']} segments)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+"""
+Adaptive jitter buffer for real-time playout of streamed TTS chunks.
+
+Chunks arrive irregularly: a gap between chunks can be longer than the audio the
+previous chunk carried, so a player that starts on the first chunk underruns,
+while a large fixed pre-roll adds start latency to every utterance. For every
+chunk, AdaptivePreroll measures its lateness: how much later it arrived than a
+player starting on the utterance's first chunk would have needed it. The pre-roll
+is the (1 - target) quantile of recent lateness, i.e. the lowest start delay that
+keeps the per-chunk underrun probability under the target.
+
+JitterBufferSink plays the client's output in real time through that buffer, in
+20 ms frames, into the real sink. simulate_playout() replays recorded arrival
+timelines offline to compare adaptive and fixed pre-rolls.
+
+Usage:
+# Play out in real time and keep the arrival timeline
+python3 client_grpc_simple.py --playout --save-timeline run1.json
+
+# Compare pre-roll policies on recorded timelines (or --synthetic)
+python3 jitter_buffer.py --simulate run1.json run2.json --target-underrun 0.01
+"""
+
+import argparse
+import collections
+import json
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from audio_sinks import AudioSink
+
+
+class AdaptivePreroll:
+    """Pre-roll from the (1 - target) quantile of observed chunk lateness"""
+    def __init__(self, target_underrun: float = 0.01, min_preroll: float = 0.02, max_preroll: float = 2.0,
+                 initial_preroll: float = 0.2, window: int = 500, min_samples: int = 8):
+        self.target_underrun = target_underrun
+        self.min_preroll = min_preroll
+        self.max_preroll = max_preroll
+        self.initial_preroll = initial_preroll
+        self.min_samples = min_samples
+        self._lateness = collections.deque(maxlen=window)
+        self._anchor = None
+        self._audio_before = 0.0
+
+    def start_utterance(self):
+        """Lateness is measured against a player that starts on the utterance's first chunk"""
+        self._anchor = None
+
+    def observe(self, arrival: float, duration: float):
+        if self._anchor is None:
+            self._anchor = arrival
+            self._audio_before = 0.0
+        self._lateness.append(max(arrival - self._anchor - self._audio_before, 0.0))
+        self._audio_before += duration
+
+    @property
+    def preroll(self) -> float:
+        if len(self._lateness) < self.min_samples:
+            return self.initial_preroll
+        quantile = float(np.quantile(self._lateness, 1.0 - self.target_underrun))
+        return min(max(quantile, self.min_preroll), self.max_preroll)
+
+
+def simulate_playout(events: List[Tuple[float, float]], preroll, rebuffer: bool = True) -> dict:
+    """
+    Event-driven playout of one utterance.
+
+    Args:
+        events: (arrival seconds, audio seconds) per chunk, in order
+        preroll: Seconds of audio to buffer before (re)starting, or an AdaptivePreroll
+        rebuffer: After an underrun, wait for the pre-roll again instead of resuming at once
+
+    Returns:
+        Start latency after the first chunk, underruns, stall seconds and buffered audio stats
+    """
+    adaptive = preroll if isinstance(preroll, AdaptivePreroll) else None
+    if adaptive:
+        adaptive.start_utterance()
+    buffered = 0.0
+    playing = False
+    last_time = None
+    start_time = None
+    underruns = 0
+    stall_time = 0.0
+    stall_start = None
+    levels = []
+    for index, (arrival, duration) in enumerate(events):
+        if playing:
+            drained = arrival - last_time
+            if drained > buffered:
+                underruns += 1
+                stall_start = last_time + buffered
+                buffered = 0.0
+                playing = False
+            else:
+                buffered -= drained
+        buffered += duration
+        last_time = arrival
+        if adaptive:
+            adaptive.observe(arrival, duration)
+        target = adaptive.preroll if adaptive else preroll
+        if not playing and (buffered >= target or index == len(events) - 1 or (stall_start and not rebuffer)):
+            playing = True
+            if start_time is None:
+                start_time = arrival
+            if stall_start is not None:
+                stall_time += arrival - stall_start
+                stall_start = None
+        levels.append(buffered)
+    return {
+        'start_latency': (start_time - events[0][0]) if events else 0.0,
+        'underruns': underruns,
+        'stall_time': stall_time,
+        'mean_buffered': float(np.mean(levels)) if levels else 0.0,
+        'max_buffered': float(np.max(levels)) if levels else 0.0,
+    }
+
+
+class JitterBufferSink(AudioSink):
+    """
+    Real-time playout through an adaptive jitter buffer into another sink.
+
+    A playout thread waits for the pre-roll, then writes fixed frames to the inner
+    sink at the audio rate, as a sound device would consume them. When the buffer
+    runs dry it counts an underrun and re-buffers to the current pre-roll.
+    """
+    def __init__(self, sink: AudioSink, preroll: AdaptivePreroll = None, frame_ms: int = 20):
+        super().__init__(sink.sample_rate)
+        self.sink = sink
+        self.format_name = sink.format_name
+        self.preroll = preroll or AdaptivePreroll()
+        self.preroll.start_utterance()
+        self._frame = sink.sample_rate * frame_ms // 1000
+        self._chunks = collections.deque()
+        self._buffered = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self.events = []
+        self.first_arrival = None
+        self.playback_start = None
+        self.underruns = 0
+        self.stall_time = 0.0
+        self.levels = []
+        self._thread = threading.Thread(target=self._play, name='playout', daemon=True)
+        self._thread.start()
+
+    def _write(self, samples: np.ndarray):
+        now = time.time()
+        with self._condition:
+            if self.first_arrival is None:
+                self.first_arrival = now
+            self.events.append((now - self.first_arrival, len(samples)))
+            self.preroll.observe(now, len(samples) / self.sample_rate)
+            self._chunks.append(samples)
+            self._buffered += len(samples)
+            self._condition.notify_all()
+
+    def _ready(self) -> bool:
+        return self._closed or self._buffered >= self.preroll.preroll * self.sample_rate
+
+    def _take(self, count: int) -> np.ndarray:
+        parts = []
+        while count and self._chunks:
+            chunk = self._chunks[0]
+            if len(chunk) <= count:
+                parts.append(self._chunks.popleft())
+            else:
+                parts.append(chunk[:count])
+                self._chunks[0] = chunk[count:]
+            count -= len(parts[-1])
+        taken = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self._buffered -= len(taken)
+        return taken
+
+    def _play(self):
+        while True:
+            with self._condition:
+                stall_start = time.time() if self.playback_start is not None else None
+                self._condition.wait_for(self._ready)
+                if stall_start is not None:
+                    self.stall_time += time.time() - stall_start
+                if not self._buffered and self._closed:
+                    return
+                if self.playback_start is None:
+                    self.playback_start = time.time()
+            deadline = time.monotonic()
+            while True:
+                with self._condition:
+                    if self._buffered < self._frame and not self._closed:
+                        if self._buffered:
+                            # Play the partial frame before declaring the underrun
+                            frame = self._take(self._buffered)
+                        else:
+                            self.underruns += 1
+                            break
+                    elif not self._buffered:
+                        return
+                    else:
+                        frame = self._take(min(self._frame, self._buffered))
+                    self.levels.append(self._buffered / self.sample_rate)
+                self.sink.write(frame)
+                deadline += len(frame) / self.sample_rate
+                time.sleep(max(deadline - time.monotonic(), 0.0))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.sink.close()
+        self.samples_written = self.sink.samples_written
+        self.bytes_written = self.sink.bytes_written
+        self.first_byte_time = self.sink.first_byte_time
+
+    def stats(self) -> dict:
+        levels = np.asarray(self.levels) if self.levels else np.zeros(1)
+        return {
+            'start_latency': (self.playback_start - self.first_arrival) if self.playback_start else None,
+            'preroll': self.preroll.preroll,
+            'underruns': self.underruns,
+            'stall_time': self.stall_time,
+            'mean_buffered': float(levels.mean()),
+            'max_buffered': float(levels.max()),
+        }
+
+    def save_timeline(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'sample_rate': self.sample_rate, 'events': self.events}, f)
+
+
+def load_timeline(path: str) -> List[Tuple[float, float]]:
+    """Read a saved timeline as (arrival seconds, audio seconds) events"""
+    with open(path, encoding='utf-8') as f:
+        timeline = json.load(f)
+    return [(offset, samples / timeline['sample_rate']) for offset, samples in timeline['events']]
+
+
+def synthetic_timeline(rng: np.random.Generator, segments: int = 4, chunks: int = 10, chunk_duration: float = 0.2,
+                       rtf: float = 0.5, spike_rate: float = 0.05, segment_gap: float = 0.6) -> List[Tuple[float, float]]:
+    """Chunk arrivals shaped like a split utterance: jittered chunks, occasional stalls, slower segment starts"""
+    events = []
+    now = 0.0
+    for _ in range(segments):
+        for chunk in range(chunks):
+            now += chunk_duration * rtf + rng.gamma(1.0, 0.05)
+            if rng.random() < spike_rate:
+                now += rng.exponential(0.3)
+            if chunk == 0 and events:
+                now += rng.uniform(0.5, 1.0) * segment_gap
+            events.append((now, chunk_duration))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare adaptive and fixed jitter-buffer pre-rolls on recorded chunk timelines',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--simulate', type=str, nargs='*', default=[],
+                       help='Timeline JSON files (from --save-timeline), played in order as utterances')
+    parser.add_argument('--synthetic', type=int, default=0, help='Also simulate this many synthetic utterances')
+    parser.add_argument('--target-underrun', type=float, default=0.01, help='Target per-chunk underrun probability')
+    parser.add_argument('--fixed-prerolls', type=float, nargs='+', default=[0.0, 0.1, 0.25, 0.5, 1.0],
+                       help='Fixed pre-rolls to compare against (seconds)')
+    args = parser.parse_args()
+
+    utterances = [load_timeline(path) for path in args.simulate]
+    rng = np.random.default_rng(0)
+    utterances += [synthetic_timeline(rng) for _ in range(args.synthetic)]
+    if not utterances:
+        parser.error("Nothing to simulate: pass timeline files and/or --synthetic N")
+
+    policies = [(f"fixed {preroll * 1000:.0f} ms", preroll) for preroll in args.fixed_prerolls]
+    policies.append((f"adaptive p<{args.target_underrun}", AdaptivePreroll(args.target_underrun)))
+    print(f"{len(utterances)} utterances, {sum(len(u) for u in utterances)} chunks")
+    for name, preroll in policies:
+        results = [simulate_playout(events, preroll) for events in utterances]
+        print(f"{name:>20}: start latency {np.mean([r['start_latency'] for r in results]) * 1000:7.1f} ms, "
+              f"underruns {sum(r['underruns'] for r in results):4d}, "
+              f"stalled {sum(r['stall_time'] for r in results):6.2f}s, "
+              f"buffered mean {np.mean([r['mean_buffered'] for r in results]) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""
+Model introspection for the TTS clients, cached on disk.
+
+The client used to hard-code what it knows about each model: the names allowed
+for --model-name, the output rate (--target-sr) and whether to send the reference
+inputs or rely on the server's spk2info cache. probe_model() reads the same facts
+from ModelMetadata and ModelConfig:
+- input names, datatypes and which inputs are optional
+- output datatypes
+- the output sample rate, from the config's 'sample_rate' parameter, falling back
+  to KNOWN_SAMPLE_RATES
+- decoupled (streaming) support
+ModelInfoCache keeps the results in a JSON file keyed by server, model and model
+version, so startup does not probe again until the entry expires or --refresh-model-info
+is given. A lookup without a version asks ModelMetadata which versions the server has
+(one cheap call) and uses the entry of the version it serves, so an upgraded model is
+probed again instead of being served stale for up to a day.
+
+Usage:
+# Show (and cache) what the client would use for a model
+python3 model_introspection.py --server-addr localhost --model-name cosyvoice2
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import tritonclient.grpc as grpcclient_sync
+from tritonclient.utils import InferenceServerException
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'tts_client', 'model_info.json')
+# Output rates for models whose config carries no sample_rate parameter
+KNOWN_SAMPLE_RATES = {'cosyvoice2': 24000, 'spark_tts': 16000, 'f5_tts': 24000}
+
+
+def probe_model(client: grpcclient_sync.InferenceServerClient, model_name: str, model_version: str = '') -> dict:
+    """Read one model's inputs, outputs, sample rate and decoupled flag from the server"""
+    metadata = client.get_model_metadata(model_name, model_version)
+    config = client.get_model_config(model_name, model_version).config
+    sample_rate = None
+    if 'sample_rate' in config.parameters and config.parameters['sample_rate'].string_value:
+        sample_rate = int(config.parameters['sample_rate'].string_value)
+    return {
+        'name': model_name,
+        'version': model_version or latest_version(metadata.versions),
+        'versions': sorted(metadata.versions, key=int),
+        'platform': metadata.platform or config.backend,
+        'inputs': {tensor.name: tensor.datatype for tensor in metadata.inputs},
+        'optional_inputs': sorted(tensor.name for tensor in config.input if tensor.optional),
+        'outputs': {tensor.name: tensor.datatype for tensor in metadata.outputs},
+        'sample_rate': sample_rate or KNOWN_SAMPLE_RATES.get(model_name),
+        'sample_rate_source': 'config' if sample_rate else 'known' if model_name in KNOWN_SAMPLE_RATES else None,
+        'decoupled': config.model_transaction_policy.decoupled,
+        'probed_at': time.time(),
+    }
+
+
+def latest_version(versions) -> str:
+    """The version an unversioned request is served by (Triton's default policy: the highest)"""
+    return max(versions, key=int) if versions else ''
+
+
+def uses_spk2info(info: dict) -> bool:
+    """Whether the model runs on the server's speaker cache, i.e. needs no reference inputs"""
+    return 'reference_wav' not in info['inputs'] or 'reference_wav' in info['optional_inputs']
+
+
+def accepts_reference(info: dict) -> bool:
+    return 'reference_wav' in info['inputs']
+
+
+class ModelInfoCache:
+    """On-disk cache of probe_model() results keyed by server, model and version"""
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_age: float = 24 * 3600, refresh: bool = False):
+        self.path = path
+        self.max_age = max_age
+        self.refresh = refresh
+        self.hits = 0
+        self.probes = 0
+        # server/model -> the versions the server listed when last asked, and the one it serves
+        self._served = {}
+        self._entries = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get('cache_version') != CACHE_VERSION:
+            return {}
+        self._served = cache.get('served', {})
+        return cache.get('models', {})
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Written to a temporary file and renamed, so concurrent clients never read half a file
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False, encoding='utf-8') as f:
+            json.dump({'cache_version': CACHE_VERSION, 'models': self._entries, 'served': self._served}, f, indent=2)
+        os.replace(f.name, self.path)
+
+    @staticmethod
+    def key(server_url: str, model_name: str, model_version: str = '') -> str:
+        """Entry key; unversioned lookups are resolved to the served version first"""
+        return f"{server_url}/{model_name}/{model_version or 'unversioned'}"
+
+    def _fresh(self, key: str) -> dict:
+        entry = self._entries.get(key)
+        if entry is None or self.refresh or time.time() - entry['probed_at'] > self.max_age:
+            return None
+        return entry
+
+    def lookup(self, server_url: str, model_name: str, model_version: str = '') -> dict:
+        """
+        Cached entry if present and fresh, without contacting the server.
+
+        Without a version this is the version the server served when last asked,
+        which may be out of date; get() checks.
+        """
+        if not model_version:
+            served = self._served.get(f"{server_url}/{model_name}")
+            if served is None:
+                return None
+            model_version = served['version']
+        return self._fresh(self.key(server_url, model_name, model_version))
+
+    def get(self, server_url: str, model_name: str, model_version: str = '') -> dict:
+        """Cached entry, probing the server (and updating the cache file) when missing, stale or upgraded"""
+        client = None
+        dirty = False
+        try:
+            if not model_version:
+                # The served version set decides which entry applies; a new version is probed afresh
+                client = grpcclient_sync.InferenceServerClient(url=server_url, verbose=False)
+                versions = sorted(client.get_model_metadata(model_name).versions, key=int)
+                served = {'version': latest_version(versions), 'versions': versions}
+                dirty = self._served.get(f"{server_url}/{model_name}") != served
+                self._served[f"{server_url}/{model_name}"] = served
+                model_version = served['version']
+            key = self.key(server_url, model_name, model_version)
+            entry = self._fresh(key)
+            if entry is not None:
+                self.hits += 1
+            else:
+                client = client or grpcclient_sync.InferenceServerClient(url=server_url, verbose=False)
+                entry = probe_model(client, model_name, model_version)
+                self.probes += 1
+                self._entries[key] = entry
+                dirty = True
+        finally:
+            if client:
+                client.close()
+        if dirty:
+            try:
+                self._save()
+            except OSError as e:
+                logging.warning(f"Could not write model info cache {self.path}: {e}")
+        return entry
+
+
+def model_output_rate(cache: ModelInfoCache, server_url: str, model_name: str) -> int:
+    """A model's output rate, probed through the cache or else from KNOWN_SAMPLE_RATES; None if unknown"""
+    try:
+        info = cache.get(server_url, model_name)
+    except InferenceServerException as e:
+        logging.warning(f"Could not probe {model_name}: {e}")
+        info = None
+    return (info and info['sample_rate']) or KNOWN_SAMPLE_RATES.get(model_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Probe models on a Triton server and cache what the TTS client needs to know',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='localhost', help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, nargs='+', default=['cosyvoice2'], help='Models to probe')
+    parser.add_argument('--model-cache', type=str, default=DEFAULT_CACHE_PATH, help='Cache file')
+    parser.add_argument('--refresh-model-info', action='store_true', help='Probe even if the cache is fresh')
+    args = parser.parse_args()
+
+    cache = ModelInfoCache(args.model_cache, refresh=args.refresh_model_info)
+    server_url = f"{args.server_addr}:{args.server_port}"
+    for model_name in args.model_name:
+        info = cache.get(server_url, model_name)
+        print(f"{model_name} (version {info['version']}, {info['platform']}):")
+        print(f"  inputs:      {info['inputs']} (optional: {info['optional_inputs'] or 'none'})")
+        print(f"  outputs:     {info['outputs']}")
+        print(f"  sample rate: {info['sample_rate']} Hz ({info['sample_rate_source'] or 'unknown'})")
+        print(f"  decoupled:   {info['decoupled']}, input set: "
+              f"{'spk2info cache' if uses_spk2info(info) else 'reference audio'}")
+    print(f"{cache.hits} from cache, {cache.probes} probed ({args.model_cache})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Per-segment model routing for the streaming TTS client.
+
+cosyvoice2, spark_tts and f5_tts trade speed for quality differently and emit
+different sample rates. ModelRouter picks the model for each segment: the most
+preferred model whose predicted time to first chunk fits the segment's latency
+budget. The first segment gets the hard budget (e.g. 300 ms); a later segment may
+use the time until the audio already scheduled ahead of it has played. Predictions
+start from rough priors and then follow the measured TTFB of each model (EWMA),
+inflated by the number of streams the model is already serving. Segments are
+resampled to one output rate so audio from different models joins cleanly.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from telephony import StreamingResampler
+
+# Native output rate and a TTFB prior used until the model has been measured.
+# f5_tts renders a whole segment before its first chunk, so its TTFB is tracked per word.
+MODEL_PROFILES = {
+    'cosyvoice2': {'sample_rate': 24000, 'prior_ttfb': 0.4, 'ttfb_per_word': False},
+    'spark_tts': {'sample_rate': 16000, 'prior_ttfb': 0.25, 'ttfb_per_word': False},
+    'f5_tts': {'sample_rate': 24000, 'prior_ttfb': 0.05, 'ttfb_per_word': True},
+}
+
+
+def resample_segment(audio: np.ndarray, input_rate: int, output_rate: int) -> np.ndarray:
+    """Resample a complete segment, including the filter tail"""
+    if input_rate == output_rate:
+        return audio
+    resampler = StreamingResampler(input_rate, output_rate)
+    return np.concatenate([resampler.process(audio), resampler.flush()])
+
+
+class ModelRouter:
+    """Chooses a model per segment from a latency budget, segment length and measured per-model latency"""
+    def __init__(self, models: List[str], ttfb_budget: float = 0.3, load_penalty: float = 0.25,
+                 smoothing: float = 0.3, seconds_per_word: float = 0.4, sample_rates: Dict[str, int] = None):
+        for model_name in models:
+            if model_name not in MODEL_PROFILES:
+                raise ValueError(f"No routing profile for model: {model_name}")
+        # Preference order, best quality first
+        self.models = models
+        self.ttfb_budget = ttfb_budget
+        self.load_penalty = load_penalty
+        self.smoothing = smoothing
+        self.seconds_per_word = seconds_per_word
+        # Output rates read from the server override the profile defaults
+        self._sample_rates = {m: MODEL_PROFILES[m]['sample_rate'] for m in models}
+        self._sample_rates.update({m: rate for m, rate in (sample_rates or {}).items() if rate})
+        self._lock = threading.Lock()
+        self._ttfb = {m: MODEL_PROFILES[m]['prior_ttfb'] for m in models}
+        self._in_flight = {m: 0 for m in models}
+        # Wall time at which the audio scheduled so far is expected to finish playing
+        self._playback_end = None
+        self.decisions = {}
+
+    def sample_rate(self, model_name: str) -> int:
+        return self._sample_rates[model_name]
+
+    def predict_ttfb(self, model_name: str, words: int) -> float:
+        estimate = self._ttfb[model_name]
+        if MODEL_PROFILES[model_name]['ttfb_per_word']:
+            estimate *= words
+        return estimate * (1 + self.load_penalty * self._in_flight[model_name])
+
+    def choose(self, segment_id: int, text: str) -> str:
+        """Pick the model for a segment that is about to be sent"""
+        words = max(len(text.split()), 1)
+        now = time.time()
+        with self._lock:
+            budget = self.ttfb_budget
+            if self._playback_end is not None:
+                budget = max(budget, self._playback_end - now)
+            predictions = {m: self.predict_ttfb(m, words) for m in self.models}
+            fitting = [m for m in self.models if predictions[m] <= budget]
+            model_name = fitting[0] if fitting else min(predictions, key=predictions.get)
+            self.decisions[segment_id] = {
+                'model': model_name, 'words': words, 'budget': budget,
+                'predicted_ttfb': predictions[model_name], 'load': self._in_flight[model_name],
+                'ttfb': None,
+            }
+            self._in_flight[model_name] += 1
+            playback_start = max(self._playback_end or 0.0, now + predictions[model_name])
+            self._playback_end = playback_start + words * self.seconds_per_word
+        logging.info(f"[Segment {segment_id}] Routed to {model_name}: predicted TTFB "
+                     f"{predictions[model_name]:.3f}s, budget {budget:.3f}s")
+        return model_name
+
+    def record(self, segment_id: int, ttfb: float):
+        """Feed back a segment's measured TTFB (None if it failed)"""
+        with self._lock:
+            decision = self.decisions[segment_id]
+            model_name = decision['model']
+            self._in_flight[model_name] -= 1
+            if ttfb is None:
+                return
+            decision['ttfb'] = ttfb
+            # Undo the load inflation so the estimate tracks the unloaded model
+            sample = ttfb / (1 + self.load_penalty * decision['load'])
+            if MODEL_PROFILES[model_name]['ttfb_per_word']:
+                sample /= decision['words']
+            self._ttfb[model_name] += self.smoothing * (sample - self._ttfb[model_name])
+
+    def report(self) -> Dict[str, dict]:
+        """Per-model segment counts, mean TTFB and budget misses"""
+        with self._lock:
+            decisions = list(self.decisions.values())
+        report = {}
+        for model_name in self.models:
+            routed = [d for d in decisions if d['model'] == model_name]
+            measured = [d['ttfb'] for d in routed if d['ttfb'] is not None]
+            report[model_name] = {
+                'segments': len(routed),
+                'mean_ttfb': float(np.mean(measured)) if measured else None,
+                'budget_misses': sum(1 for d in routed if d['ttfb'] is not None and d['ttfb'] > d['budget']),
+            }
+        return report
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Post-processing stage for the streaming TTS client.
+
+Encoding and file writes are moved off the gRPC receive path onto a
+worker pool so one slow encoder cannot delay chunk delivery for every other
+segment. The pool kind is chosen per operation: NumPy ufuncs, libsndfile and file
+I/O release the GIL, so threads are the default; stateless encoders whose work is
+GIL-bound can run in a process pool instead. A bounded number of in-flight jobs
+provides backpressure: when the stage falls behind, the receive thread blocks
+instead of letting chunks pile up. EventLoopLagMonitor measures how late the
+asyncio loop wakes up, to show whether post-processing still stalls it.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict
+
+import numpy as np
+
+from audio_sinks import AudioSink
+
+POOL_KINDS = ('inline', 'thread', 'process')
+# NumPy/libsndfile release the GIL for these, so threads parallelize them without pickling.
+# Resampling is not pooled: StreamingResampler carries filter state from chunk to chunk.
+DEFAULT_OPERATION_POOLS = {
+    'encode': 'thread',
+}
+
+
+class PostProcessor:
+    """Per-operation thread/process pools with a bounded in-flight budget and an ordered write lane"""
+    def __init__(self, workers: int = 2, max_pending: int = 64, operation_pools: Dict[str, str] = None):
+        self.operation_pools = dict(DEFAULT_OPERATION_POOLS, **(operation_pools or {}))
+        for operation, kind in self.operation_pools.items():
+            if kind not in POOL_KINDS:
+                raise ValueError(f"Unknown pool kind for {operation}: {kind}")
+        self._workers = workers
+        self._thread_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='postprocess')
+        self._process_pool = None
+        # Sink writes are stateful and must stay in order: one dedicated thread
+        self._write_lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix='postprocess-write')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self.pending = 0
+        self.peak_pending = 0
+        self.backpressure_time = 0.0
+
+    def _executor(self, operation: str):
+        kind = self.operation_pools.get(operation, 'thread')
+        if kind == 'process':
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self._workers)
+            return self._process_pool
+        if kind == 'thread':
+            return self._thread_pool
+        return None
+
+    def _acquire(self):
+        """Take an in-flight slot, blocking the caller (the receive path) when the stage is full"""
+        if not self._slots.acquire(blocking=False):
+            wait_start = time.time()
+            self._slots.acquire()
+            with self._lock:
+                self.backpressure_time += time.time() - wait_start
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def submit(self, operation: str, fn: Callable, *args) -> Future:
+        """Run `fn(*args)` on the pool configured for `operation`"""
+        executor = self._executor(operation)
+        if executor is None:
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+        self._acquire()
+        future = executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def submit_write(self, fn: Callable, *args) -> Future:
+        """Run `fn(*args)` on the ordered write lane"""
+        self._acquire()
+        future = self._write_lane.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def shutdown(self):
+        self._write_lane.shutdown(wait=True)
+        self._thread_pool.shutdown(wait=True)
+        if self._process_pool:
+            self._process_pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            'peak_pending': self.peak_pending,
+            'max_pending': self.max_pending,
+            'backpressure_time': self.backpressure_time,
+        }
+
+
+class PooledSink(AudioSink):
+    """
+    Wraps a sink so encoding and writes happen on a PostProcessor, in arrival order.
+
+    Stateless encoders (`encode_chunk`) run on the 'encode' pool and only the byte
+    write is serialized; other sinks run their whole write on the ordered lane.
+    A failed encode or write is raised by the next write() and by close(), so the
+    output is never silently truncated.
+    """
+    def __init__(self, sink: AudioSink, postprocessor: PostProcessor):
+        super().__init__(sink.sample_rate)
+        self.sink = sink
+        self.format_name = sink.format_name
+        self._postprocessor = postprocessor
+        self._offload_encoding = (
+            sink.encode_chunk is not None
+            and postprocessor.operation_pools.get('encode', 'thread') != 'inline'
+        )
+        # Writes not yet seen to finish, oldest first
+        self._writes = collections.deque()
+        self._failure = None
+
+    def _check_writes(self, wait: bool = False):
+        """Forget finished writes (all of them, with wait); raises the first failure from then on"""
+        while self._failure is None and self._writes and (wait or self._writes[0].done()):
+            self._failure = self._writes.popleft().exception()
+        if self._failure is not None:
+            raise self._failure
+
+    def write(self, samples: np.ndarray):
+        if len(samples) == 0:
+            return
+        self._check_writes()
+        if self._offload_encoding:
+            encoded = self._postprocessor.submit('encode', self.sink.encode_chunk, samples)
+            self._writes.append(self._postprocessor.submit_write(
+                lambda: self.sink.write_encoded(encoded.result(), len(samples))
+            ))
+        else:
+            self._writes.append(self._postprocessor.submit_write(self.sink.write, samples))
+
+    def close(self):
+        # The lane is FIFO, so closing after the last write drains everything first
+        closed = self._postprocessor.submit_write(self.sink.close)
+        try:
+            self._check_writes(wait=True)
+        finally:
+            closed.result()
+        self.samples_written = self.sink.samples_written
+        self.bytes_written = self.sink.bytes_written
+        self.first_byte_time = self.sink.first_byte_time
+
+
+class EventLoopLagMonitor:
+    """Samples how late the asyncio event loop wakes up relative to a fixed tick"""
+    def __init__(self, interval: float = 0.05):
+        self._interval = interval
+        self._task = None
+        self.lags = []
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.lags.append(max(loop.time() - expected, 0.0))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        if not self.lags:
+            return {'samples': 0, 'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+        lags = np.asarray(self.lags)
+        return {
+            'samples': len(lags),
+            'mean': float(lags.mean()),
+            'p95': float(np.percentile(lags, 95)),
+            'max': float(lags.max()),
+        }
+
+
+def log_stage_metrics(postprocessor: PostProcessor, lag_monitor: EventLoopLagMonitor):
+    """Log post-processing backpressure and event-loop lag in the client summary format"""
+    lag = lag_monitor.stats()
+    logging.info(f"  Event-loop lag: mean {lag['mean'] * 1000:.1f} ms, p95 {lag['p95'] * 1000:.1f} ms, "
+                 f"max {lag['max'] * 1000:.1f} ms ({lag['samples']} samples)")
+    if postprocessor:
+        stage = postprocessor.stats()
+        logging.info(f"  Post-processing queue: peak {stage['peak_pending']}/{stage['max_pending']}, "
+                     f"receive path blocked {stage['backpressure_time']:.3f}s")
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+
+"""
+Prebuilt prompt archive: fixed IVR prompts served from disk instead of synthesized.
+
+Menus, greetings and hold messages are the same strings on every call, yet each
+one costs a full gRPC synthesis at runtime. The `build` command renders a list of
+(speaker, text) prompts once through the streaming client and writes one archive
+file per speaker (voice):
+- a header with the sample rate and the offsets of the sections below
+- an open-addressing hash table (power-of-two slots, linear probing) of fixed-size
+  entries: 64-bit BLAKE2b hash of the text, PCM offset and length, key offset
+- the prompt texts, to confirm an exact match behind a hash hit
+- one contiguous blob of PCM16 audio, 64-byte aligned
+- JSON metadata (speaker, model, build time)
+At runtime PromptArchive memory-maps the file. lookup() hashes the text (exact
+match after whitespace is collapsed), probes the table and returns a read-only
+numpy view straight into the mapping, in a few microseconds and without copying
+or decoding anything. The client and the gateway look a text up before any gRPC
+call is attempted and stream the view to the sink on a hit.
+
+Prompts file: one prompt per line, "speaker<TAB>text" (a line without a tab uses
+--default-speaker), or JSON lines {"speaker": ..., "text": ...} for a .jsonl file.
+Speakers file: JSON {"speaker": {"reference_audio": ..., "reference_text": ...}};
+speakers not listed use the model's spk2info cache.
+
+Usage:
+# Render the prompts, one archive per speaker in prompts/
+python3 prompt_archive.py build ivr_prompts.tsv --speakers speakers.json --output-dir prompts \\
+    --server-addr localhost --model-name cosyvoice2
+
+# Lookup latency, hits and misses
+python3 prompt_archive.py bench prompts/default.prompts
+
+# Serve hits from the archive, synthesize everything else
+python3 client_grpc_simple.py --prompt-archive prompts/default.prompts --target-text "Press one for sales."
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audio_sinks import AudioSink, float_to_int16
+
+ARCHIVE_MAGIC = b'TTSPRMPT'
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = '.prompts'
+# magic, version, sample rate, prompts, slots, then offset/size of index, keys, PCM, metadata
+HEADER = struct.Struct('<8sIIII8Q')
+# text hash, PCM byte offset, samples, key offset, key length (0 = empty slot), reserved
+ENTRY = struct.Struct('<QQIIII')
+PCM_ALIGNMENT = 64
+
+
+def normalize_prompt(text: str) -> str:
+    """The lookup key: the text with runs of whitespace collapsed"""
+    return ' '.join(text.split())
+
+
+def prompt_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def write_archive(path: str, sample_rate: int, prompts: Dict[str, np.ndarray], metadata: dict = None) -> dict:
+    """
+    Write an archive of int16 prompt audio, keyed by prompt text.
+
+    The file is written next to `path` and renamed over it, so a serving process
+    that re-opens the archive never maps a half-written file.
+
+    Returns:
+        Layout summary: prompts, slots, PCM seconds and file size
+    """
+    keys = {normalize_prompt(text).encode('utf-8'): np.asarray(audio, dtype='<i2') for text, audio in prompts.items()}
+    if b'' in keys:
+        raise ValueError("Empty prompt text")
+    slots = 1
+    while slots < 2 * len(keys):
+        slots *= 2
+    table = [None] * slots
+    key_blob = bytearray()
+    pcm_size = 0
+    for key, audio in keys.items():
+        slot = prompt_hash(key) & (slots - 1)
+        while table[slot] is not None:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = (prompt_hash(key), pcm_size, len(audio), len(key_blob), len(key))
+        key_blob += key
+        pcm_size += audio.nbytes
+
+    index_offset = HEADER.size
+    keys_offset = index_offset + slots * ENTRY.size
+    pcm_offset = -(-(keys_offset + len(key_blob)) // PCM_ALIGNMENT) * PCM_ALIGNMENT
+    meta = json.dumps(metadata or {}).encode('utf-8')
+    meta_offset = pcm_offset + pcm_size
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, sample_rate, len(keys), slots,
+                            index_offset, slots * ENTRY.size, keys_offset, len(key_blob),
+                            pcm_offset, pcm_size, meta_offset, len(meta)))
+        f.write(b''.join(ENTRY.pack(*entry, 0) if entry else ENTRY.pack(0, 0, 0, 0, 0, 0) for entry in table))
+        f.write(key_blob)
+        f.write(b'\0' * (pcm_offset - keys_offset - len(key_blob)))
+        for audio in keys.values():
+            f.write(audio.tobytes())
+        f.write(meta)
+    os.replace(temp_path, path)
+    return {
+        'prompts': len(keys),
+        'slots': slots,
+        'audio_seconds': pcm_size / 2 / sample_rate,
+        'file_bytes': meta_offset + len(meta),
+    }
+
+
+class PromptArchive:
+    """A memory-mapped prompt archive; lookup() returns zero-copy int16 views"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is not a prompt archive")
+        (magic, version, self.sample_rate, self.count, self._slots, self._index_offset, _,
+         self._keys_offset, _, self._pcm_offset, self._pcm_size,
+         meta_offset, meta_size) = HEADER.unpack_from(self._map, 0)
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError(f"{path} is not a prompt archive")
+        if version != ARCHIVE_VERSION:
+            raise ValueError(f"{path} is archive version {version}, expected {ARCHIVE_VERSION}")
+        self.metadata = json.loads(self._map[meta_offset:meta_offset + meta_size] or b'{}')
+        self.speaker = self.metadata.get('speaker')
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, text: str) -> Optional[np.ndarray]:
+        """The prompt's int16 samples as a read-only view into the mapping, or None"""
+        key = normalize_prompt(text).encode('utf-8')
+        key_hash = prompt_hash(key)
+        mask = self._slots - 1
+        slot = key_hash & mask
+        mapped = self._map
+        while True:
+            entry_hash, pcm_offset, num_samples, key_offset, key_length, _ = ENTRY.unpack_from(
+                mapped, self._index_offset + slot * ENTRY.size
+            )
+            if key_length == 0:
+                self.misses += 1
+                return None
+            if entry_hash == key_hash and key_length == len(key):
+                start = self._keys_offset + key_offset
+                if mapped[start:start + key_length] == key:
+                    self.hits += 1
+                    return np.frombuffer(mapped, dtype='<i2', count=num_samples, offset=self._pcm_offset + pcm_offset)
+            slot = (slot + 1) & mask
+
+    def has_voice(self, model_name: str, reference_audio: Optional[str]) -> bool:
+        """Whether the prompts were rendered by model_name from reference_audio (None: the spk2info speaker)"""
+        built_from = self.metadata.get('reference_audio')
+        if self.metadata.get('model_name') != model_name:
+            return False
+        if built_from is None or reference_audio is None:
+            return built_from is None and reference_audio is None
+        return os.path.realpath(built_from) == os.path.realpath(reference_audio)
+
+    def texts(self) -> List[str]:
+        """Every prompt text in the archive, in index order"""
+        texts = []
+        for slot in range(self._slots):
+            _, _, _, key_offset, key_length, _ = ENTRY.unpack_from(self._map, self._index_offset + slot * ENTRY.size)
+            if key_length:
+                start = self._keys_offset + key_offset
+                texts.append(self._map[start:start + key_length].decode('utf-8'))
+        return texts
+
+    @property
+    def audio_seconds(self) -> float:
+        return self._pcm_size / 2 / self.sample_rate
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            # Views handed out by lookup() are still alive; the mapping goes with the last one
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_prompt(sink: AudioSink, samples: np.ndarray):
+    """Write archived int16 samples to a sink, passing them through untouched to PCM16 sinks"""
+    if sink.payload_format == 'pcm16':
+        sink.write_encoded(memoryview(samples).cast('B'), len(samples))
+    else:
+        sink.write(samples.astype(np.float32) / 32768.0)
+
+
+def load_prompts(path: str, default_speaker: str) -> Dict[str, List[str]]:
+    """Speaker -> prompt texts (deduplicated after normalization) from a TSV or JSON lines file"""
+    prompts = {}
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if path.endswith('.jsonl'):
+                record = json.loads(line)
+                speaker, text = record.get('speaker', default_speaker), record['text']
+            elif '\t' in line:
+                speaker, text = line.split('\t', 1)
+            else:
+                speaker, text = default_speaker, line
+            text = normalize_prompt(text)
+            if not text:
+                raise ValueError(f"{path}:{line_number}: empty prompt text")
+            texts = prompts.setdefault(speaker.strip() or default_speaker, [])
+            if text not in texts:
+                texts.append(text)
+    return prompts
+
+
+async def render_speaker(args, speaker: str, texts: List[str], reference: dict, client_pool,
+                         model_rate: int) -> Dict[str, np.ndarray]:
+    """Synthesize one speaker's prompts through the streaming client, a few at a time, at --target-sr"""
+    # Imported here: the client imports this module to serve archived prompts
+    import client_grpc_simple as tts
+
+    if reference:
+        waveform, sample_rate = tts.load_audio(reference['reference_audio'], target_sample_rate=16000)
+        reference_text = reference.get('reference_text', '')
+    else:
+        waveform, sample_rate, reference_text = None, 16000, ''
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = np.random.default_rng()
+
+    async def render(prompt_id: int, text: str) -> Tuple[str, np.ndarray]:
+        async with semaphore:
+            audio, latency, _ = await tts.synthesize_streaming(
+                f"{args.server_addr}:{args.server_port}",
+                args.model_name,
+                waveform,
+                reference_text,
+                text,
+                prompt_id,
+                sample_rate,
+                args.chunk_overlap_duration,
+                model_rate,
+                use_spk2info_cache=not reference,
+                client_pool=client_pool,
+            )
+        if audio is None:
+            raise RuntimeError(f"[{speaker}] synthesis failed: {text!r}")
+        audio = tts.resample_segment(audio, model_rate, args.target_sr)
+        logging.info(f"[{speaker}] {len(audio) / args.target_sr:.2f}s in {latency:.2f}s: {text[:60]}")
+        return text, float_to_int16(audio, not args.no_dither, rng)
+
+    return dict(await asyncio.gather(*(render(prompt_id, text) for prompt_id, text in enumerate(texts))))
+
+
+async def build(args) -> int:
+    # Imported here: the client imports this module to serve archived prompts
+    import client_grpc_simple as tts
+    from model_introspection import DEFAULT_CACHE_PATH, ModelInfoCache, model_output_rate
+
+    prompts = load_prompts(args.prompts, args.default_speaker)
+    server_url = f"{args.server_addr}:{args.server_port}"
+    model_rate = model_output_rate(ModelInfoCache(args.model_cache or DEFAULT_CACHE_PATH), server_url, args.model_name)
+    if model_rate is None:
+        logging.error(f"Unknown output rate of {args.model_name}; cannot label the archived audio")
+        return 1
+    if args.target_sr is None:
+        args.target_sr = model_rate
+    elif args.target_sr != model_rate:
+        logging.info(f"Resampling {args.model_name}'s {model_rate} Hz output to {args.target_sr} Hz")
+    speakers = {}
+    if args.speakers:
+        with open(args.speakers, encoding='utf-8') as f:
+            speakers = json.load(f)
+    os.makedirs(args.output_dir, exist_ok=True)
+    client_pool = tts.TritonClientPool(server_url, max_idle=args.concurrency)
+    summaries = {}
+    start_time = time.time()
+    try:
+        for speaker, texts in prompts.items():
+            reference = speakers.get(speaker)
+            logging.info(f"[{speaker}] rendering {len(texts)} prompts "
+                         f"({'reference ' + reference['reference_audio'] if reference else 'spk2info cache'})")
+            audio = await render_speaker(args, speaker, texts, reference, client_pool, model_rate)
+            path = os.path.join(args.output_dir, f"{speaker}{ARCHIVE_SUFFIX}")
+            summaries[path] = write_archive(path, args.target_sr, audio, {
+                'speaker': speaker,
+                'model_name': args.model_name,
+                'reference_audio': reference['reference_audio'] if reference else None,
+                'built_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            })
+    finally:
+        client_pool.close()
+
+    logging.info(f"\n{'='*60}")
+    logging.info(f"Built {len(summaries)} archives in {time.time() - start_time:.1f}s")
+    for path, summary in summaries.items():
+        logging.info(f"  {path}: {summary['prompts']} prompts, {summary['audio_seconds']:.1f}s of audio, "
+                     f"{summary['file_bytes'] / 2**20:.2f} MiB")
+    logging.info(f"{'='*60}")
+    return 0
+
+
+def info(args) -> int:
+    with PromptArchive(args.archive) as archive:
+        print(f"{args.archive}: {archive.count} prompts, {archive.audio_seconds:.1f}s at {archive.sample_rate} Hz")
+        for key, value in archive.metadata.items():
+            print(f"  {key}: {value}")
+        if args.list:
+            for text in archive.texts():
+                print(f"  {len(archive.lookup(text)) / archive.sample_rate:6.2f}s  {text}")
+    return 0
+
+
+def bench(args) -> int:
+    start = time.perf_counter()
+    archive = PromptArchive(args.archive)
+    open_time = time.perf_counter() - start
+    hits = archive.texts()
+    misses = [text + ' please' for text in hits]
+    results = {}
+    for name, texts in (('hit', hits), ('miss', misses)):
+        timings = np.empty(args.iterations * len(texts))
+        position = 0
+        for _ in range(args.iterations):
+            for text in texts:
+                start = time.perf_counter()
+                archive.lookup(text)
+                timings[position] = time.perf_counter() - start
+                position += 1
+        results[name] = timings * 1e6
+    touch_start = time.perf_counter()
+    # First pass over every prompt's pages, as the first caller of each prompt would see it
+    peak = max(int(np.abs(archive.lookup(text)).max(initial=0)) for text in hits)
+    touch_time = time.perf_counter() - touch_start
+
+    print(f"{args.archive}: {archive.count} prompts, {archive.audio_seconds:.1f}s of audio, opened in "
+          f"{open_time * 1e6:.0f} us")
+    for name, timings in results.items():
+        print(f"  {name:4s}: mean {timings.mean():.2f} us, p50 {np.percentile(timings, 50):.2f} us, "
+              f"p99 {np.percentile(timings, 99):.2f} us over {len(timings)} lookups")
+    print(f"  reading every prompt once: {touch_time * 1e3:.1f} ms (peak {peak})")
+    archive.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build and inspect memory-mapped archives of prerendered prompts',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Render prompts into one archive per speaker',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    build_parser.add_argument('prompts', type=str, help='Prompts file: speaker<TAB>text lines, or .jsonl')
+    build_parser.add_argument('--speakers', type=str, default=None,
+                              help='JSON of speaker -> reference_audio/reference_text; others use spk2info')
+    build_parser.add_argument('--default-speaker', type=str, default='default',
+                              help='Speaker of prompt lines that do not name one')
+    build_parser.add_argument('--output-dir', type=str, default='prompts', help='Where the archives are written')
+    build_parser.add_argument('--server-addr', type=str, default='speechlab-tunnel.southeastasia.cloudapp.azure.com', help='Server address')
+    build_parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    build_parser.add_argument('--model-name', type=str, default='cosyvoice2', help='Model name')
+    build_parser.add_argument('--target-sr', type=int, default=None,
+                              help="Sample rate of the archived audio (default: the model's probed output rate)")
+    build_parser.add_argument('--model-cache', type=str, default=None,
+                              help="File caching model probe results (default: the client's cache)")
+    build_parser.add_argument('--chunk-overlap-duration', type=float, default=0.1,
+                              help='Chunk overlap duration for streaming (seconds)')
+    build_parser.add_argument('--concurrency', type=int, default=4, help='Prompts synthesized at once')
+    build_parser.add_argument('--no-dither', action='store_true',
+                              help='Disable TPDF dither when converting to 16-bit PCM')
+
+    info_parser = subparsers.add_parser('info', help='Show what an archive holds',
+                                        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    info_parser.add_argument('archive', type=str, help='Archive file')
+    info_parser.add_argument('--list', action='store_true', help='List every prompt and its duration')
+
+    bench_parser = subparsers.add_parser('bench', help='Time lookups of every prompt and of near misses',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    bench_parser.add_argument('archive', type=str, help='Archive file')
+    bench_parser.add_argument('--iterations', type=int, default=1000, help='Lookups per prompt')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        return asyncio.run(build(args))
+    if args.command == 'info':
+        return info(args)
+    return bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
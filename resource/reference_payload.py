@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+"""
+Minimal-payload encoding of the reference_wav request input.
+
+prepare_request_input_output() pads the reference to make room for the generated
+speech. The legacy sizing always rounds the estimated reference+target duration up
+to the next multiple of 10 s, using a character-count ratio. That sends seconds of
+float32 zeros with every segment. ReferencePayloadOptimizer changes three things:
+- it picks the smallest bucket from a padding ladder (2/4/8/16 s by default, then
+  steps of 8 s) that fits the estimate
+- it estimates speech length in spoken units (syllables of Latin words, CJK
+  characters, digits), at the reference's own rate, plus pauses for punctuation
+- it sends FP16 or INT16 samples when the model's ModelMetadata declares that
+  datatype for reference_wav
+It also counts the bytes each request saves compared to the legacy encoding.
+
+Usage:
+# Compare payload sizes for a reference and some texts
+python3 reference_payload.py --reference-audio prompt.wav --reference-text "..." --target-text "..."
+"""
+
+import argparse
+import logging
+import math
+import re
+from typing import Dict, Sequence
+
+import numpy as np
+
+from audio_sinks import float_to_int16
+
+DEFAULT_PADDING_LADDER = (2, 4, 8, 16)
+# reference_wav datatypes we can encode, as Triton names them
+WIRE_DTYPES = {'FP32': np.float32, 'FP16': np.float16, 'INT16': np.int16}
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+LATIN_WORD_PATTERN = re.compile(r"[A-Za-z']+")
+VOWEL_GROUP_PATTERN = re.compile(r'[aeiouy]+')
+DIGIT_PATTERN = re.compile(r'\d')
+PAUSE_PATTERN = re.compile(r'[,;:，；：、.!?。！？…]+')
+# Plausible speaking rates; a reference outside them (silence, bad transcript) is clamped
+MIN_UNITS_PER_SECOND = 2.0
+MAX_UNITS_PER_SECOND = 8.0
+DEFAULT_UNITS_PER_SECOND = 4.0
+PAUSE_SECONDS = 0.2
+
+
+def spoken_units(text: str) -> float:
+    """Rough count of syllable-sized units: CJK characters, Latin syllables and digits"""
+    units = len(CJK_PATTERN.findall(text)) + len(DIGIT_PATTERN.findall(text))
+    for word in LATIN_WORD_PATTERN.findall(text.lower()):
+        units += max(len(VOWEL_GROUP_PATTERN.findall(word.rstrip('e') or word)), 1)
+    return float(units)
+
+
+def estimate_target_duration(reference_duration: float, reference_text: str, target_text: str) -> float:
+    """Seconds of speech for target_text, spoken at the reference's rate"""
+    pauses = len(PAUSE_PATTERN.findall(target_text)) * PAUSE_SECONDS
+    reference_units = spoken_units(reference_text) if reference_text else 0.0
+    if reference_units:
+        reference_pauses = len(PAUSE_PATTERN.findall(reference_text)) * PAUSE_SECONDS
+        speaking_time = max(reference_duration - reference_pauses, reference_duration / 2)
+        rate = min(max(reference_units / speaking_time, MIN_UNITS_PER_SECOND), MAX_UNITS_PER_SECOND)
+    else:
+        rate = DEFAULT_UNITS_PER_SECOND
+    return spoken_units(target_text) / rate + pauses
+
+
+def legacy_padded_samples(num_samples: int, sample_rate: int, reference_text: str, target_text: str,
+                          padding_duration: int = 10) -> int:
+    """The padded length prepare_request_input_output() used before payload optimization"""
+    duration = num_samples / sample_rate
+    if reference_text:
+        estimated_target_duration = duration / len(reference_text) * len(target_text)
+    else:
+        estimated_target_duration = duration
+    return padding_duration * sample_rate * ((int(estimated_target_duration + duration) // padding_duration) + 1)
+
+
+def padding_bucket(seconds: float, ladder: Sequence[float] = DEFAULT_PADDING_LADDER) -> float:
+    """Smallest ladder rung holding `seconds`; past the top, the ladder goes on in steps of half the top rung"""
+    for rung in sorted(ladder):
+        if seconds <= rung:
+            return rung
+    top = max(ladder)
+    step = top / 2
+    return top + step * math.ceil((seconds - top) / step)
+
+
+class ReferencePayloadOptimizer:
+    """Sizes and encodes padded reference audio, and keeps per-request byte savings"""
+    def __init__(self, ladder: Sequence[float] = DEFAULT_PADDING_LADDER, margin: float = 1.2,
+                 wire_dtypes: Dict[str, str] = None):
+        # No ladder keeps the legacy sizing, so only the wire datatype changes
+        self.ladder = tuple(sorted(ladder)) if ladder else None
+        self.margin = margin
+        # model name -> Triton datatype for reference_wav; FP32 when not listed
+        self.wire_dtypes = dict(wire_dtypes or {})
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_legacy = 0
+
+    def padded_samples(self, num_samples: int, sample_rate: int, reference_text: str, target_text: str) -> int:
+        if self.ladder is None:
+            return legacy_padded_samples(num_samples, sample_rate, reference_text, target_text)
+        duration = num_samples / sample_rate
+        estimate = estimate_target_duration(duration, reference_text, target_text) * self.margin
+        return max(int(padding_bucket(duration + estimate, self.ladder) * sample_rate), num_samples)
+
+    def wire_dtype(self, model_name: str) -> str:
+        return self.wire_dtypes.get(model_name, 'FP32')
+
+    def encode(self, waveform: np.ndarray, padded_samples: int, wire_dtype: str) -> np.ndarray:
+        """Zero-padded [1, padded_samples] reference in the wire datatype"""
+        samples = np.zeros((1, padded_samples), dtype=WIRE_DTYPES[wire_dtype])
+        if wire_dtype == 'INT16':
+            samples[0, :len(waveform)] = float_to_int16(waveform, dither=False)
+        else:
+            samples[0, :len(waveform)] = waveform
+        return samples
+
+    def record(self, bytes_sent: int, bytes_legacy: int):
+        self.requests += 1
+        self.bytes_sent += bytes_sent
+        self.bytes_legacy += bytes_legacy
+
+    def stats(self) -> dict:
+        saved = self.bytes_legacy - self.bytes_sent
+        return {
+            'requests': self.requests,
+            'bytes_sent': self.bytes_sent,
+            'bytes_legacy': self.bytes_legacy,
+            'bytes_saved': saved,
+            'bytes_saved_per_request': saved / self.requests if self.requests else 0.0,
+        }
+
+
+def choose_wire_dtype(model_name: str, declared: str, preferred: str = 'auto') -> str:
+    """
+    reference_wav datatype to send to a model.
+
+    Args:
+        model_name: Model the datatype is for, for the log
+        declared: Datatype the model's ModelMetadata declares for reference_wav
+        preferred: 'auto' to use whatever the model declares, or a datatype from
+            WIRE_DTYPES; the server rejects any other datatype, so a preference the
+            model does not declare is overridden with a warning
+
+    Returns:
+        A key of WIRE_DTYPES
+    """
+    if declared not in WIRE_DTYPES:
+        logging.warning(f"{model_name} declares reference_wav as {declared}, which we cannot encode; using FP32")
+        return 'FP32'
+    if preferred not in ('auto', declared):
+        logging.warning(f"{model_name} declares reference_wav as {declared}, not {preferred}; sending {declared}")
+    return declared
+
+
+def main():
+    # Imported here: the client imports this module for the optimizer
+    import client_grpc_simple as tts
+
+    parser = argparse.ArgumentParser(
+        description='Compare legacy and optimized reference_wav payload sizes',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--reference-audio', type=str, required=True, help='Reference audio file')
+    parser.add_argument('--reference-text', type=str, default='', help='Transcript of the reference audio')
+    parser.add_argument('--target-text', type=str, nargs='+', required=True, help='Texts to size payloads for')
+    parser.add_argument('--padding-ladder', type=float, nargs='+', default=list(DEFAULT_PADDING_LADDER),
+                       help='Padding buckets in seconds')
+    parser.add_argument('--wire-dtype', type=str, default='FP32', choices=sorted(WIRE_DTYPES),
+                       help='reference_wav datatype to size for')
+    args = parser.parse_args()
+
+    waveform, sample_rate = tts.load_audio(args.reference_audio, target_sample_rate=16000)
+    optimizer = ReferencePayloadOptimizer(args.padding_ladder)
+    item_size = np.dtype(WIRE_DTYPES[args.wire_dtype]).itemsize
+    duration = len(waveform) / sample_rate
+    print(f"Reference: {duration:.2f}s, {spoken_units(args.reference_text):.0f} spoken units")
+    for text in args.target_text:
+        legacy = legacy_padded_samples(len(waveform), sample_rate, args.reference_text, text)
+        padded = optimizer.padded_samples(len(waveform), sample_rate, args.reference_text, text)
+        optimizer.record(padded * item_size, legacy * 4)
+        estimate = estimate_target_duration(duration, args.reference_text, text)
+        print(f"  est. {estimate:5.2f}s: legacy {legacy / sample_rate:4.0f}s ({legacy * 4 / 1024:7.1f} KiB) -> "
+              f"{padded / sample_rate:4.0f}s ({padded * item_size / 1024:7.1f} KiB): {text[:50]!r}")
+    stats = optimizer.stats()
+    print(f"Saved {stats['bytes_saved'] / 1024:.1f} KiB over {stats['requests']} requests "
+          f"({stats['bytes_saved_per_request'] / 1024:.1f} KiB per request)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+"""
+Automatic reference-window selection: send the server a short, dense prompt.
+
+load_audio() hands the whole reference file to every request. A long or noisy
+reference costs upload bytes, server prompt-encoding time and TTFB, and the
+padding prepare_request_input_output() adds grows with it too.
+select_reference_window() runs a vectorized frame-energy VAD over the reference.
+It picks the contiguous window, 3 to 8 s by default, that holds the most speech
+for the least silence, then trims the silence at its edges.
+
+The model aligns reference_text with the reference audio, so a window that drops
+speech also needs the transcript of the window. window_reference() therefore cuts
+speech only when it has that transcript (--reference-window-text) or no transcript
+is used at all. Otherwise it only trims the leading and trailing silence, which
+keeps the full transcript valid.
+
+Usage:
+# Show the chosen window and save it for transcription
+python3 reference_window.py --reference-audio prompt.wav --output window.wav
+
+# A/B the TTFB of the full reference against the window
+python3 reference_window.py --reference-audio prompt.wav --reference-text "..." \\
+    --window-text "..." --server-addr localhost --repeats 5
+
+# Use the window in the client
+python3 client_grpc_simple.py --reference-window --reference-window-text "..."
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_WINDOW_RANGE = (3.0, 8.0)
+
+
+def frame_energy_db(waveform: np.ndarray, sample_rate: int, frame_ms: int = 20) -> np.ndarray:
+    """RMS energy in dB of consecutive non-overlapping frames; a trailing partial frame is dropped"""
+    hop = sample_rate * frame_ms // 1000
+    frames = waveform[:len(waveform) // hop * hop].reshape(-1, hop)
+    return 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+
+def voiced_frames(energy_db: np.ndarray, margin_db: float = 12.0, floor_percentile: float = 10.0,
+                  max_gap_frames: int = 10) -> np.ndarray:
+    """
+    Frames holding speech: energy margin_db over the noise floor.
+
+    Pauses of up to max_gap_frames inside speech count as voiced, so a window
+    boundary lands between phrases rather than between syllables.
+    """
+    if not len(energy_db):
+        return np.zeros(0, dtype=bool)
+    floor = np.percentile(energy_db, floor_percentile)
+    # A reference that is speech throughout has no floor to measure; keep the loud part
+    threshold = min(floor + margin_db, energy_db.max() - 6.0)
+    voiced = energy_db > threshold
+    if max_gap_frames:
+        # Morphological closing: dilate, then erode by the same half-width
+        half = max_gap_frames // 2
+        kernel = np.ones(2 * half + 1)
+        dilated = np.convolve(voiced, kernel, mode='same') > 0
+        voiced = np.convolve(np.pad(~dilated, half, constant_values=True), kernel, mode='valid') == 0
+    return voiced
+
+
+def select_reference_window(
+    waveform: np.ndarray,
+    sample_rate: int,
+    min_seconds: float = DEFAULT_WINDOW_RANGE[0],
+    max_seconds: float = DEFAULT_WINDOW_RANGE[1],
+    frame_ms: int = 20,
+    silence_penalty: float = 2.0,
+    edge_pad: float = 0.1,
+) -> dict:
+    """
+    Best contiguous voiced window of the reference.
+
+    Every window of min_seconds to max_seconds is scored as its voiced frames minus
+    silence_penalty per silent frame, in one pass over prefix sums. The best window
+    is then trimmed to its first and last voiced frame, plus edge_pad seconds.
+
+    Returns:
+        'start'/'end' sample offsets, 'duration', 'voiced' seconds in the window,
+        'dropped_speech' voiced seconds left outside it, and the speech-only span
+        'speech_start'/'speech_end'
+    """
+    hop = sample_rate * frame_ms // 1000
+    voiced = voiced_frames(frame_energy_db(waveform, sample_rate, frame_ms))
+    frames = len(voiced)
+    pad = int(edge_pad * sample_rate)
+    if not voiced.any():
+        return {'start': 0, 'end': len(waveform), 'duration': len(waveform) / sample_rate, 'voiced': 0.0,
+                'dropped_speech': 0.0, 'speech_start': 0, 'speech_end': len(waveform)}
+
+    min_frames = max(int(min_seconds * 1000 / frame_ms), 1)
+    max_frames = max(int(max_seconds * 1000 / frame_ms), min_frames)
+    if frames <= min_frames:
+        first, last = 0, frames
+    else:
+        max_frames = min(max_frames, frames)
+        prefix = np.concatenate([[0.0], np.cumsum(np.where(voiced, 1.0, -silence_penalty))])
+        # For window end j, the best start is the minimum prefix over [j - max_frames, j - min_frames]
+        spread = max_frames - min_frames
+        shifted = np.concatenate([np.full(spread, np.inf), prefix])
+        candidates = sliding_window_view(shifted, spread + 1)[:frames - min_frames + 1]
+        offsets = candidates.argmin(axis=1)
+        ends = np.arange(min_frames, frames + 1)
+        scores = prefix[ends] - candidates[np.arange(len(ends)), offsets]
+        best = int(scores.argmax())
+        last = int(ends[best])
+        first = last - min_frames + int(offsets[best]) - spread
+
+    window_voiced = np.flatnonzero(voiced[first:last]) + first
+    if len(window_voiced):
+        first, last = int(window_voiced[0]), int(window_voiced[-1]) + 1
+    speech = np.flatnonzero(voiced)
+    start, end = max(first * hop - pad, 0), min(last * hop + pad, len(waveform))
+    return {
+        'start': start,
+        'end': end,
+        'duration': (end - start) / sample_rate,
+        'voiced': float(voiced[first:last].sum()) * hop / sample_rate,
+        'dropped_speech': float(voiced.sum() - voiced[first:last].sum()) * hop / sample_rate,
+        'speech_start': max(int(speech[0]) * hop - pad, 0),
+        'speech_end': min((int(speech[-1]) + 1) * hop + pad, len(waveform)),
+    }
+
+
+def window_reference(
+    waveform: np.ndarray,
+    sample_rate: int,
+    reference_text: str,
+    window_text: str = None,
+    min_seconds: float = DEFAULT_WINDOW_RANGE[0],
+    max_seconds: float = DEFAULT_WINDOW_RANGE[1],
+) -> Tuple[np.ndarray, str, dict]:
+    """
+    Cut the reference to its best window, keeping the transcript aligned.
+
+    Args:
+        waveform: Full reference audio
+        sample_rate: Its sample rate
+        reference_text: Transcript of the full reference ('' if none is sent)
+        window_text: Transcript of the selected window, when the window drops speech
+        min_seconds: Shortest window
+        max_seconds: Longest window
+
+    Returns:
+        (waveform, reference_text, window) to send; window['mode'] is 'window' or
+        'trim' (edge silence only)
+    """
+    window = select_reference_window(waveform, sample_rate, min_seconds, max_seconds)
+    if window['dropped_speech'] and reference_text and not window_text:
+        logging.warning(f"The best {window['duration']:.1f}s reference window drops "
+                        f"{window['dropped_speech']:.1f}s of speech, which needs its own transcript "
+                        "(--reference-window-text); only trimming edge silence")
+        window.update(start=window['speech_start'], end=window['speech_end'], mode='trim',
+                      voiced=window['voiced'] + window['dropped_speech'], dropped_speech=0.0)
+    else:
+        window['mode'] = 'window' if window['dropped_speech'] else 'trim'
+        if window['dropped_speech'] and window_text:
+            reference_text = window_text
+    window['duration'] = (window['end'] - window['start']) / sample_rate
+    return waveform[window['start']:window['end']], reference_text, window
+
+
+async def compare_ttfb(args, references: dict) -> dict:
+    """Alternate the references request by request and collect TTFB and upload bytes for each"""
+    # Imported here: the client imports this module for window selection
+    import client_grpc_simple as tts
+    # Per-chunk client logs would drown the comparison
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server_url = f"{args.server_addr}:{args.server_port}"
+    pool = tts.TritonClientPool(server_url)
+    results = {name: {'ttfb': [], 'bytes': [], 'failures': 0} for name in references}
+    try:
+        for repeat in range(args.repeats):
+            for name, (waveform, reference_text) in references.items():
+                audio, _, ttfb = await tts.synthesize_streaming(
+                    server_url,
+                    args.model_name,
+                    waveform,
+                    reference_text,
+                    args.target_text,
+                    repeat,
+                    16000,
+                    save_sample_rate=args.target_sr,
+                    client_pool=pool,
+                )
+                if audio is None:
+                    results[name]['failures'] += 1
+                    continue
+                results[name]['ttfb'].append(ttfb)
+                results[name]['bytes'].append(tts.legacy_padded_samples(
+                    len(waveform), 16000, reference_text, args.target_text) * 4)
+    finally:
+        pool.close()
+    return results
+
+
+def main():
+    # Imported here: the client imports this module for window selection
+    import client_grpc_simple as tts
+
+    parser = argparse.ArgumentParser(
+        description='Pick the best reference window and compare its TTFB against the full reference',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--reference-audio', type=str, required=True, help='Reference audio file')
+    parser.add_argument('--reference-text', type=str, default='', help='Transcript of the full reference')
+    parser.add_argument('--window-text', type=str, default=None, help='Transcript of the selected window')
+    parser.add_argument('--window-range', type=float, nargs=2, default=list(DEFAULT_WINDOW_RANGE),
+                       metavar=('MIN', 'MAX'), help='Window length range in seconds')
+    parser.add_argument('--output', type=str, default=None, help='Write the selected window to this file')
+    parser.add_argument('--server-addr', type=str, default=None,
+                       help='Server to compare TTFB against (no comparison if omitted)')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, default='cosyvoice2', help='Model name')
+    parser.add_argument('--target-text', type=str,
+                       default='Thanks for calling. Your order shipped yesterday and should arrive on Friday.',
+                       help='Text to synthesize for every request')
+    parser.add_argument('--target-sr', type=int, default=24000, help='Model output sample rate')
+    parser.add_argument('--repeats', type=int, default=5, help='Requests per reference')
+    args = parser.parse_args()
+
+    waveform, sample_rate = tts.load_audio(args.reference_audio, target_sample_rate=16000)
+    window_waveform, window_text, window = window_reference(
+        waveform, sample_rate, args.reference_text, args.window_text, *args.window_range
+    )
+    print(f"Reference: {len(waveform) / sample_rate:.2f}s; {window['mode']} "
+          f"{window['start'] / sample_rate:.2f}-{window['end'] / sample_rate:.2f}s "
+          f"({window['duration']:.2f}s, {window['voiced']:.2f}s voiced, "
+          f"{window['dropped_speech']:.2f}s of speech left out)")
+    if args.output:
+        import soundfile as sf
+        sf.write(args.output, window_waveform, sample_rate)
+        print(f"Window written to {args.output}")
+    if not args.server_addr:
+        return
+
+    results = asyncio.run(compare_ttfb(args, {
+        'full': (waveform, args.reference_text),
+        'window': (window_waveform, window_text),
+    }))
+    print(f"{args.repeats} requests per reference to {args.server_addr}:{args.server_port} ({args.model_name})")
+    for name, result in results.items():
+        if not result['ttfb']:
+            print(f"  {name:>6}: all {result['failures']} requests failed")
+            continue
+        print(f"  {name:>6}: TTFB mean {np.mean(result['ttfb']):.3f}s, p50 {np.median(result['ttfb']):.3f}s; "
+              f"reference_wav {np.mean(result['bytes']) / 1024:.1f} KiB"
+              + (f"; {result['failures']} failed" if result['failures'] else ""))
+    if results['full']['ttfb'] and results['window']['ttfb']:
+        change = np.mean(results['window']['ttfb']) - np.mean(results['full']['ttfb'])
+        print(f"TTFB change with the window: {change * 1000:+.0f} ms "
+              f"({change / np.mean(results['full']['ttfb']):+.1%})")
+
+
+if __name__ == "__main__":
+    main()
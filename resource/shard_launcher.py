@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+
+"""
+Multi-process sharding of the streaming TTS client across CPU cores.
+
+One client process runs out of GIL long before the GPU fleet is saturated.
+Callback threads, chunk decoding, reconstruction, resampling and logging all
+compete for it. ShardLauncher starts N spawned worker processes. Each has its
+own Triton channels (TritonClientPool) and runs the existing
+synthesize_streaming() / synthesize_with_splitting() pipeline. The dispatcher
+puts jobs on one shared queue, and idle workers take the next one. A job is
+either a whole utterance, which the worker splits itself, or a single segment.
+
+Audio never crosses the process boundary as a pickled array. Every worker
+writes framed records (job id, kind, sample count, value) into its own
+multiprocessing.shared_memory ring. A collector thread in the parent copies
+them out. A full ring blocks its worker, which gives backpressure in the same
+way the in-process FlowController does.
+
+The benchmark's scaling efficiency is throughput per worker relative to one
+worker. It measures CPU scaling only while the workers fit on separate cores and
+the server is not the bottleneck. With more workers than cores, any gain comes
+from overlapping server waits, which more jobs in flight per worker would give too.
+
+Usage:
+# Throughput with 1, 2 and 4 workers: 32 utterances each
+python3 shard_launcher.py --server-addr localhost --workers 1 2 4 --utterances 32
+
+# Hand out segments instead of utterances
+python3 shard_launcher.py --workers 4 --unit segment
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List
+
+import numpy as np
+from tritonclient.utils import InferenceServerException
+
+from audio_sinks import AudioSink
+from model_introspection import DEFAULT_CACHE_PATH, ModelInfoCache, uses_spk2info
+
+# Monotonic write and read byte positions, then the data capacity
+RING_HEADER = struct.Struct('<QQQ')
+# job id, kind, samples, value (TTFB for END records)
+RECORD_HEADER = struct.Struct('<IIIf')
+# CLAIMED: a worker took the job off the queue, so its death fails the job
+AUDIO, END, FAILED, CLAIMED = 1, 2, 3, 4
+
+
+class SharedAudioRing:
+    """
+    Single-producer, single-consumer ring of audio records in shared memory.
+
+    Positions live in the shared block itself; a multiprocessing.Condition guards
+    them and wakes the other side. Records may wrap around the end of the ring.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, condition, owner: bool):
+        self._shm = shm
+        self._condition = condition
+        self._owner = owner
+        self._positions = np.ndarray((3,), dtype=np.uint64, buffer=shm.buf[:RING_HEADER.size])
+        self.capacity = int(self._positions[2])
+        self._data = np.ndarray((self.capacity,), dtype=np.uint8, buffer=shm.buf[RING_HEADER.size:])
+
+    @classmethod
+    def create(cls, capacity: int, context) -> 'SharedAudioRing':
+        shm = shared_memory.SharedMemory(create=True, size=RING_HEADER.size + capacity)
+        RING_HEADER.pack_into(shm.buf, 0, 0, 0, capacity)
+        return cls(shm, context.Condition(), owner=True)
+
+    @classmethod
+    def attach(cls, name: str, condition) -> 'SharedAudioRing':
+        # Spawned workers share the parent's resource tracker, so registering again on attach is harmless
+        return cls(shared_memory.SharedMemory(name=name), condition, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def condition(self):
+        return self._condition
+
+    def _used(self) -> int:
+        return int(self._positions[0] - self._positions[1])
+
+    def _copy_in(self, position: int, payload: np.ndarray):
+        offset = position % self.capacity
+        first = min(len(payload), self.capacity - offset)
+        self._data[offset:offset + first] = payload[:first]
+        self._data[:len(payload) - first] = payload[first:]
+
+    def _copy_out(self, position: int, size: int) -> np.ndarray:
+        offset = position % self.capacity
+        first = min(size, self.capacity - offset)
+        if first == size:
+            return self._data[offset:offset + size].copy()
+        return np.concatenate([self._data[offset:], self._data[:size - first]])
+
+    def write(self, job_id: int, kind: int, samples: np.ndarray = None, value: float = 0.0):
+        """Append a record, blocking while the ring is too full for it"""
+        payload = np.ascontiguousarray(samples if samples is not None else np.zeros(0), dtype=np.float32)
+        max_samples = (self.capacity // 2 - RECORD_HEADER.size) // 4
+        if len(payload) > max_samples:
+            # Oversized chunks are written as several records, each under half the ring
+            for start in range(0, len(payload), max_samples):
+                self.write(job_id, kind, payload[start:start + max_samples], value)
+            return
+        header = np.frombuffer(RECORD_HEADER.pack(job_id, kind, len(payload), value), dtype=np.uint8)
+        size = len(header) + payload.nbytes
+        with self._condition:
+            self._condition.wait_for(lambda: self.capacity - self._used() >= size)
+            position = int(self._positions[0])
+            self._copy_in(position, header)
+            self._copy_in(position + len(header), payload.view(np.uint8))
+            self._positions[0] = position + size
+            self._condition.notify_all()
+
+    def read(self, timeout: float = None):
+        """Next record as (job id, kind, samples, value), or None on timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._used() > 0, timeout):
+                return None
+            position = int(self._positions[1])
+            job_id, kind, num_samples, value = RECORD_HEADER.unpack(
+                self._copy_out(position, RECORD_HEADER.size).tobytes()
+            )
+            samples = self._copy_out(position + RECORD_HEADER.size, num_samples * 4).view(np.float32)
+            self._positions[1] = position + RECORD_HEADER.size + num_samples * 4
+            self._condition.notify_all()
+        return job_id, kind, samples, value
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        del self._positions, self._data
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class RingSink(AudioSink):
+    """Worker-side sink: synthesize_with_splitting() output goes into the ring as one job's records"""
+    format_name = 'ring'
+
+    def __init__(self, ring: SharedAudioRing, job_id: int, sample_rate: int):
+        super().__init__(sample_rate)
+        self.ring = ring
+        self.job_id = job_id
+
+    def _write(self, samples: np.ndarray):
+        self.ring.write(self.job_id, AUDIO, samples)
+
+    def close(self):
+        pass
+
+
+async def _serve_jobs(index: int, config: dict, jobs, ring: SharedAudioRing):
+    # Imported here: spawned workers load the client on their own
+    import client_grpc_simple as tts
+
+    server_url = f"{config['server_addr']}:{config['server_port']}"
+    args = argparse.Namespace(**config)
+    waveform, sample_rate = (None, 16000) if config['use_spk2info_cache'] else \
+        tts.load_audio(config['reference_audio'], target_sample_rate=16000)
+    pool = tts.TritonClientPool(server_url)
+    pool.prewarm(config['concurrency'])
+
+    async def lane():
+        while True:
+            job = await asyncio.to_thread(jobs.get)
+            if job is None:
+                return
+            job_id, text, split = job
+            ring.write(job_id, CLAIMED)
+            try:
+                if split:
+                    sink = RingSink(ring, job_id, config['target_sr'])
+                    _, _, stats = await tts.synthesize_with_splitting(
+                        args, waveform, config['reference_text'], text, sample_rate,
+                        client_pool=pool, simulate_llm_delay=False, sink=sink,
+                    )
+                    ttfb = stats['avg_first_chunk_latency'] if sink.samples_written else None
+                else:
+                    audio, _, ttfb = await tts.synthesize_streaming(
+                        server_url, config['model_name'], waveform, config['reference_text'], text, job_id,
+                        sample_rate, config['chunk_overlap_duration'], config['target_sr'],
+                        use_spk2info_cache=config['use_spk2info_cache'], client_pool=pool,
+                        on_audio=lambda samples, job_id=job_id: ring.write(job_id, AUDIO, samples),
+                    )
+                    ttfb = ttfb if audio is not None else None
+            except Exception as e:
+                logging.error(f"[Worker {index}] Job {job_id} failed: {e}")
+                ttfb = None
+            ring.write(job_id, END if ttfb is not None else FAILED, value=ttfb or 0.0)
+
+    try:
+        await asyncio.gather(*(lane() for _ in range(config['concurrency'])))
+    finally:
+        pool.close()
+
+
+def _worker_main(index: int, config: dict, jobs, ring_name: str, condition):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(message)s', force=True)
+    ring = SharedAudioRing.attach(ring_name, condition)
+    try:
+        asyncio.run(_serve_jobs(index, config, jobs, ring))
+    finally:
+        ring.close()
+
+
+class ShardLauncher:
+    """
+    N client worker processes fed from one job queue, with audio returned through shared memory.
+
+    config holds what a worker needs to build its pipeline: server_addr/server_port,
+    model_name, target_sr, reference_audio/reference_text, use_spk2info_cache,
+    min_words/max_words, chunk_overlap_duration and concurrency (jobs in flight per
+    worker). A worker that exits fails the jobs it had claimed; once none is left,
+    every pending job fails.
+    """
+    def __init__(self, config: dict, workers: int, ring_bytes: int = 8 * 2**20):
+        self.config = config
+        self.workers = workers
+        # gRPC channels must not be inherited through fork, so workers are spawned
+        self._context = multiprocessing.get_context('spawn')
+        self._jobs = self._context.Queue()
+        self._rings: List[SharedAudioRing] = []
+        self._processes = []
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._results: Dict[int, dict] = {}
+        self._next_job = 0
+        self._done = threading.Condition(self._lock)
+        self._stopping = False
+        self._ring_bytes = ring_bytes
+
+    def start(self) -> 'ShardLauncher':
+        for index in range(self.workers):
+            ring = SharedAudioRing.create(self._ring_bytes, self._context)
+            process = self._context.Process(
+                target=_worker_main, args=(index, self.config, self._jobs, ring.name, ring.condition),
+                name=f'tts-shard-{index}', daemon=True,
+            )
+            process.start()
+            collector = threading.Thread(target=self._collect, args=(index, ring, process),
+                                         name=f'shard-collect-{index}', daemon=True)
+            collector.start()
+            self._rings.append(ring)
+            self._processes.append(process)
+            self._collectors.append(collector)
+        return self
+
+    def submit(self, text: str, split: bool = True) -> int:
+        """Queue an utterance (split by the worker) or a single segment; returns its job id"""
+        with self._lock:
+            job_id = self._next_job
+            self._next_job += 1
+            self._results[job_id] = {
+                'chunks': [], 'submitted': time.time(), 'first_audio': None, 'finished': None,
+                'ttfb': None, 'ok': None, 'worker': None,
+            }
+        self._jobs.put((job_id, text, split))
+        return job_id
+
+    def _collect(self, index: int, ring: SharedAudioRing, process):
+        reported = False
+        while True:
+            # Checked before the read: once an exited worker's ring is empty, nothing more can arrive
+            alive = process.is_alive()
+            record = ring.read(timeout=0.1)
+            if record is None:
+                if self._stopping:
+                    return
+                if not alive:
+                    self._fail_orphans(index, process.exitcode, reported)
+                    reported = True
+                continue
+            job_id, kind, samples, value = record
+            with self._lock:
+                result = self._results[job_id]
+                if kind == CLAIMED:
+                    result['worker'] = index
+                elif kind == AUDIO:
+                    if result['first_audio'] is None:
+                        result['first_audio'] = time.time()
+                    result['chunks'].append(samples)
+                else:
+                    result['ok'] = kind == END
+                    result['ttfb'] = value if kind == END else None
+                    result['finished'] = time.time()
+                    self._done.notify_all()
+
+    def _fail_orphans(self, index: int, exitcode: int, reported: bool):
+        """Fail the jobs an exited worker held, and every pending job once no worker is left"""
+        with self._lock:
+            fleet_dead = not any(process.is_alive() for process in self._processes)
+            orphans = [
+                result for result in self._results.values()
+                if result['ok'] is None and (result['worker'] == index or fleet_dead)
+            ]
+            if not orphans:
+                return
+            if not reported:
+                logging.error(f"Shard worker {index} exited with code {exitcode}; failing {len(orphans)} pending jobs")
+            for result in orphans:
+                result['ok'] = False
+                result['finished'] = time.time()
+            self._done.notify_all()
+
+    def wait(self, job_ids: List[int] = None, timeout: float = None) -> Dict[int, dict]:
+        """Block until the jobs finish or timeout passes; returns their results with 'audio' joined (unfinished: ok None)"""
+        with self._lock:
+            job_ids = list(self._results) if job_ids is None else job_ids
+            self._done.wait_for(lambda: all(self._results[j]['ok'] is not None for j in job_ids), timeout)
+            results = {}
+            for job_id in job_ids:
+                result = self._results[job_id]
+                audio = np.concatenate(result['chunks']) if result['chunks'] else np.zeros(0, dtype=np.float32)
+                results[job_id] = dict(result, audio=audio)
+            return results
+
+    def close(self):
+        for _ in range(self.workers * self.config['concurrency']):
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self._stopping = True
+        for collector in self._collectors:
+            collector.join()
+        for ring in self._rings:
+            ring.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_benchmark(config: dict, workers: int, texts: List[str], unit: str, timeout: float = None) -> dict:
+    """Synthesize all texts with `workers` processes and measure throughput; jobs unfinished after timeout fail"""
+    # Imported here: the parent needs the splitter only for segment dispatch
+    import client_grpc_simple as tts
+
+    with ShardLauncher(config, workers) as launcher:
+        # Let every worker import the client and connect before the clock starts
+        warmup = launcher.wait([launcher.submit(texts[0], split=False) for _ in range(workers)], timeout)
+        failed = sum(not r['ok'] for r in warmup.values())
+        if failed:
+            raise RuntimeError(f"{failed} of {workers} warm-up jobs failed or timed out")
+        start = time.time()
+        job_ids = []
+        for text in texts:
+            if unit == 'segment':
+                job_ids += [launcher.submit(segment, split=False) for segment in
+                            tts.split_text_by_punctuation(text, config['min_words'], config['max_words'])]
+            else:
+                job_ids.append(launcher.submit(text, split=True))
+        results = launcher.wait(job_ids, timeout)
+        wall_time = time.time() - start
+    audio_seconds = sum(len(r['audio']) for r in results.values()) / config['target_sr']
+    ttfbs = [r['ttfb'] for r in results.values() if r['ok']]
+    return {
+        'workers': workers,
+        'jobs': len(job_ids),
+        'failed': sum(r['ok'] is False for r in results.values()),
+        'timed_out': sum(r['ok'] is None for r in results.values()),
+        'wall_time': wall_time,
+        'audio_seconds': audio_seconds,
+        'throughput': audio_seconds / wall_time,
+        'mean_ttfb': float(np.mean(ttfbs)) if ttfbs else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Shard the streaming TTS client over worker processes and measure throughput scaling',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='localhost', help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, default='cosyvoice2', help='Model name')
+    parser.add_argument('--reference-audio', type=str, default='103-1240-0038.wav', help='Reference audio file')
+    parser.add_argument('--reference-text', type=str, default='', help='Transcript of the reference audio')
+    parser.add_argument('--target-text', type=str,
+                       default='Thanks for calling. Your order shipped yesterday and should arrive on Friday. '
+                               'If anything looks wrong, reply to this message and we will sort it out.',
+                       help='Utterance text; every benchmark utterance uses it')
+    parser.add_argument('--utterances', type=int, default=16, help='Utterances per worker count')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to compare')
+    parser.add_argument('--concurrency', type=int, default=4, help='Jobs in flight per worker')
+    parser.add_argument('--unit', type=str, default='utterance', choices=['utterance', 'segment'],
+                       help='Dispatch whole utterances or single segments to workers')
+    parser.add_argument('--min-words', type=int, default=10, help='Minimum words per segment')
+    parser.add_argument('--max-words', type=int, default=30, help='Maximum words per segment')
+    parser.add_argument('--chunk-overlap-duration', type=float, default=0.1, help='Chunk overlap (seconds)')
+    parser.add_argument('--model-cache', type=str, default=DEFAULT_CACHE_PATH, help='Model info cache file')
+    parser.add_argument('--timeout', type=float, default=600.0,
+                       help='Seconds to wait for the warm-up, then for the jobs, of each worker count')
+    args = parser.parse_args()
+
+    try:
+        info = ModelInfoCache(args.model_cache).get(f"{args.server_addr}:{args.server_port}", args.model_name)
+    except InferenceServerException as e:
+        logging.error(f"Could not probe {args.model_name} on {args.server_addr}:{args.server_port}: {e}")
+        return 1
+    if not info['sample_rate']:
+        parser.error(f"unknown output rate of {args.model_name}")
+    config = {
+        'server_addr': args.server_addr,
+        'server_port': args.server_port,
+        'model_name': args.model_name,
+        'target_sr': info['sample_rate'],
+        'reference_audio': args.reference_audio,
+        'reference_text': args.reference_text,
+        'use_spk2info_cache': uses_spk2info(info),
+        'min_words': args.min_words,
+        'max_words': args.max_words,
+        'chunk_overlap_duration': args.chunk_overlap_duration,
+        'concurrency': args.concurrency,
+    }
+    if not config['use_spk2info_cache']:
+        # Imported here: a bad reference should fail once, here, rather than in every worker
+        import client_grpc_simple as tts
+        try:
+            tts.load_audio(args.reference_audio, target_sample_rate=16000)
+        except (OSError, RuntimeError) as e:
+            parser.error(f"cannot read --reference-audio: {e}")
+    texts = [args.target_text] * args.utterances
+    cpus = multiprocessing.cpu_count()
+    print(f"{args.utterances} utterances per run, {args.concurrency} jobs in flight per worker, {cpus} CPUs")
+    if max(args.workers) > cpus:
+        print(f"  Note: runs with more than {cpus} workers share cores; their scaling reflects overlapped "
+              f"server waits, not CPU parallelism")
+    baseline = None
+    for workers in args.workers:
+        try:
+            result = run_benchmark(config, workers, texts, args.unit, args.timeout)
+        except RuntimeError as e:
+            logging.error(f"{workers} workers: {e}")
+            return 1
+        baseline = baseline or result['throughput'] / result['workers']
+        mean_ttfb = f"{result['mean_ttfb']:.3f}s" if result['mean_ttfb'] is not None else "n/a"
+        print(f"  {workers:2d} workers: {result['jobs']} {args.unit}s in {result['wall_time']:6.2f}s, "
+              f"{result['throughput']:6.2f} audio s/s "
+              f"(scaling efficiency {result['throughput'] / (baseline * workers):.0%}), "
+              f"mean TTFB {mean_ttfb}" + (f", {result['failed']} failed" if result['failed'] else "")
+              + (f", {result['timed_out']} timed out" if result['timed_out'] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
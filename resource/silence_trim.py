@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Streaming silence trimming between the ordered emitter and the output sink.
+
+Models tend to open the first chunk with silence and close every segment with
+more. When synthesize_with_splitting() plays segments back to back, the leading
+silence adds to perceived TTFB. The trailing silence of one segment and the
+leading silence of the next add up to a pause much longer than a sentence break.
+SilenceTrimmer works chunk by chunk:
+- silence before the first audible sample is dropped, so the first sound reaches
+  the consumer as soon as it arrives
+- a silent run across a segment boundary is capped at max_pause
+- a silent run inside a segment is capped at max_internal_pause
+- silence after the last audible sample is dropped at close
+Only the silent run currently in progress is held back, and it never exceeds
+the larger cap, so memory stays constant however long the stream is.
+
+Usage:
+# Trim in the client and report the latency removed
+python3 client_grpc_simple.py --trim-silence --silence-threshold-db -45 --max-pause 0.25
+
+# Trim recorded segments (one file per segment) offline
+python3 silence_trim.py seg0.wav seg1.wav seg2.wav --output trimmed.wav
+"""
+
+import argparse
+
+import numpy as np
+
+from audio_sinks import AudioSink
+
+
+class SilenceTrimmer:
+    """Chunk-by-chunk leading, inter-segment, internal and trailing silence trimming"""
+    def __init__(self, sample_rate: int, threshold_db: float = -45.0, max_pause: float = 0.25,
+                 max_internal_pause: float = 1.0, edge: float = 0.01):
+        self.sample_rate = sample_rate
+        self.threshold = 10 ** (threshold_db / 20)
+        self.max_pause = int(max_pause * sample_rate)
+        self.max_internal_pause = int(max_internal_pause * sample_rate)
+        # Silence kept before the first and after the last audible sample, so onsets are not clipped
+        self.edge = int(edge * sample_rate)
+        # The silent run in progress; only its first `cap` samples are ever kept
+        self._held = np.zeros(max(self.max_pause, self.max_internal_pause, self.edge), dtype=np.float32)
+        self._held_size = 0
+        self._run_length = 0
+        self._leading = True
+        self._crossed_boundary = False
+        self.trimmed = {'leading': 0, 'boundary': 0, 'internal': 0, 'trailing': 0}
+        self.samples_in = 0
+        self.samples_out = 0
+
+    def _hold(self, silence: np.ndarray):
+        if self._leading:
+            # Before the first sound only the last `edge` samples can ever be emitted
+            if len(silence) >= self.edge:
+                tail = silence[len(silence) - self.edge:]
+            else:
+                tail = np.concatenate([self._held[:self._held_size], silence])[-self.edge:]
+            self.trimmed['leading'] += self._held_size + len(silence) - len(tail)
+            self._held[:len(tail)] = tail
+            self._held_size = self._run_length = len(tail)
+            return
+        keep = min(len(silence), len(self._held) - self._held_size)
+        self._held[self._held_size:self._held_size + keep] = silence[:keep]
+        self._held_size += keep
+        self._run_length += len(silence)
+
+    def _release_run(self) -> np.ndarray:
+        """The held silent run, capped by where it sits, when audio follows it"""
+        if self._leading:
+            kept, kind = self._held_size, 'leading'
+            released = self._held[:kept]
+        else:
+            if self._crossed_boundary:
+                cap, kind = self.max_pause, 'boundary'
+            else:
+                cap, kind = self.max_internal_pause, 'internal'
+            kept = min(self._run_length, cap)
+            released = self._held[:kept]
+        self.trimmed[kind] += self._run_length - kept
+        self._held_size = 0
+        self._run_length = 0
+        self._crossed_boundary = False
+        self._leading = False
+        return released.copy()
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Trim one chunk; returns the samples that can be emitted now"""
+        self.samples_in += len(samples)
+        loud = np.flatnonzero(np.abs(samples) > self.threshold)
+        if not len(loud):
+            self._hold(samples)
+            return samples[:0]
+
+        parts = []
+        self._hold(samples[:loud[0]])
+        parts.append(self._release_run())
+        # Pauses wholly inside this chunk longer than the internal cap
+        start = loud[0]
+        for gap in np.flatnonzero(np.diff(loud) > self.max_internal_pause + 1):
+            cut_from = loud[gap] + 1 + self.max_internal_pause
+            parts.append(samples[start:cut_from])
+            self.trimmed['internal'] += loud[gap + 1] - cut_from
+            start = loud[gap + 1]
+        parts.append(samples[start:loud[-1] + 1])
+        self._hold(samples[loud[-1] + 1:])
+        out = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        self.samples_out += len(out)
+        return out
+
+    def end_segment(self):
+        """The silent run in progress now spans a segment boundary"""
+        if not self._leading:
+            self._crossed_boundary = True
+
+    def flush(self) -> np.ndarray:
+        """End of stream: keep `edge` samples of trailing silence"""
+        kept = 0 if self._leading else min(self._run_length, self.edge)
+        self.trimmed['leading' if self._leading else 'trailing'] += self._run_length - kept
+        out = self._held[:kept].copy()
+        self._held_size = 0
+        self._run_length = 0
+        self.samples_out += len(out)
+        return out
+
+    def stats(self) -> dict:
+        """Milliseconds removed per kind; 'leading' is how much sooner the first sound is heard"""
+        to_ms = 1000.0 / self.sample_rate
+        stats = {f'{kind}_ms': samples * to_ms for kind, samples in self.trimmed.items()}
+        stats['total_ms'] = sum(self.trimmed.values()) * to_ms
+        stats['input_duration'] = self.samples_in / self.sample_rate
+        stats['output_duration'] = self.samples_out / self.sample_rate
+        return stats
+
+
+class SilenceTrimSink(AudioSink):
+    """Trims silence from the audio written to it before passing it to another sink"""
+    def __init__(self, sink: AudioSink, trimmer: SilenceTrimmer = None):
+        super().__init__(sink.sample_rate)
+        self.sink = sink
+        self.format_name = sink.format_name
+        self.trimmer = trimmer or SilenceTrimmer(sink.sample_rate)
+
+    def _write(self, samples: np.ndarray):
+        self.sink.write(self.trimmer.process(samples))
+
+    def end_segment(self):
+        self.trimmer.end_segment()
+        self.sink.end_segment()
+
+    def close(self):
+        self.sink.write(self.trimmer.flush())
+        self.sink.close()
+        self.samples_written = self.sink.samples_written
+        self.bytes_written = self.sink.bytes_written
+        self.first_byte_time = self.sink.first_byte_time
+
+
+def main():
+    import soundfile as sf
+
+    parser = argparse.ArgumentParser(
+        description='Trim silence from segment recordings as the streaming client would',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('segments', type=str, nargs='+', help='Audio files, one per segment, in order')
+    parser.add_argument('--output', type=str, default=None, help='Write the trimmed, joined audio here')
+    parser.add_argument('--chunk-ms', type=int, default=500, help='Chunk size to stream the files in')
+    parser.add_argument('--silence-threshold-db', type=float, default=-45.0,
+                       help='Peak level (dBFS) below which a sample counts as silence')
+    parser.add_argument('--max-pause', type=float, default=0.25, help='Longest pause between segments (seconds)')
+    parser.add_argument('--max-internal-pause', type=float, default=1.0,
+                       help='Longest pause inside a segment (seconds)')
+    args = parser.parse_args()
+
+    trimmer = None
+    output = []
+    for path in args.segments:
+        audio, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+        if trimmer is None:
+            trimmer = SilenceTrimmer(sample_rate, args.silence_threshold_db, args.max_pause, args.max_internal_pause)
+        elif sample_rate != trimmer.sample_rate:
+            parser.error(f"{path} is {sample_rate} Hz, the first segment {trimmer.sample_rate} Hz")
+        chunk = max(sample_rate * args.chunk_ms // 1000, 1)
+        for start in range(0, len(audio), chunk):
+            output.append(trimmer.process(audio[start:start + chunk, 0]))
+        trimmer.end_segment()
+    output.append(trimmer.flush())
+
+    stats = trimmer.stats()
+    print(f"{len(args.segments)} segments: {stats['input_duration']:.2f}s -> {stats['output_duration']:.2f}s")
+    print(f"  first sound {stats['leading_ms']:.0f} ms sooner; removed {stats['boundary_ms']:.0f} ms between "
+          f"segments, {stats['internal_ms']:.0f} ms inside, {stats['trailing_ms']:.0f} ms at the end")
+    if args.output:
+        sf.write(args.output, np.concatenate(output), trimmer.sample_rate)
+        print(f"Written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+"""
+Record and replay Triton stream traces for reproducible client performance tests.
+
+TraceRecorder captures every stream opened by run_sync_streaming_inference(): the
+request metadata, then each response with its arrival time (taken in the gRPC
+callback, before any client-side queueing) and its serialized ModelInferResponse,
+which carries the audio payload. All of this goes into one compact binary file.
+ReplayClientPool hands out stand-ins for InferenceServerClient. They answer each
+request with the recorded stream for the same model and text, using the original
+timing or a scaled copy of it. Reconstruction, scheduling and playout changes can
+then be compared offline on real traffic shapes from the production tunnel.
+
+File layout: the 8-byte magic b'TTSTRC01', then records. Each record is a
+little-endian header (kind u8, stream u32, seconds since the trace started f64,
+payload length u32) followed by the payload.
+
+Usage:
+# Record against the server, then replay the same traffic locally at half speed
+python3 client_grpc_simple.py --record-trace tunnel.trace
+python3 client_grpc_simple.py --replay-trace tunnel.trace --replay-time-scale 2.0
+
+# Summarize a trace
+python3 stream_trace.py tunnel.trace
+"""
+
+import argparse
+import json
+import logging
+import struct
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+import tritonclient.grpc as grpcclient_sync
+from tritonclient.grpc import service_pb2
+from tritonclient.utils import InferenceServerException, deserialize_bytes_tensor
+
+TRACE_MAGIC = b'TTSTRC01'
+RECORD_HEADER = struct.Struct('<BIdI')
+REQUEST, RESPONSE, ERROR, END = 1, 2, 3, 4
+
+
+def request_text(inputs: list) -> str:
+    """The target_text of a request built by prepare_request_input_output(), '' if absent"""
+    for infer_input in inputs:
+        if infer_input.name() == 'target_text':
+            content = infer_input._get_content()
+            if content:
+                return deserialize_bytes_tensor(content).reshape(-1)[0].decode('utf-8')
+    return ''
+
+
+class TraceRecorder:
+    """Thread-safe writer of stream records; one instance is shared by all segments of a run"""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(TRACE_MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._streams = 0
+        self.bytes_written = len(TRACE_MAGIC)
+
+    def _write(self, kind: int, stream: int, timestamp: float, payload: bytes = b''):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(RECORD_HEADER.pack(kind, stream, timestamp - self._start, len(payload)))
+            self._file.write(payload)
+            self.bytes_written += RECORD_HEADER.size + len(payload)
+
+    def begin(self, model_name: str, request_id: str, segment_id: int, inputs: list, sent: float) -> int:
+        """Record a request; returns the stream number for its responses"""
+        with self._lock:
+            stream = self._streams
+            self._streams += 1
+        metadata = {
+            'model_name': model_name,
+            'request_id': request_id,
+            'segment_id': segment_id,
+            'target_text': request_text(inputs),
+            'inputs': [
+                {'name': i.name(), 'datatype': i.datatype(), 'shape': list(i.shape()),
+                 'bytes': len(i._get_content() or b'')}
+                for i in inputs
+            ],
+        }
+        self._write(REQUEST, stream, sent, json.dumps(metadata).encode('utf-8'))
+        return stream
+
+    def response(self, stream: int, arrival: float, response):
+        self._write(RESPONSE, stream, arrival, response.SerializeToString())
+
+    def error(self, stream: int, arrival: float, message: str):
+        self._write(ERROR, stream, arrival, message.encode('utf-8'))
+
+    def end(self, stream: int, reason: str):
+        """Mark how the client left the stream: final, cancelled, dropped, timeout or error"""
+        self._write(END, stream, time.time(), reason.encode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_trace(path: str) -> List[dict]:
+    """
+    Read a trace file.
+
+    Returns:
+        One dict per stream in request order: 'metadata', 'sent' (seconds into the
+        trace), 'events' as (seconds after the request, kind, payload) and 'end' reason
+    """
+    streams: Dict[int, dict] = {}
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a stream trace")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            kind, stream, timestamp, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if kind == REQUEST:
+                streams[stream] = {'metadata': json.loads(payload), 'sent': timestamp, 'events': [], 'end': None}
+            elif kind == END:
+                streams[stream]['end'] = payload.decode('utf-8')
+            else:
+                streams[stream]['events'].append((timestamp - streams[stream]['sent'], kind, payload))
+    return [streams[stream] for stream in sorted(streams)]
+
+
+class ReplayClientPool:
+    """
+    Drop-in for TritonClientPool whose clients replay recorded streams.
+
+    A request gets the first unused stream recorded for the same model and text; if
+    none is left, the first unused stream for the model is used. time_scale
+    stretches the recorded timing, so 0.5 replays twice as fast.
+    """
+    def __init__(self, streams: List[dict], time_scale: float = 1.0):
+        self.time_scale = time_scale
+        self._unused = list(streams)
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.unmatched = 0
+
+    def take(self, model_name: str, text: str) -> dict:
+        with self._lock:
+            candidates = [s for s in self._unused if s['metadata']['model_name'] == model_name]
+            stream = next((s for s in candidates if s['metadata']['target_text'] == text), None)
+            if stream is None and candidates:
+                stream = candidates[0]
+                logging.warning(f"No recorded stream for {model_name} text {text[:40]!r}, "
+                                f"replaying {stream['metadata']['target_text'][:40]!r}")
+            if stream is None:
+                self.unmatched += 1
+                return None
+            self._unused.remove(stream)
+            self.replayed += 1
+            return stream
+
+    def acquire(self) -> 'ReplayClient':
+        return ReplayClient(self)
+
+    def release(self, client: 'ReplayClient'):
+        client.close()
+
+    def discard(self, client: 'ReplayClient'):
+        client.close()
+
+    def prewarm(self, count: int):
+        pass
+
+    def close(self):
+        pass
+
+
+class ReplayClient:
+    """The subset of InferenceServerClient's streaming API that the TTS client uses"""
+    def __init__(self, pool: ReplayClientPool):
+        self._pool = pool
+        self._callback = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def is_server_live(self) -> bool:
+        return True
+
+    def start_stream(self, callback, **kwargs):
+        self._callback = callback
+        self._stop.clear()
+
+    def async_stream_infer(self, model_name: str, inputs: list, request_id: str = '', outputs=None, **kwargs):
+        stream = self._pool.take(model_name, request_text(inputs))
+        if stream is None:
+            self._callback(None, InferenceServerException(f"trace has no stream left for {model_name}"))
+            return
+        self._thread = threading.Thread(target=self._replay, args=(stream,), name='trace-replay', daemon=True)
+        self._thread.start()
+
+    def _replay(self, stream: dict):
+        start = time.time()
+        for offset, kind, payload in stream['events']:
+            if self._stop.wait(max(start + offset * self._pool.time_scale - time.time(), 0.0)):
+                return
+            if kind == RESPONSE:
+                self._callback(grpcclient_sync.InferResult(service_pb2.ModelInferResponse.FromString(payload)), None)
+            else:
+                self._callback(None, InferenceServerException(payload.decode('utf-8')))
+        if stream['end'] != 'final' and not any(kind == ERROR for _, kind, _ in stream['events']):
+            # The recording stopped early; fail the stream instead of leaving the client waiting
+            self._callback(None, InferenceServerException(f"recorded stream ended: {stream['end']}"))
+
+    def stop_stream(self, cancel_requests: bool = False):
+        if cancel_requests:
+            self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self._stop.set()
+        self.stop_stream()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Summarize a recorded stream trace',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('trace', type=str, help='Trace file from --record-trace')
+    args = parser.parse_args()
+
+    streams = load_trace(args.trace)
+    print(f"{args.trace}: {len(streams)} streams")
+    for stream in streams:
+        metadata = stream['metadata']
+        responses = [(offset, payload) for offset, kind, payload in stream['events'] if kind == RESPONSE]
+        arrivals = np.array([offset for offset, _ in responses])
+        gaps = np.diff(arrivals) if len(arrivals) > 1 else np.zeros(1)
+        ttfb = f"{arrivals[0]:.3f}s" if len(arrivals) else "n/a"
+        print(f"  +{stream['sent']:7.3f}s segment {metadata['segment_id']} {metadata['model_name']}: "
+              f"{len(responses)} responses, {sum(len(p) for _, p in responses) / 1024:.1f} KiB, "
+              f"TTFB {ttfb}, "
+              f"max gap {gaps.max():.3f}s, end {stream['end']} - {metadata['target_text'][:40]!r}")
+
+
+if __name__ == "__main__":
+    main()
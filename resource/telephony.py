@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""
+Telephony output path: streaming resampling to 8 kHz and G.711 (mu-law/A-law) framing.
+
+Server chunks arrive at the model rate (24 kHz for cosyvoice2, 16 kHz for spark_tts).
+StreamingResampler converts them with a cached polyphase windowed-sinc filter bank,
+carrying filter history across chunk boundaries so chunked output is identical to
+resampling the whole signal. G711FrameEncoder quantizes with TPDF dither, encodes via
+a 64K-entry lookup table and emits fixed 20 ms frames (160 bytes) ready for RTP.
+
+Usage:
+# Per-frame CPU cost of resampling + encoding
+python3 telephony.py --bench --input-rate 24000 --law ulaw
+"""
+
+import argparse
+import struct
+import sys
+import time
+from functools import lru_cache
+from math import gcd
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from audio_sinks import AudioSink, float_to_int16
+
+TELEPHONY_SAMPLE_RATE = 8000
+FRAME_DURATION_MS = 20
+# Encoded value of digital silence, used to pad the final frame
+SILENCE_BYTE = {'ulaw': 0xFF, 'alaw': 0xD5}
+# WAVE format tags for G.711 data
+WAVE_FORMAT_TAG = {'ulaw': 7, 'alaw': 6}
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter_bank(up: int, down: int, zero_crossings: int = 10, beta: float = 6.0) -> np.ndarray:
+    """
+    Design a Kaiser-windowed sinc low-pass for rational resampling, split into phases.
+
+    Returns:
+        Array of shape (up, taps_per_phase); row p holds taps h[p + k*up], reversed so a
+        window of ascending input samples can be dotted with it directly
+    """
+    ratio = max(up, down)
+    num_taps = 2 * zero_crossings * ratio + 1
+    cutoff = 0.95 / ratio
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(num_taps, beta) * up
+    taps_per_phase = -(-num_taps // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:num_taps] = taps
+    bank = padded.reshape(taps_per_phase, up).T
+    return np.ascontiguousarray(bank[:, ::-1], dtype=np.float32)
+
+
+class StreamingResampler:
+    """Rational-ratio polyphase resampler that carries filter state across chunks"""
+    def __init__(self, input_rate: int, output_rate: int = TELEPHONY_SAMPLE_RATE):
+        divisor = gcd(input_rate, output_rate)
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self._bank = polyphase_filter_bank(self.up, self.down)
+        self._taps_per_phase = self._bank.shape[1]
+        self._history = np.zeros(self._taps_per_phase - 1, dtype=np.float32)
+        # Position of the next output in upsampled units, relative to the first new input sample
+        self._next_position = 0
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Resample one chunk; returns every output sample whose inputs are now available"""
+        if self.up == self.down:
+            return np.asarray(chunk, dtype=np.float32)
+        if len(chunk) == 0:
+            return np.empty(0, dtype=np.float32)
+        history_len = len(self._history)
+        signal = np.concatenate([self._history, np.asarray(chunk, dtype=np.float32)])
+        available = len(chunk) * self.up
+        if self._next_position >= available:
+            count = 0
+        else:
+            count = (available - 1 - self._next_position) // self.down + 1
+
+        positions = self._next_position + self.down * np.arange(count)
+        inputs, phases = np.divmod(positions, self.up)
+        windows = np.lib.stride_tricks.sliding_window_view(signal, self._taps_per_phase)
+        # The window starting at signal[j] ends at input j (history_len samples are prepended)
+        output = np.einsum('ij,ij->i', windows[inputs], self._bank[phases])
+
+        self._next_position += count * self.down - available
+        self._history = signal[len(signal) - history_len:].copy()
+        return output.astype(np.float32, copy=False)
+
+    def flush(self) -> np.ndarray:
+        """Feed zeros through the filter so the output covers the last input samples"""
+        if self.up == self.down:
+            return np.empty(0, dtype=np.float32)
+        return self.process(np.zeros(self._taps_per_phase // 2 + 1, dtype=np.float32))
+
+
+@lru_cache(maxsize=2)
+def g711_table(law: str) -> np.ndarray:
+    """Lookup table mapping every int16 value (offset by 32768) to its G.711 byte"""
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+    if law == 'ulaw':
+        # ITU-T G.711 works on 14-bit magnitudes with a bias of 33
+        pcm14 = pcm >> 2
+        mask = np.where(pcm14 < 0, 0x7F, 0xFF)
+        magnitude = np.minimum(np.abs(pcm14), 8159) + 0x21
+        exponent = np.clip(np.floor(np.log2(magnitude >> 5)).astype(np.int32), 0, 7)
+        mantissa = (magnitude >> (exponent + 1)) & 0x0F
+        encoded = np.where(magnitude > 0x1FFF, 0x7F, (exponent << 4) | mantissa) ^ mask
+    elif law == 'alaw':
+        sign = np.where(pcm >= 0, 0x80, 0)
+        magnitude = np.minimum(np.where(pcm >= 0, pcm, -pcm - 1), 32635)
+        large = magnitude >= 256
+        exponent = np.clip(np.floor(np.log2(np.maximum(magnitude >> 8, 1))).astype(np.int32) + 1, 1, 7)
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        encoded = np.where(large, (exponent << 4) | mantissa, magnitude >> 4)
+        encoded = encoded ^ (sign ^ 0x55)
+    else:
+        raise ValueError(f"Unknown G.711 law: {law}")
+    return encoded.astype(np.uint8)
+
+
+def encode_g711(samples: np.ndarray, law: str) -> np.ndarray:
+    """Encode int16 samples to G.711 bytes with a single table lookup"""
+    return g711_table(law)[samples.astype(np.int32) + 32768]
+
+
+class G711FrameEncoder:
+    """Encodes 8 kHz float audio into fixed-size G.711 frames, carrying partial frames over"""
+    def __init__(self, law: str = 'ulaw', frame_ms: int = FRAME_DURATION_MS, dither: bool = True):
+        self.law = law
+        self.frame_bytes = TELEPHONY_SAMPLE_RATE * frame_ms // 1000
+        self._dither = dither
+        self._rng = np.random.default_rng()
+        self._pending = np.empty(0, dtype=np.uint8)
+
+    def encode(self, samples: np.ndarray) -> List[bytes]:
+        """Encode samples and return every complete frame"""
+        encoded = encode_g711(float_to_int16(samples, self._dither, self._rng), self.law)
+        if len(self._pending):
+            encoded = np.concatenate([self._pending, encoded])
+        complete = len(encoded) - len(encoded) % self.frame_bytes
+        self._pending = encoded[complete:]
+        return [encoded[i:i + self.frame_bytes].tobytes() for i in range(0, complete, self.frame_bytes)]
+
+    def flush(self) -> List[bytes]:
+        """Pad the partial frame with silence and return it"""
+        if not len(self._pending):
+            return []
+        frame = np.full(self.frame_bytes, SILENCE_BYTE[self.law], dtype=np.uint8)
+        frame[:len(self._pending)] = self._pending
+        self._pending = np.empty(0, dtype=np.uint8)
+        return [frame.tobytes()]
+
+
+class TelephonySink(AudioSink):
+    """
+    Sink producing 8 kHz G.711 in 20 ms frames as model-rate chunks arrive.
+
+    Frames go to `on_frame` (e.g. an RTP packetizer) and to a G.711 WAV file, or to
+    stdout as headerless frames when the path is '-'.
+    """
+    def __init__(self, path: str, sample_rate: int, law: str = 'ulaw', dither: bool = True,
+                 on_frame: Callable[[bytes], None] = None):
+        super().__init__(sample_rate)
+        self.format_name = law
+        self.frames_written = 0
+        self._law = law
+        self._resampler = StreamingResampler(sample_rate, TELEPHONY_SAMPLE_RATE)
+        self._encoder = G711FrameEncoder(law, dither=dither)
+        self._on_frame = on_frame
+        self._to_stdout = path == '-'
+        self._file = sys.stdout.buffer if self._to_stdout else open(path, 'wb')
+        if not self._to_stdout:
+            self._file.write(self._header(0))
+
+    def _header(self, data_bytes: int) -> bytes:
+        """G.711 WAVE header: 18-byte fmt chunk and a fact chunk, as required for non-PCM data"""
+        return (b'RIFF' + struct.pack('<I', 50 + data_bytes) + b'WAVE'
+                + b'fmt ' + struct.pack('<IHHIIHHH', 18, WAVE_FORMAT_TAG[self._law], 1,
+                                        TELEPHONY_SAMPLE_RATE, TELEPHONY_SAMPLE_RATE, 1, 8, 0)
+                + b'fact' + struct.pack('<II', 4, data_bytes)
+                + b'data' + struct.pack('<I', data_bytes))
+
+    def _emit(self, frames: List[bytes]):
+        for frame in frames:
+            if self._on_frame:
+                self._on_frame(frame)
+            self._file.write(frame)
+            self.bytes_written += len(frame)
+        self.frames_written += len(frames)
+        if self._to_stdout and frames:
+            self._file.flush()
+
+    def _write(self, samples: np.ndarray):
+        self._emit(self._encoder.encode(self._resampler.process(samples)))
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._emit(self._encoder.flush())
+        if self._to_stdout:
+            self._file.flush()
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.bytes_written))
+        self._file.close()
+        self.bytes_written += 58
+
+
+def benchmark(input_rate: int, law: str, chunk_duration: float, seconds: float = 30.0) -> Tuple[float, int]:
+    """Stream a test signal through resampler + encoder; returns (microseconds per frame, frames)"""
+    t = np.arange(int(seconds * input_rate)) / input_rate
+    signal = (0.3 * np.sin(2 * np.pi * 440 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t)))
+    signal = signal.astype(np.float32)
+    chunk_samples = max(int(chunk_duration * input_rate), 1)
+    resampler = StreamingResampler(input_rate)
+    encoder = G711FrameEncoder(law)
+    frames = 0
+    start_time = time.perf_counter()
+    for offset in range(0, len(signal), chunk_samples):
+        frames += len(encoder.encode(resampler.process(signal[offset:offset + chunk_samples])))
+    frames += len(encoder.flush())
+    elapsed = time.perf_counter() - start_time
+    return elapsed / frames * 1e6, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the 8 kHz G.711 telephony output stage',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--bench', action='store_true', help='Measure per-frame CPU cost')
+    parser.add_argument('--input-rate', type=int, default=24000, help='Model output sample rate')
+    parser.add_argument('--law', type=str, default='ulaw', choices=['ulaw', 'alaw'], help='G.711 variant')
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    # Warm the cached filter bank and lookup table so they are not billed to the first frame
+    StreamingResampler(args.input_rate)
+    g711_table(args.law)
+    for chunk_duration in (0.02, 0.1, 0.5):
+        per_frame, frames = benchmark(args.input_rate, args.law, chunk_duration)
+        print(f"{args.input_rate} Hz -> 8 kHz {args.law}, {chunk_duration * 1000:.0f} ms input chunks: "
+              f"{per_frame:.1f} us per 20 ms frame ({frames} frames, "
+              f"{per_frame / (FRAME_DURATION_MS * 1000) * 100:.3f}% of real time)")
+
+
+if __name__ == "__main__":
+    main()
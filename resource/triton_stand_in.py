@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+
+"""
+Local Triton stand-in for offline testing of the streaming TTS clients.
+
+Speaks the real Triton gRPC protocol (ServerLive/ModelReady/ModelMetadata/
+ModelConfig/ModelStatistics/ModelStreamInfer) and answers every decoupled
+request with a synthetic tone whose length follows the target text. Voice
+conversion models (--vc-models) answer every source_wav chunk of a sequence
+with a converted copy of it, each chunk on its own thread so responses can
+overtake each other. TTFB, real-time factor, chunk size, jitter and GPU slot
+count are configurable, so clients, tuners and gateways can be exercised
+without a GPU server.
+
+Usage:
+# Serve cosyvoice2/spark_tts/f5_tts on localhost:8001
+python3 triton_stand_in.py --port 8001 --ttfb 0.25 --rtf 0.3 --gpu-slots 2
+
+# Add a streaming voice conversion model answering 80 ms after each chunk
+python3 triton_stand_in.py --vc-models seed_vc:22050 --model-ttfb seed_vc=0.08
+"""
+
+import argparse
+import logging
+import queue
+import random
+import struct
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List
+
+import grpc
+import numpy as np
+from tritonclient.grpc import model_config_pb2, service_pb2, service_pb2_grpc
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s %(message)s'
+)
+
+DEFAULT_MODELS = {'cosyvoice2': 24000, 'spark_tts': 16000, 'f5_tts': 24000}
+
+
+def _deserialize_bytes(raw: bytes) -> List[bytes]:
+    """Decode a Triton BYTES tensor (4-byte little-endian length prefixes)"""
+    items = []
+    offset = 0
+    while offset + 4 <= len(raw):
+        (length,) = struct.unpack_from('<I', raw, offset)
+        offset += 4
+        items.append(raw[offset:offset + length])
+        offset += length
+    return items
+
+
+class _ModelStats:
+    """Cumulative per-model durations in the shape of Triton's InferStatistics"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.success = [0, 0]
+        self.fail = [0, 0]
+        self.queue = [0, 0]
+        self.compute_input = [0, 0]
+        self.compute_infer = [0, 0]
+        self.compute_output = [0, 0]
+        self.inference_count = 0
+        self.execution_count = 0
+        self.last_inference = 0
+
+    def add(self, name: str, ns: int):
+        with self.lock:
+            entry = getattr(self, name)
+            entry[0] += 1
+            entry[1] += int(ns)
+
+
+class StandInServicer(service_pb2_grpc.GRPCInferenceServiceServicer):
+    """Triton-compatible servicer producing synthetic streamed audio"""
+    def __init__(
+        self,
+        models: Dict[str, int],
+        ttfb: float = 0.25,
+        rtf: float = 0.3,
+        chunk_duration: float = 0.5,
+        jitter: float = 0.05,
+        seconds_per_word: float = 0.35,
+        gpu_slots: int = 4,
+        model_ttfb: Dict[str, float] = None,
+        reference_dtype: str = 'FP32',
+        prompt_cost: float = 0.0,
+        silence_padding: float = 0.0,
+        vc_models: Dict[str, int] = None,
+    ):
+        # Voice conversion models are served alongside the TTS models
+        self.vc_models = set(vc_models or {})
+        self.models = dict(models, **(vc_models or {}))
+        # Datatype declared for reference_wav; requests sending another one are rejected, as Triton does
+        self.reference_dtype = reference_dtype
+        self.ttfb = ttfb
+        # Per-model TTFB overrides, to give models different speed profiles
+        self.model_ttfb = model_ttfb or {}
+        # TTFB added per second of reference_wav, as prompt encoding grows with the reference
+        self.prompt_cost = prompt_cost
+        # Seconds of silence around each request's audio, as models emit at segment edges
+        self.silence_padding = silence_padding
+        self.rtf = rtf
+        self.chunk_duration = chunk_duration
+        self.jitter = jitter
+        self.seconds_per_word = seconds_per_word
+        self._slots = threading.BoundedSemaphore(gpu_slots)
+        self.stats = {name: _ModelStats() for name in self.models}
+
+    # Health and metadata ------------------------------------------------
+
+    def ServerLive(self, request, context):
+        return service_pb2.ServerLiveResponse(live=True)
+
+    def ServerReady(self, request, context):
+        return service_pb2.ServerReadyResponse(ready=True)
+
+    def ModelReady(self, request, context):
+        return service_pb2.ModelReadyResponse(ready=request.name in self.models)
+
+    def ModelMetadata(self, request, context):
+        if request.name not in self.models:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Request for unknown model: '{request.name}'")
+        tensor = service_pb2.ModelMetadataResponse.TensorMetadata
+        if request.name in self.vc_models:
+            return service_pb2.ModelMetadataResponse(
+                name=request.name,
+                versions=['1'],
+                platform='python',
+                inputs=[
+                    tensor(name='source_wav', datatype='FP32', shape=[1, -1]),
+                    tensor(name='source_wav_len', datatype='INT32', shape=[1, 1]),
+                    tensor(name='reference_wav', datatype=self.reference_dtype, shape=[1, -1]),
+                    tensor(name='reference_wav_len', datatype='INT32', shape=[1, 1]),
+                    tensor(name='preset_voice', datatype='BYTES', shape=[1, 1]),
+                ],
+                outputs=[tensor(name='waveform', datatype='FP32', shape=[-1])],
+            )
+        return service_pb2.ModelMetadataResponse(
+            name=request.name,
+            versions=['1'],
+            platform='python',
+            inputs=[
+                tensor(name='reference_wav', datatype=self.reference_dtype, shape=[1, -1]),
+                tensor(name='reference_wav_len', datatype='INT32', shape=[1, 1]),
+                tensor(name='reference_text', datatype='BYTES', shape=[1, 1]),
+                tensor(name='target_text', datatype='BYTES', shape=[1, 1]),
+            ],
+            outputs=[tensor(name='waveform', datatype='FP32', shape=[-1])],
+        )
+
+    def ModelConfig(self, request, context):
+        if request.name not in self.models:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Request for unknown model: '{request.name}'")
+        config = model_config_pb2.ModelConfig(
+            name=request.name,
+            backend='python',
+            max_batch_size=0,
+            model_transaction_policy=model_config_pb2.ModelTransactionPolicy(decoupled=True),
+        )
+        config.parameters['sample_rate'].string_value = str(self.models[request.name])
+        if request.name in self.vc_models:
+            # Chunks of one recording form a sequence; the voice is sent with its first chunk only
+            config.sequence_batching.SetInParent()
+            for name in ('source_wav', 'source_wav_len', 'reference_wav', 'reference_wav_len', 'preset_voice'):
+                config.input.add(name=name, optional=name not in ('source_wav', 'source_wav_len'))
+        return service_pb2.ModelConfigResponse(config=config)
+
+    def ModelStatistics(self, request, context):
+        names = [request.name] if request.name else list(self.models)
+        response = service_pb2.ModelStatisticsResponse()
+        for name in names:
+            if name not in self.stats:
+                continue
+            stats = self.stats[name]
+            with stats.lock:
+                entry = response.model_stats.add(
+                    name=name,
+                    version='1',
+                    last_inference=stats.last_inference,
+                    inference_count=stats.inference_count,
+                    execution_count=stats.execution_count,
+                )
+                for field in ('success', 'fail', 'queue', 'compute_input',
+                              'compute_infer', 'compute_output'):
+                    count, ns = getattr(stats, field)
+                    duration = getattr(entry.inference_stats, field)
+                    duration.count = count
+                    duration.ns = ns
+        return response
+
+    # Streaming inference -------------------------------------------------
+
+    def ModelStreamInfer(self, request_iterator, context):
+        responses = queue.Queue()
+        pending = []
+
+        def reader():
+            for request in request_iterator:
+                worker = threading.Thread(
+                    target=self._serve_request, args=(request, responses, context), daemon=True
+                )
+                pending.append(worker)
+                worker.start()
+            for worker in pending:
+                worker.join()
+            responses.put(None)
+
+        threading.Thread(target=reader, daemon=True).start()
+        while True:
+            item = responses.get()
+            if item is None:
+                return
+            yield item
+
+    def _serve_request(self, request, responses: queue.Queue, context):
+        if request.model_name not in self.models:
+            responses.put(service_pb2.ModelStreamInferResponse(
+                error_message=f"Request for unknown model: '{request.model_name}' is not found"
+            ))
+            return
+        stats = self.stats[request.model_name]
+        sample_rate = self.models[request.model_name]
+        received = time.time_ns()
+        if request.model_name in self.vc_models:
+            self._serve_conversion(request, responses, stats, sample_rate, received)
+            return
+
+        target_text = ''
+        reference_seconds = 0.0
+        for index, tensor in enumerate(request.inputs):
+            if tensor.name == 'reference_wav' and tensor.datatype != self.reference_dtype:
+                responses.put(service_pb2.ModelStreamInferResponse(
+                    error_message=f"inference input 'reference_wav' data-type is '{tensor.datatype}', "
+                                  f"but model '{request.model_name}' expects '{self.reference_dtype}'"
+                ))
+                return
+            if tensor.name == 'target_text' and index < len(request.raw_input_contents):
+                items = _deserialize_bytes(request.raw_input_contents[index])
+                target_text = items[0].decode('utf-8') if items else ''
+            if tensor.name == 'reference_wav_len' and index < len(request.raw_input_contents):
+                reference_seconds = int(np.frombuffer(request.raw_input_contents[index], dtype=np.int32)[0]) / 16000
+
+        with self._slots:
+            queued = time.time_ns()
+            stats.add('queue', queued - received)
+            stats.add('compute_input', 0)
+            infer_start = time.time_ns()
+
+            total_seconds = max(len(target_text.split()), 1) * self.seconds_per_word
+            total_samples = int(total_seconds * sample_rate)
+            silent_samples = int(self.silence_padding * sample_rate)
+            total_samples += 2 * silent_samples
+            chunk_samples = max(int(self.chunk_duration * sample_rate), 1)
+            phase = 2 * np.pi * 220.0 / sample_rate
+            produced = 0
+            first = True
+            while produced < total_samples and context.is_active():
+                count = min(chunk_samples, total_samples - produced)
+                ttfb = self.model_ttfb.get(request.model_name, self.ttfb)
+                delay = (ttfb + reference_seconds * self.prompt_cost if first else count / sample_rate * self.rtf)
+                delay += random.uniform(0, self.jitter)
+                time.sleep(delay)
+                first = False
+                positions = np.arange(produced, produced + count)
+                samples = (0.1 * np.sin(phase * positions)).astype(np.float32)
+                samples[(positions < silent_samples) | (positions >= total_samples - silent_samples)] = 0.0
+                produced += count
+                responses.put(self._audio_response(request, samples))
+
+            infer_ns = time.time_ns() - infer_start
+            stats.add('compute_infer', infer_ns)
+            stats.add('compute_output', 0)
+            stats.add('success', time.time_ns() - received)
+            with stats.lock:
+                stats.inference_count += 1
+                stats.execution_count += 1
+                stats.last_inference = int(time.time() * 1000)
+
+        final = service_pb2.ModelInferResponse(model_name=request.model_name, id=request.id)
+        final.parameters['triton_final_response'].bool_param = True
+        responses.put(service_pb2.ModelStreamInferResponse(infer_response=final))
+
+    def _serve_conversion(self, request, responses: queue.Queue, stats: '_ModelStats', sample_rate: int,
+                          received: int):
+        """Convert one source_wav chunk: resampled from 16 kHz and attenuated, after TTFB + RTF delay"""
+        source = np.zeros(0, dtype=np.float32)
+        for index, tensor in enumerate(request.inputs):
+            if tensor.name == 'source_wav' and index < len(request.raw_input_contents):
+                source = np.frombuffer(request.raw_input_contents[index], dtype=np.float32)
+        with self._slots:
+            stats.add('queue', time.time_ns() - received)
+            infer_start = time.time_ns()
+            ttfb = self.model_ttfb.get(request.model_name, self.ttfb)
+            time.sleep(ttfb + len(source) / 16000 * self.rtf + random.uniform(0, self.jitter))
+            positions = np.arange(int(len(source) * sample_rate / 16000)) * 16000 / sample_rate
+            converted = (0.8 * np.interp(positions, np.arange(len(source)), source)).astype(np.float32)
+            responses.put(self._audio_response(request, converted))
+            stats.add('compute_infer', time.time_ns() - infer_start)
+            stats.add('success', time.time_ns() - received)
+            with stats.lock:
+                stats.inference_count += 1
+                stats.execution_count += 1
+                stats.last_inference = int(time.time() * 1000)
+        final = service_pb2.ModelInferResponse(model_name=request.model_name, id=request.id)
+        final.parameters['triton_final_response'].bool_param = True
+        responses.put(service_pb2.ModelStreamInferResponse(infer_response=final))
+
+    @staticmethod
+    def _audio_response(request, samples: np.ndarray) -> service_pb2.ModelStreamInferResponse:
+        response = service_pb2.ModelInferResponse(model_name=request.model_name, id=request.id)
+        response.parameters['triton_final_response'].bool_param = False
+        output = response.outputs.add(name='waveform', datatype='FP32')
+        output.shape.append(len(samples))
+        response.raw_output_contents.append(samples.tobytes())
+        return service_pb2.ModelStreamInferResponse(infer_response=response)
+
+
+class StandInServer:
+    """In-process stand-in server, usable from benchmarks and tuners"""
+    def __init__(self, port: int = 0, models: Dict[str, int] = None, max_workers: int = 64, **kwargs):
+        self.servicer = StandInServicer(models or dict(DEFAULT_MODELS), **kwargs)
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(self.servicer, self._server)
+        self.port = self._server.add_insecure_port(f'127.0.0.1:{port}')
+
+    @property
+    def url(self) -> str:
+        return f'127.0.0.1:{self.port}'
+
+    def start(self) -> 'StandInServer':
+        self._server.start()
+        return self
+
+    def stop(self, grace: float = 0):
+        self._server.stop(grace)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_models(spec: str) -> Dict[str, int]:
+    """Parse 'name:rate,name:rate' into a model -> sample rate mapping"""
+    models = {}
+    for item in spec.split(','):
+        name, _, rate = item.partition(':')
+        models[name.strip()] = int(rate) if rate else DEFAULT_MODELS.get(name.strip(), 24000)
+    return models
+
+
+def parse_model_ttfb(spec: str) -> Dict[str, float]:
+    """Parse 'name=seconds,name=seconds' into per-model TTFB overrides"""
+    overrides = {}
+    for item in filter(None, spec.split(',')):
+        name, _, seconds = item.partition('=')
+        overrides[name.strip()] = float(seconds)
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Local Triton stand-in streaming synthetic TTS audio',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--port', type=int, default=8001, help='gRPC port to listen on')
+    parser.add_argument('--models', type=str, default='cosyvoice2:24000,spark_tts:16000,f5_tts:24000',
+                       help='Served models as name:sample_rate pairs')
+    parser.add_argument('--ttfb', type=float, default=0.25, help='Simulated time to first chunk (seconds)')
+    parser.add_argument('--model-ttfb', type=str, default='',
+                       help="Per-model TTFB overrides, e.g. 'spark_tts=0.12,f5_tts=0.6'")
+    parser.add_argument('--rtf', type=float, default=0.3, help='Simulated compute seconds per audio second')
+    parser.add_argument('--chunk-duration', type=float, default=0.5, help='Audio seconds per streamed chunk')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Uniform random delay added per chunk (seconds)')
+    parser.add_argument('--gpu-slots', type=int, default=4, help='Concurrent requests before queueing')
+    parser.add_argument('--reference-dtype', type=str, default='FP32', choices=['FP32', 'FP16', 'INT16'],
+                       help='Datatype the models declare for reference_wav')
+    parser.add_argument('--prompt-cost', type=float, default=0.0,
+                       help='TTFB added per second of reference audio (simulated prompt encoding)')
+    parser.add_argument('--vc-models', type=str, default='',
+                       help='Voice conversion models to serve as name:sample_rate pairs, e.g. seed_vc:22050')
+    parser.add_argument('--silence-padding', type=float, default=0.0,
+                       help='Seconds of silence before and after each request\'s audio')
+    args = parser.parse_args()
+
+    server = StandInServer(
+        port=args.port,
+        models=parse_models(args.models),
+        ttfb=args.ttfb,
+        rtf=args.rtf,
+        chunk_duration=args.chunk_duration,
+        jitter=args.jitter,
+        gpu_slots=args.gpu_slots,
+        model_ttfb=parse_model_ttfb(args.model_ttfb),
+        reference_dtype=args.reference_dtype,
+        prompt_cost=args.prompt_cost,
+        silence_padding=args.silence_padding,
+        vc_models=parse_models(args.vc_models) if args.vc_models else None,
+    ).start()
+    logging.info(f"Triton stand-in listening on {server.url} with models {args.models}"
+                 + (f" and voice conversion models {args.vc_models}" if args.vc_models else ""))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+
+"""
+Warm synthesis daemon for the streaming TTS client, plus a thin submission client.
+
+The daemon pays Python startup, the tritonclient/numpy/soundfile imports, reference
+loading and gRPC channel setup once, then accepts synthesis jobs over a local Unix
+socket and streams each segment's audio back as soon as it is ready. The `say`
+client only uses the standard library, so a one-shot prompt costs an IPC round trip
+instead of a full client start.
+
+Wire protocol (one job per connection):
+    client -> daemon: one JSON line, e.g. {"text": "...", "model_name": "cosyvoice2"}
+    daemon -> client: one JSON header line {"status": "ok", "sample_rate": 24000, "dtype": "float32"}
+                      then frames of <uint32 little-endian byte length><float32 PCM> as audio
+                      arrives, a zero-length frame, and one JSON trailer line with timings
+                      ({"status": "done", ...}) or {"status": "error", "message": ...}
+
+The socket is created owner-only (0600): jobs name reference files for the daemon to
+read, so only the user running the daemon may submit them.
+
+Usage:
+# Start the daemon (spk2info mode when no reference audio is given)
+python3 tts_daemon.py serve \
+    --server-addr localhost \
+    --model-name cosyvoice2 \
+    --reference-audio /path/to/prompt.wav \
+    --reference-text "Reference text here"
+
+# Submit a job and write a float WAV (or '-' for raw float32 on stdout)
+python3 tts_daemon.py say "Hello there. This is the warm daemon." --output-path hello.wav
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import time
+from typing import Callable
+
+DEFAULT_SOCKET_PATH = '/tmp/audio-bot-tts.sock'
+FRAME_HEADER = struct.Struct('<I')
+
+
+class PayloadSink:
+    """Duck-typed sink for OrderedAudioEmitter: float32 little-endian payloads handed to a callback"""
+    def __init__(self, on_payload: Callable[[bytes], None]):
+        self.samples_written = 0
+        self._on_payload = on_payload
+
+    def write(self, samples):
+        if len(samples) == 0:
+            return
+        self._on_payload(samples.astype('<f4', copy=False).tobytes())
+        self.samples_written += len(samples)
+
+    def end_segment(self):
+        pass
+
+
+class SynthesisDaemon:
+    """Holds warm channels and cached reference state, serving jobs over a Unix socket"""
+    def __init__(self, args):
+        # Heavy imports happen once, in the daemon only
+        import client_grpc_simple as tts
+
+        self._tts = tts
+        self._args = args
+        self._server_url = f"{args.server_addr}:{args.server_port}"
+        self._client_pool = tts.TritonClientPool(self._server_url, max_idle=args.pool_size)
+        self._references = {}
+        self._model_cache = tts.ModelInfoCache(args.model_cache or tts.DEFAULT_CACHE_PATH)
+        self._model_rates = {}
+
+    async def _load_reference(self, path: str):
+        """Load and cache a reference prompt, keyed by path; the file is read off the event loop"""
+        if path not in self._references:
+            logging.info(f"Loading reference audio: {path}")
+            self._references[path] = await asyncio.to_thread(self._tts.load_audio, path, target_sample_rate=16000)
+        return self._references[path]
+
+    async def model_rate(self, model_name: str) -> int:
+        """A model's output rate from its probed config (through the on-disk cache), or None if unknown"""
+        if model_name not in self._model_rates:
+            tts = self._tts
+            try:
+                info = await asyncio.to_thread(self._model_cache.get, self._server_url, model_name)
+            except tts.InferenceServerException as e:
+                logging.warning(f"Could not probe {model_name}: {e}")
+                # Not remembered, so the next job probes again
+                return tts.KNOWN_SAMPLE_RATES.get(model_name)
+            self._model_rates[model_name] = info['sample_rate']
+        return self._model_rates[model_name]
+
+    async def resolve_target_sr(self) -> bool:
+        """Default --target-sr to the default model's output rate"""
+        args = self._args
+        if args.target_sr is None:
+            args.target_sr = await self.model_rate(args.model_name)
+            if args.target_sr is None:
+                logging.error(f"Unknown output rate of {args.model_name}; pass --target-sr")
+                return False
+            logging.info(f"Sending {args.target_sr} Hz audio ({args.model_name}'s output rate)")
+        return True
+
+    async def warm(self) -> bool:
+        args = self._args
+        speakers = []
+        if args.reference_audio:
+            waveform, _ = await self._load_reference(args.reference_audio)
+            speakers.append((waveform, args.reference_text))
+        report = await self._tts.warm_up(
+            self._server_url,
+            args.model_name,
+            self._client_pool,
+            speakers,
+            args.pool_size,
+            warmup_text=args.warmup_text,
+            chunk_overlap_duration=args.chunk_overlap_duration,
+            save_sample_rate=args.target_sr,
+            use_spk2info_cache=not args.reference_audio,
+        )
+        if not report['model_ready']:
+            return False
+        logging.info(f"Daemon warm: {args.pool_size} channels to {self._server_url}, "
+                     f"TTFB cold {report['cold_ttfb']:.3f}s / warm {report['warm_ttfb']:.3f}s")
+        return True
+
+    def close(self):
+        self._client_pool.close()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        job_start_time = time.time()
+        tts = self._tts
+        args = self._args
+        try:
+            job = json.loads(await reader.readline())
+            if not isinstance(job, dict):
+                raise ValueError("a job is a JSON object")
+            model_name = job.get('model_name', args.model_name)
+            if 'reference_audio' in job:
+                # The daemon's transcript belongs to the daemon's reference, not to this one
+                reference_audio, reference_text = job['reference_audio'], job.get('reference_text', '')
+            else:
+                reference_audio = args.reference_audio
+                reference_text = job.get('reference_text', args.reference_text)
+            segments = tts.split_text_by_punctuation(
+                job['text'], job.get('min_words', args.min_words), job.get('max_words', args.max_words)
+            )
+            if reference_audio:
+                waveform, sample_rate = await self._load_reference(reference_audio)
+            else:
+                waveform, sample_rate = None, 16000
+        except (ValueError, KeyError, TypeError, OSError, RuntimeError) as e:
+            # RuntimeError: soundfile cannot read the reference
+            await self._send_json(writer, {'status': 'error', 'message': f"Invalid job: {e}"})
+            writer.close()
+            return
+        # Audio is sent at the daemon's rate; other models' output is resampled to it
+        model_rate = await self.model_rate(model_name)
+        if model_rate is None:
+            await self._send_json(writer, {'status': 'error', 'message': f"Unknown output rate of {model_name}"})
+            writer.close()
+            return
+
+        logging.info(f"Job received: {len(segments)} segments, model {model_name}")
+        loop = asyncio.get_running_loop()
+        payloads = asyncio.Queue()
+        # Segment streams push audio from worker threads, in order; payloads reach the socket on the loop
+        sink = PayloadSink(lambda payload: loop.call_soon_threadsafe(payloads.put_nowait, payload))
+        emitter = tts.OrderedAudioEmitter(sink)
+        # Lets a disconnect (the listener barged in) stop server work, not just our tasks
+        controller = tts.UtteranceController(args.target_sr)
+        controller.start(segments, emitter)
+
+        async def synthesize_segment(segment_id: int, segment_text: str):
+            push = functools.partial(emitter.push, segment_id)
+            resampler = None
+            on_audio = push
+            if model_rate != args.target_sr:
+                resampler = tts.StreamingResampler(model_rate, args.target_sr)
+                on_audio = lambda samples: push(resampler.process(samples))
+            try:
+                result = await tts.synthesize_streaming(
+                    self._server_url,
+                    model_name,
+                    waveform,
+                    reference_text,
+                    segment_text,
+                    segment_id,
+                    sample_rate,
+                    args.chunk_overlap_duration,
+                    model_rate,
+                    padding_duration=10,
+                    use_spk2info_cache=not reference_audio,
+                    client_pool=self._client_pool,
+                    on_audio=on_audio,
+                    controller=controller,
+                )
+                if result[0] is None:
+                    logging.error(f"[Segment {segment_id}] No audio, skipping")
+                elif resampler:
+                    push(resampler.flush())
+                return result
+            finally:
+                await emitter.finish_async(segment_id)
+
+        tasks = [asyncio.create_task(synthesize_segment(segment_id, segment_text))
+                 for segment_id, segment_text in enumerate(segments)]
+
+        async def wait_segments():
+            try:
+                if tasks:
+                    await asyncio.wait(tasks)
+            finally:
+                loop.call_soon_threadsafe(payloads.put_nowait, None)
+
+        def abandon(reason: str):
+            controller.cancel(reason)
+            for task in tasks:
+                task.cancel()
+            waiter.cancel()
+
+        # Audio is sent chunk by chunk as it arrives, in segment order
+        waiter = asyncio.create_task(wait_segments())
+        first_audio_time = None
+        try:
+            await self._send_json(writer, {
+                'status': 'ok', 'sample_rate': args.target_sr, 'dtype': 'float32', 'segments': len(segments)
+            })
+            while (payload := await payloads.get()) is not None:
+                writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+                await writer.drain()
+                if first_audio_time is None:
+                    first_audio_time = time.time()
+            await waiter
+            # Re-raises a segment's failure
+            failed_segments = sum(1 for task in tasks if task.result()[0] is None)
+            writer.write(FRAME_HEADER.pack(0))
+            await self._send_json(writer, {
+                'status': 'done',
+                'total_samples': sink.samples_written,
+                'failed_segments': failed_segments,
+                'first_audio_latency': (first_audio_time - job_start_time) if first_audio_time else None,
+                'total_time': time.time() - job_start_time,
+            })
+        except ConnectionError:
+            logging.warning("Client disconnected, abandoning job")
+            abandon('client disconnected')
+        except asyncio.CancelledError:
+            abandon('daemon shutting down')
+            raise
+        except Exception as e:
+            logging.exception("Job failed")
+            abandon('job failed')
+            try:
+                writer.write(FRAME_HEADER.pack(0))
+                await self._send_json(writer, {'status': 'error', 'message': f"Synthesis failed: {e}"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, message: dict):
+        writer.write(json.dumps(message).encode('utf-8') + b'\n')
+        await writer.drain()
+
+
+async def serve(args):
+    daemon = SynthesisDaemon(args)
+    if not await daemon.resolve_target_sr() or not await daemon.warm():
+        daemon.close()
+        return
+    if os.path.exists(args.socket_path):
+        os.unlink(args.socket_path)
+    # Owner-only socket: a job names files the daemon reads, so other local users must not submit jobs
+    old_umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(daemon.handle_connection, path=args.socket_path)
+    finally:
+        os.umask(old_umask)
+    logging.info(f"Synthesis daemon listening on {args.socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        daemon.close()
+        if os.path.exists(args.socket_path):
+            os.unlink(args.socket_path)
+
+
+def _read_exact(sock_file, size: int) -> bytes:
+    data = sock_file.read(size)
+    if len(data) != size:
+        raise ConnectionError("Daemon closed the connection mid-frame")
+    return data
+
+
+def _float_wav_header(sample_rate: int, data_bytes: int) -> bytes:
+    """RIFF header for mono IEEE float32 WAV data"""
+    return (b'RIFF' + struct.pack('<I', 36 + data_bytes) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 3, 1, sample_rate, sample_rate * 4, 4, 32)
+            + b'data' + struct.pack('<I', data_bytes))
+
+
+def say(args) -> int:
+    """Thin client: submit one job and stream the audio to a file or stdout"""
+    start_time = time.time()
+    job = {'text': args.text}
+    for key in ('model_name', 'reference_audio', 'reference_text'):
+        if getattr(args, key):
+            job[key] = getattr(args, key)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(args.socket_path)
+        sock.sendall(json.dumps(job).encode('utf-8') + b'\n')
+        sock_file = sock.makefile('rb')
+        header = json.loads(sock_file.readline())
+        if header.get('status') != 'ok':
+            print(f"Daemon error: {header.get('message')}", file=sys.stderr)
+            return 1
+
+        to_stdout = args.output_path == '-'
+        out = sys.stdout.buffer if to_stdout else open(args.output_path, 'wb')
+        try:
+            if not to_stdout:
+                out.write(_float_wav_header(header['sample_rate'], 0))
+            data_bytes = 0
+            first_audio_latency = None
+            while True:
+                (length,) = FRAME_HEADER.unpack(_read_exact(sock_file, FRAME_HEADER.size))
+                if length == 0:
+                    break
+                if first_audio_latency is None:
+                    first_audio_latency = time.time() - start_time
+                out.write(_read_exact(sock_file, length))
+                out.flush()
+                data_bytes += length
+            trailer = json.loads(sock_file.readline())
+            if not to_stdout:
+                out.seek(0)
+                out.write(_float_wav_header(header['sample_rate'], data_bytes))
+        finally:
+            if not to_stdout:
+                out.close()
+
+    if trailer.get('status') != 'done':
+        print(f"Daemon error: {trailer.get('message')}", file=sys.stderr)
+        return 1
+    duration = data_bytes / 4 / header['sample_rate']
+    first = f"{first_audio_latency:.3f}s" if first_audio_latency is not None else "n/a"
+    print(f"Received {duration:.2f}s of audio, first audio after {first}, "
+          f"daemon job time {trailer.get('total_time', 0):.3f}s", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Warm TTS daemon with Unix-socket job submission',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--socket-path', type=str, default=DEFAULT_SOCKET_PATH,
+                       help='Unix socket path for job submission')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the warm synthesis daemon',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    serve_parser.add_argument('--server-addr', type=str, default='speechlab-tunnel.southeastasia.cloudapp.azure.com', help='Server address')
+    serve_parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    serve_parser.add_argument('--model-name', type=str, default='cosyvoice2',
+                             help='Default model name (any decoupled TTS model on the server)')
+    serve_parser.add_argument('--reference-audio', type=str, default=None,
+                             help='Reference audio to cache (omit to use the server spk2info cache)')
+    serve_parser.add_argument('--reference-text', type=str, default='',
+                             help='Reference text (transcript of reference audio)')
+    serve_parser.add_argument('--target-sr', type=int, default=None,
+                             help="Output sample rate of every job (default: the default model's probed rate)")
+    serve_parser.add_argument('--chunk-overlap-duration', type=float, default=0.1,
+                             help='Chunk overlap duration for streaming (seconds)')
+    serve_parser.add_argument('--model-cache', type=str, default=None,
+                             help="File caching the model probe results a job's output rate comes from "
+                                  "(default: the client's cache)")
+    serve_parser.add_argument('--min-words', type=int, default=10,
+                             help='Minimum words per segment when splitting')
+    serve_parser.add_argument('--max-words', type=int, default=30,
+                             help='Maximum words per segment when splitting')
+    serve_parser.add_argument('--pool-size', type=int, default=4,
+                             help='Warm gRPC channels kept open')
+    serve_parser.add_argument('--warmup-text', type=str, default='Hello.',
+                             help='Throwaway text synthesized per speaker at startup')
+
+    say_parser = subparsers.add_parser('say', help='Submit a job to a running daemon',
+                                       formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    say_parser.add_argument('text', type=str, help='Text to synthesize')
+    say_parser.add_argument('--output-path', type=str, default='output.wav',
+                           help="Output float WAV path, or '-' for raw float32 on stdout")
+    say_parser.add_argument('--model-name', type=str, default=None, help='Override the daemon model')
+    say_parser.add_argument('--reference-audio', type=str, default=None,
+                           help='Override the daemon reference audio (path on the daemon host)')
+    say_parser.add_argument('--reference-text', type=str, default=None,
+                           help="Reference text; with --reference-audio it transcribes that file (default: empty)")
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return say(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
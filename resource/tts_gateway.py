@@ -0,0 +1,928 @@
+#!/usr/bin/env python3
+
+"""
+Streaming HTTP/WebSocket synthesis gateway for browsers and LLM backends.
+
+app/api/voice-convert/route.ts and lib/triton-tts-client.ts synthesize the whole
+utterance and WAV-encode it before responding, so the browser waits for all of it.
+The gateway runs the client_grpc_simple.py pipeline behind plain HTTP instead:
+- text arrives whole (JSON body), as an LLM token stream (a chunked text/plain
+  request body, or WebSocket messages), and IncrementalSplitter launches each
+  segment as soon as it is final
+- segments stream concurrently over warm gRPC channels and OrderedAudioEmitter
+  puts their audio back in order
+- server chunks of any size are coalesced into fixed-size PCM16 frames (40 ms by
+  default), sent as HTTP chunks or WebSocket binary messages as they fill up
+
+Endpoints (standard library only, one utterance per connection):
+    POST /v1/tts     JSON {"text": "...", "format": "wav" | "pcm16", "model_name": ..., "speaker": ...},
+                     or a text/plain body (chunked for token streams, options in the
+                     query string); the response is chunked audio/wav or audio/L16
+    GET  /v1/tts/ws  WebSocket. The client sends JSON text messages {"text": "<tokens>"}
+                     and finally {"text": "...", "final": true}, or {"cancel": true}
+                     for barge-in. The gateway answers with {"type": "start", ...},
+                     binary PCM16 frames and {"type": "done", ...}
+    GET  /stats      Session counts, TTFB percentiles, process CPU time and scheduler stats
+    GET  /health     Liveness
+Jobs choose a voice with "speaker": the default voice (--reference-audio, or the server's
+spk2info cache) or one listed in --speakers. Voices are loaded at startup; a job cannot
+name a reference file, and a job with an unknown speaker or option gets 400 (or an error
+message on the WebSocket) before any audio.
+With --max-in-flight, segment streams of all sessions are admitted by a FairScheduler
+(fair_scheduler.py); a job may set "tenant" and "priority" ("interactive" or "bulk").
+With --prompt-archive, whole texts found in an archive (prompt_archive.py) are sent from
+the memory-mapped archive without synthesis. An archive serves the speaker it was built
+for (one not among the voices stands in for the default voice), and only jobs whose
+model and voice it was rendered with.
+
+Usage:
+# Serve on port 8080 (spk2info mode when no reference audio is given)
+python3 tts_gateway.py serve --server-addr localhost --model-name cosyvoice2 --port 8080
+
+# Stream a WAV to a file as it is synthesized
+curl -N -X POST localhost:8080/v1/tts -d '{"text": "Hello there. How are you today?"}' -o hello.wav
+
+# Load test: TTFB and real-time sessions per gateway core at several concurrency levels
+python3 tts_gateway.py bench --gateway localhost:8080 --sessions 1 8 32 --transport ws --words-per-second 8
+"""
+
+import argparse
+import asyncio
+import base64
+import codecs
+import collections
+import functools
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from audio_sinks import AudioSink, encode_pcm16
+from fair_scheduler import PRIORITY_CLASSES, FairScheduler, parse_tenant_weights
+from prompt_archive import PromptArchive
+from tts_daemon import SynthesisDaemon
+
+DEFAULT_PORT = 8080
+DEFAULT_FRAME_MS = 40
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_TEXT, WS_BINARY, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+# Larger client messages (or request bodies) are rejected
+MAX_MESSAGE_BYTES = 2**20
+HTTP_REASONS = {101: 'Switching Protocols', 200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                413: 'Payload Too Large', 500: 'Internal Server Error'}
+BENCH_TEXT = ("Thanks for calling. Your order shipped yesterday and should arrive on Friday, "
+              "weather permitting. If anything is missing, reply to the confirmation email "
+              "and we will sort it out right away. Is there anything else I can help you with today?")
+
+
+class FrameSink(AudioSink):
+    """PCM16 audio coalesced into fixed-size frames; the last frame of an utterance may be shorter"""
+    format_name = 'pcm16'
+
+    def __init__(self, sample_rate: int, frame_ms: int, on_frame: Callable[[bytes], None], dither: bool = True):
+        super().__init__(sample_rate)
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.frames_written = 0
+        self._on_frame = on_frame
+        self._dither = dither
+        self._rng = np.random.default_rng()
+        self._pending = bytearray()
+
+    def _emit(self, frame: bytes):
+        self._on_frame(frame)
+        self.bytes_written += len(frame)
+        self.frames_written += 1
+
+    def _write(self, samples: np.ndarray):
+        self._pending += encode_pcm16(samples, self._dither, self._rng)
+        complete = len(self._pending) - len(self._pending) % self.frame_bytes
+        for start in range(0, complete, self.frame_bytes):
+            self._emit(bytes(self._pending[start:start + self.frame_bytes]))
+        del self._pending[:complete]
+
+    def close(self):
+        if self._pending:
+            self._emit(bytes(self._pending))
+            self._pending.clear()
+
+
+def streaming_wav_header(sample_rate: int) -> bytes:
+    """PCM16 WAV header with open-ended sizes, for a body whose length is not known up front"""
+    return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+            + b'data' + struct.pack('<I', 0xFFFFFFFF - 36))
+
+
+async def read_http_head(reader: asyncio.StreamReader) -> Tuple[str, str, dict]:
+    """Request (or status) line and lower-cased headers of one HTTP/1.1 message"""
+    start_line = (await reader.readline()).decode('latin-1').strip()
+    if not start_line:
+        raise ConnectionError("Connection closed before a request")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if line in ('\r\n', '\n', ''):
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    first, second, _ = (start_line.split(' ', 2) + [''])[:3]
+    return first, second, headers
+
+
+async def read_chunked(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Chunks of a Transfer-Encoding: chunked body, as they arrive"""
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        if size == 0:
+            # Skip trailers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return
+        if size > MAX_MESSAGE_BYTES:
+            raise ValueError(f"Chunk of {size} bytes is too large")
+        chunk = await reader.readexactly(size)
+        await reader.readline()
+        yield chunk
+
+
+def ws_frame(opcode: int, payload: bytes, mask: bool = False) -> bytes:
+    """One unfragmented WebSocket frame; clients must mask, servers must not"""
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        head = struct.pack('>BB', 0x80 | opcode, mask_bit | length)
+    elif length < 2**16:
+        head = struct.pack('>BBH', 0x80 | opcode, mask_bit | 126, length)
+    else:
+        head = struct.pack('>BBQ', 0x80 | opcode, mask_bit | 127, length)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    return head + key + _apply_mask(payload, key)
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    data = np.frombuffer(payload, dtype=np.uint8)
+    return (data ^ np.resize(np.frombuffer(key, dtype=np.uint8), len(data))).tobytes()
+
+
+async def read_ws_message(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """
+    Next WebSocket message as (opcode, payload).
+
+    Fragmented data messages are joined; control frames (close, ping, pong) are
+    returned as soon as they arrive, even between the fragments of a message.
+    """
+    message = bytearray()
+    message_opcode = None
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack('>H', await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack('>Q', await reader.readexactly(8))
+        if len(message) + length > MAX_MESSAGE_BYTES:
+            raise ValueError(f"WebSocket message over {MAX_MESSAGE_BYTES} bytes")
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if key:
+            payload = _apply_mask(payload, key)
+        opcode = first & 0x0F
+        if opcode >= WS_CLOSE:
+            return opcode, payload
+        if opcode:
+            message_opcode = opcode
+        message += payload
+        if first & 0x80:
+            return message_opcode, bytes(message)
+
+
+def websocket_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+class SynthesisGateway(SynthesisDaemon):
+    """Warm channels and cached references shared by HTTP and WebSocket sessions"""
+    def __init__(self, args):
+        super().__init__(args)
+        # speaker -> reference_audio, reference_text, waveform, sample_rate; filled by load_voices()
+        self.voices = {}
+        self.archives = {}
+        self.default_archive = None
+        self.sessions_active = 0
+        self.sessions_total = 0
+        self.sessions_failed = 0
+        self.audio_seconds = 0.0
+        self.ttfbs = collections.deque(maxlen=1000)
+        self.scheduler = FairScheduler(
+            args.max_in_flight, tenant_weights=args.tenant_weights, interactive_reserve=args.interactive_reserve
+        ) if args.max_in_flight else None
+        self.archived_sessions = 0
+
+    def close(self):
+        super().close()
+        for archive in self.archives.values():
+            archive.close()
+
+    async def load_voices(self):
+        """
+        Load the voices jobs may pick with "speaker": the default one (--reference-audio, or the
+        spk2info cache) as --default-speaker, plus those in --speakers. Jobs never name files.
+        """
+        args = self._args
+        voices = {args.default_speaker: {'reference_audio': args.reference_audio, 'reference_text': args.reference_text}}
+        if args.speakers:
+            with open(args.speakers, encoding='utf-8') as f:
+                speakers = json.load(f)
+            if not isinstance(speakers, dict) or not all(isinstance(voice, dict) for voice in speakers.values()):
+                raise ValueError(f"{args.speakers}: expected {{speaker: {{reference_audio, reference_text}}}}")
+            if args.default_speaker in speakers:
+                raise ValueError(f"{args.speakers} redefines the default speaker {args.default_speaker!r}")
+            voices.update(speakers)
+        for speaker, voice in voices.items():
+            waveform, sample_rate = None, 16000
+            if voice.get('reference_audio'):
+                waveform, sample_rate = await asyncio.to_thread(
+                    self._tts.load_audio, voice['reference_audio'], target_sample_rate=16000)
+            self.voices[speaker] = {
+                'reference_audio': voice.get('reference_audio'),
+                'reference_text': voice.get('reference_text', ''),
+                'waveform': waveform,
+                'sample_rate': sample_rate,
+            }
+            logging.info(f"Voice {speaker}: {voice.get('reference_audio') or 'spk2info cache'}")
+
+    async def validate_job(self, job: dict) -> str:
+        """Check (and normalize) a job's options before any response is sent; returns an error message or None"""
+        args = self._args
+        if 'reference_audio' in job or 'reference_text' in job:
+            return "Pick a voice with \"speaker\"; reference audio is configured on the gateway (--speakers)"
+        speaker = job.get('speaker', args.default_speaker)
+        if not isinstance(speaker, str) or speaker not in self.voices:
+            return f"Unknown speaker: {speaker}"
+        if job.get('priority', 'interactive') not in PRIORITY_CLASSES:
+            return f"Unknown priority: {job['priority']}"
+        if not isinstance(job.get('tenant', 'default'), str):
+            return "tenant must be a string"
+        for key in ('min_words', 'max_words'):
+            if key in job:
+                # Query-string options arrive as strings
+                try:
+                    job[key] = int(job[key])
+                except (TypeError, ValueError):
+                    return f"{key} must be an integer"
+                if job[key] < 1:
+                    return f"{key} must be at least 1"
+        model_name = job.get('model_name', args.model_name)
+        if await self.model_rate(model_name) is None:
+            return f"Unknown output rate of {model_name}"
+        return None
+
+    def open_archives(self):
+        """
+        Open the prompt archives after load_voices(). Each must hold audio at the (resolved)
+        --target-sr in the voice of its speaker; an archive whose speaker is no configured voice
+        can only stand in for the default voice, so it must have been rendered in that voice.
+        """
+        args = self._args
+        for path in args.prompt_archive:
+            archive = PromptArchive(path)
+            self.archives[archive.speaker] = archive
+            if archive.sample_rate != args.target_sr:
+                raise ValueError(f"{path} holds {archive.sample_rate} Hz audio, the gateway sends {args.target_sr} Hz")
+            voice = self.voices.get(archive.speaker, self.voices[args.default_speaker])
+            if not archive.has_voice(archive.metadata.get('model_name'), voice['reference_audio']):
+                raise ValueError(f"{path} was rendered from {archive.metadata.get('reference_audio') or 'spk2info cache'}, "
+                                 f"not the {voice['reference_audio'] or 'spk2info cache'} voice it would serve")
+            logging.info(f"Prompt archive {path}: {archive.count} prompts of speaker {archive.speaker} "
+                         f"({archive.metadata.get('model_name')}), {archive.audio_seconds:.1f}s")
+        default_voice = self.voices[args.default_speaker]
+        self.default_archive = self.archives.get(args.default_speaker) or next(
+            (archive for speaker, archive in self.archives.items() if speaker not in self.voices
+             and archive.has_voice(args.model_name, default_voice['reference_audio'])), None)
+
+    def lookup_prompt(self, job: dict, text: str):
+        """Prerendered int16 audio for a job's whole text in the job's voice and model, or None"""
+        args = self._args
+        speaker = job.get('speaker', args.default_speaker)
+        archive = self.default_archive if speaker == args.default_speaker else self.archives.get(speaker)
+        # Synthesized replies use the same voice, so archived and synthesized audio never differ in it
+        if archive is None or not archive.has_voice(job.get('model_name', args.model_name),
+                                                    self.voices[speaker]['reference_audio']):
+            return None
+        return archive.lookup(text)
+
+    async def send_prompt(self, samples: np.ndarray, send_frame: Callable[[bytes], Awaitable[None]]) -> dict:
+        """Send archived audio as the same PCM16 frames a synthesized session would get"""
+        args = self._args
+        session_start = time.time()
+        payload = memoryview(samples).cast('B')
+        frame_bytes = args.target_sr * args.frame_ms // 1000 * 2
+        self.sessions_active += 1
+        self.sessions_total += 1
+        self.archived_sessions += 1
+        try:
+            for start in range(0, len(payload), frame_bytes):
+                if start == 0:
+                    self.ttfbs.append(time.time() - session_start)
+                await send_frame(payload[start:start + frame_bytes])
+        except BaseException:
+            self.sessions_failed += 1
+            raise
+        finally:
+            self.sessions_active -= 1
+            self.audio_seconds += len(samples) / args.target_sr
+        stats = {
+            'segments': 0,
+            'failed_segments': 0,
+            'cancelled': False,
+            'archived': True,
+            'audio_seconds': len(samples) / args.target_sr,
+            'frames': -(-len(payload) // frame_bytes),
+            'first_audio_latency': self.ttfbs[-1] if len(samples) else None,
+            'total_time': time.time() - session_start,
+        }
+        logging.info(f"Session served from the prompt archive: {stats['audio_seconds']:.2f}s of audio in "
+                     f"{stats['frames']} frames")
+        return stats
+
+    async def stream_session(
+        self,
+        job: dict,
+        text_updates: AsyncIterator[str],
+        send_frame: Callable[[bytes], Awaitable[None]],
+        on_controller: Callable[[object], None] = None,
+    ) -> dict:
+        """
+        Synthesize text as it arrives and send its audio as fixed-size PCM16 frames.
+
+        Args:
+            job: Per-session options (model_name, speaker, min_words, max_words), checked by validate_job()
+            text_updates: Text pieces to append, e.g. LLM tokens; synthesis ends when it is exhausted
+            send_frame: Sends one frame to the client; a ConnectionError cancels the utterance
+            on_controller: Receives the session's UtteranceController, for barge-in
+
+        Returns:
+            Session stats: segments, audio seconds, frames, first audio latency, total time
+        """
+        tts = self._tts
+        args = self._args
+        session_start = time.time()
+        model_name = job.get('model_name', args.model_name)
+        # Checked by validate_job()
+        voice = self.voices[job.get('speaker', args.default_speaker)]
+        # Frames go out at --target-sr; other models' output is resampled to it
+        model_rate = await self.model_rate(model_name)
+        if model_rate is None:
+            raise ValueError(f"Unknown output rate of {model_name}")
+
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue()
+        # Segment streams push audio from worker threads; frames reach the socket on the loop
+        sink = FrameSink(args.target_sr, args.frame_ms,
+                         lambda frame: loop.call_soon_threadsafe(frames.put_nowait, frame))
+        emitter = tts.OrderedAudioEmitter(sink)
+        controller = tts.UtteranceController(args.target_sr)
+        controller.start([], emitter)
+        if on_controller:
+            on_controller(controller)
+        splitter = tts.IncrementalSplitter(job.get('min_words', args.min_words), job.get('max_words', args.max_words))
+        tasks = []
+
+        scheduled = self.scheduler.session(self.sessions_total, job.get('tenant', 'default'),
+                                           job.get('priority', 'interactive')) if self.scheduler else None
+
+        async def synthesize_segment(segment_id: int, segment_text: str):
+            ticket = None
+            result = (None, None, None)
+            push = functools.partial(emitter.push, segment_id)
+            resampler = None
+            on_audio = push
+            if model_rate != args.target_sr:
+                resampler = tts.StreamingResampler(model_rate, args.target_sr)
+                on_audio = lambda samples: push(resampler.process(samples))
+            try:
+                if scheduled:
+                    ticket = await scheduled.acquire(len(segment_text.split()))
+                result = await tts.synthesize_streaming(
+                    self._server_url,
+                    model_name,
+                    voice['waveform'],
+                    voice['reference_text'],
+                    segment_text,
+                    segment_id,
+                    voice['sample_rate'],
+                    args.chunk_overlap_duration,
+                    model_rate,
+                    padding_duration=10,
+                    use_spk2info_cache=voice['waveform'] is None,
+                    client_pool=self._client_pool,
+                    on_audio=on_audio,
+                    controller=controller,
+                )
+                if resampler and result[0] is not None:
+                    push(resampler.flush())
+                return result
+            finally:
+                if ticket:
+                    scheduled.release(ticket, result[2])
+                await emitter.finish_async(segment_id)
+
+        def launch(segments: List[str]):
+            for segment_text in segments:
+                segment_id = len(tasks)
+                controller.add_segment(segment_id, segment_text)
+                tasks.append(asyncio.create_task(synthesize_segment(segment_id, segment_text)))
+
+        async def feed():
+            text = ''
+            try:
+                async for piece in text_updates:
+                    text += piece
+                    launch(splitter.update(text))
+                launch(splitter.update(text, done=True))
+            except Exception:
+                controller.cancel('text stream failed')
+                raise
+            finally:
+                # Not cancelled with the feeder: a segment's thread must finish before its channel is reused
+                if tasks:
+                    await asyncio.wait(tasks)
+                sink.close()
+                loop.call_soon_threadsafe(frames.put_nowait, None)
+
+        self.sessions_active += 1
+        self.sessions_total += 1
+        feeder = asyncio.create_task(feed())
+        first_frame_time = None
+        try:
+            while (frame := await frames.get()) is not None:
+                if controller.cancelled_from is not None:
+                    # Barge-in: frames queued before the cancellation are not played either
+                    continue
+                if first_frame_time is None:
+                    first_frame_time = time.time()
+                    self.ttfbs.append(first_frame_time - session_start)
+                await send_frame(frame)
+            await feeder
+        except BaseException:
+            self.sessions_failed += 1
+            controller.cancel('client disconnected')
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+            raise
+        finally:
+            self.sessions_active -= 1
+            self.audio_seconds += sink.samples_written / args.target_sr
+
+        results = [task.result() for task in tasks]
+        stats = {
+            'segments': len(tasks),
+            'failed_segments': sum(1 for segment_id, (audio, _, _) in enumerate(results)
+                                   if audio is None and not controller.is_cancelled(segment_id)),
+            'cancelled': controller.cancelled_from is not None,
+            'audio_seconds': sink.samples_written / args.target_sr,
+            'frames': sink.frames_written,
+            'first_audio_latency': (first_frame_time - session_start) if first_frame_time else None,
+            'total_time': time.time() - session_start,
+        }
+        logging.info(f"Session done: {stats['segments']} segments, {stats['audio_seconds']:.2f}s of audio in "
+                     f"{stats['frames']} frames, first audio after "
+                     + (f"{stats['first_audio_latency']:.3f}s" if first_frame_time else "n/a"))
+        return stats
+
+    def stats(self) -> dict:
+        ttfbs = np.asarray(self.ttfbs) if self.ttfbs else None
+        return {
+            'sessions_active': self.sessions_active,
+            'sessions_total': self.sessions_total,
+            'sessions_failed': self.sessions_failed,
+            'archived_sessions': self.archived_sessions,
+            'audio_seconds': self.audio_seconds,
+            'ttfb_p50': float(np.percentile(ttfbs, 50)) if ttfbs is not None else None,
+            'ttfb_p95': float(np.percentile(ttfbs, 95)) if ttfbs is not None else None,
+            # For CPU cost per session: process time covers the loop and every segment thread
+            'cpu_time': time.process_time(),
+            'scheduling': self.scheduler.stats() if self.scheduler else None,
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, target, headers = await read_http_head(reader)
+            url = urlsplit(target)
+            query = dict(parse_qsl(url.query))
+            if url.path == '/v1/tts/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._serve_websocket(reader, writer, headers)
+            elif url.path == '/v1/tts' and method == 'POST':
+                await self._serve_http(reader, writer, headers, query)
+            elif url.path == '/stats' and method == 'GET':
+                await self._respond_json(writer, 200, self.stats())
+            elif url.path == '/health' and method == 'GET':
+                await self._respond_json(writer, 200, {'status': 'ok'})
+            else:
+                await self._respond_json(writer, 404, {'error': f"No route for {method} {url.path}"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logging.warning("Client disconnected, session abandoned")
+        except ValueError as e:
+            logging.warning(f"Bad request: {e}")
+        except Exception:
+            logging.exception("Session failed")
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond_json(writer: asyncio.StreamWriter, status: int, message: dict):
+        body = json.dumps(message).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def _serve_http(self, reader, writer, headers: dict, query: dict):
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        # Only text/* bodies are text; anything else (curl -d sends a form type) is a JSON job
+        is_text = headers.get('content-type', '').startswith('text/')
+        job = dict(query)
+        text = None
+        if chunked and is_text:
+            # Token stream: the body is text, synthesized while it is still arriving
+            async def text_updates():
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                async for chunk in read_chunked(reader):
+                    yield decoder.decode(chunk)
+                yield decoder.decode(b'', final=True)
+        else:
+            if chunked:
+                body = b''.join([chunk async for chunk in read_chunked(reader)])
+            else:
+                length = int(headers.get('content-length', 0))
+                if length > MAX_MESSAGE_BYTES:
+                    await self._respond_json(writer, 413, {'error': f"Body over {MAX_MESSAGE_BYTES} bytes"})
+                    return
+                body = await reader.readexactly(length)
+            try:
+                if is_text:
+                    text = body.decode('utf-8')
+                else:
+                    job.update(json.loads(body))
+                    text = job['text']
+            except (ValueError, KeyError) as e:
+                await self._respond_json(writer, 400, {'error': f"Invalid job: {e}"})
+                return
+
+            async def text_updates():
+                yield text
+
+        audio_format = job.get('format', 'wav')
+        if audio_format not in ('wav', 'pcm16'):
+            await self._respond_json(writer, 400, {'error': f"Unknown format: {audio_format}"})
+            return
+        error = await self.validate_job(job)
+        if error:
+            await self._respond_json(writer, 400, {'error': error})
+            return
+        sample_rate = self._args.target_sr
+        media_type = 'audio/wav' if audio_format == 'wav' else f'audio/L16; rate={sample_rate}; channels=1'
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {media_type}\r\nTransfer-Encoding: chunked\r\n"
+                     f"X-Sample-Rate: {sample_rate}\r\nCache-Control: no-store\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1'))
+        if audio_format == 'wav':
+            header = streaming_wav_header(sample_rate)
+            writer.write(b'%X\r\n%s\r\n' % (len(header), header))
+
+        async def send_frame(frame: bytes):
+            writer.write(b'%X\r\n%s\r\n' % (len(frame), frame))
+            await writer.drain()
+
+        archived = self.lookup_prompt(job, text) if text is not None and self.archives else None
+        if archived is not None:
+            await self.send_prompt(archived, send_frame)
+        else:
+            await self.stream_session(job, text_updates(), send_frame)
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _serve_websocket(self, reader, writer, headers: dict):
+        key = headers.get('sec-websocket-key')
+        if not key:
+            await self._respond_json(writer, 400, {'error': 'Missing Sec-WebSocket-Key'})
+            return
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n".encode('latin-1'))
+        args = self._args
+        writer.write(ws_frame(WS_TEXT, json.dumps({
+            'type': 'start', 'format': 'pcm16', 'sample_rate': args.target_sr,
+            'frame_bytes': args.target_sr * args.frame_ms // 1000 * 2,
+        }).encode('utf-8')))
+        await writer.drain()
+
+        async def next_message() -> dict:
+            """Next JSON text message from the client, answering pings on the way"""
+            while True:
+                opcode, payload = await read_ws_message(reader)
+                if opcode == WS_PING:
+                    writer.write(ws_frame(WS_PONG, payload))
+                elif opcode == WS_CLOSE:
+                    raise ConnectionError("Client closed the WebSocket before the final text")
+                elif opcode == WS_TEXT:
+                    message = json.loads(payload)
+                    if not isinstance(message, dict):
+                        raise ValueError(f"Expected a JSON object, got {payload[:50]!r}")
+                    return message
+
+        async def send_frame(frame: bytes):
+            writer.write(ws_frame(WS_BINARY, frame))
+            await writer.drain()
+
+        # Session options (model_name, speaker, ...) come with the first message
+        first = await next_message()
+        job = {key: value for key, value in first.items() if key not in ('text', 'final', 'cancel')}
+        error = await self.validate_job(job)
+        if error:
+            writer.write(ws_frame(WS_TEXT, json.dumps({'type': 'error', 'message': error}).encode('utf-8')))
+            writer.write(ws_frame(WS_CLOSE, struct.pack('>H', 1008)))
+            await writer.drain()
+            return
+        updates = asyncio.Queue()
+        readers = []
+
+        async def read_messages(controller):
+            """Reads the socket for the whole session: text until final, then barge-in, pings and close"""
+            message = first
+            text_done = False
+            try:
+                while True:
+                    if message.get('cancel'):
+                        controller.cancel('barge-in')
+                    elif not text_done and message.get('text'):
+                        updates.put_nowait(message['text'])
+                    if not text_done and (message.get('cancel') or message.get('final')):
+                        text_done = True
+                        updates.put_nowait(None)
+                    message = await next_message()
+            except BaseException:
+                controller.cancel('client disconnected')
+                updates.put_nowait(None)
+                raise
+
+        def start_reader(controller):
+            readers.append(asyncio.create_task(read_messages(controller)))
+
+        async def text_updates():
+            while (text := await updates.get()) is not None:
+                yield text
+
+        # A whole text in one message may be a prerendered prompt
+        archived = self.lookup_prompt(job, first['text']) \
+            if first.get('final') and first.get('text') and self.archives else None
+        if archived is not None:
+            stats = await self.send_prompt(archived, send_frame)
+        else:
+            try:
+                stats = await self.stream_session(job, text_updates(), send_frame, on_controller=start_reader)
+            finally:
+                for reader_task in readers:
+                    reader_task.cancel()
+                await asyncio.gather(*readers, return_exceptions=True)
+            # A disconnect or a malformed message ends the session like before, without a done message
+            failure = next((task.exception() for task in readers if not task.cancelled() and task.exception()), None)
+            if failure:
+                raise failure
+        writer.write(ws_frame(WS_TEXT, json.dumps(dict(stats, type='done')).encode('utf-8')))
+        writer.write(ws_frame(WS_CLOSE, struct.pack('>H', 1000)))
+        await writer.drain()
+
+
+async def serve(args):
+    # Every segment stream holds an executor thread while it streams; the default pool
+    # (CPU count + 4 threads) would queue concurrent sessions behind each other
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=args.max_streams, thread_name_prefix='segment-stream'))
+    gateway = SynthesisGateway(args)
+    if not await gateway.resolve_target_sr():
+        gateway.close()
+        return
+    try:
+        # Checked before warm-up, so a wrong voice or archive fails fast
+        await gateway.load_voices()
+        gateway.open_archives()
+    except (ValueError, OSError, RuntimeError) as e:
+        # RuntimeError: soundfile cannot read a reference
+        logging.error(str(e))
+        gateway.close()
+        return
+    if not await gateway.warm():
+        gateway.close()
+        return
+    server = await asyncio.start_server(gateway.handle_connection, args.host, args.port)
+    logging.info(f"Synthesis gateway listening on http://{args.host}:{args.port} "
+                 f"({args.frame_ms} ms frames at {args.target_sr} Hz)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        gateway.close()
+
+
+async def _http_json(host: str, port: int, path: str) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+        _, status, headers = await read_http_head(reader)
+        return json.loads(await reader.readexactly(int(headers['content-length'])))
+    finally:
+        writer.close()
+
+
+async def _bench_session(args, host: str, port: int, text: str) -> dict:
+    """One load-test session; records when each audio frame arrived"""
+    reader, writer = await asyncio.open_connection(host, port)
+    start = time.time()
+    arrivals = []
+    job = {'tenant': args.tenant, 'priority': args.priority}
+    try:
+        if args.transport == 'http':
+            body = json.dumps(dict(job, text=text, format='pcm16')).encode('utf-8')
+            writer.write(f"POST /v1/tts HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+            _, status, headers = await read_http_head(reader)
+            if status != '200':
+                raise ConnectionError(f"HTTP {status}")
+            sample_rate = int(headers['x-sample-rate'])
+            async for chunk in read_chunked(reader):
+                arrivals.append((time.time(), len(chunk)))
+        else:
+            key = base64.b64encode(os.urandom(16)).decode('ascii')
+            writer.write(f"GET /v1/tts/ws HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode('latin-1'))
+            _, status, _ = await read_http_head(reader)
+            if status != '101':
+                raise ConnectionError(f"HTTP {status}")
+            _, payload = await read_ws_message(reader)
+            sample_rate = json.loads(payload)['sample_rate']
+
+            async def send_text():
+                words = text.split()
+                if not args.words_per_second:
+                    writer.write(ws_frame(WS_TEXT, json.dumps(dict(job, text=text, final=True)).encode(), mask=True))
+                    return
+                for index, word in enumerate(words):
+                    writer.write(ws_frame(WS_TEXT, json.dumps(dict(
+                        job if index == 0 else {}, text=(' ' if index else '') + word, final=index == len(words) - 1,
+                    )).encode('utf-8'), mask=True))
+                    await writer.drain()
+                    await asyncio.sleep(1.0 / args.words_per_second)
+
+            sender = asyncio.create_task(send_text())
+            while True:
+                opcode, payload = await read_ws_message(reader)
+                if opcode == WS_BINARY:
+                    arrivals.append((time.time(), len(payload)))
+                elif opcode == WS_CLOSE or (opcode == WS_TEXT and json.loads(payload).get('type') == 'done'):
+                    break
+            await sender
+    finally:
+        writer.close()
+
+    # Playback starts with the first frame; a frame arriving after its playout time stalls it
+    stall = 0.0
+    played = 0
+    for arrival, size in arrivals:
+        deadline = arrivals[0][0] + played / 2 / sample_rate + stall
+        stall += max(arrival - deadline, 0.0)
+        played += size
+    return {
+        'ttfb': arrivals[0][0] - start if arrivals else None,
+        'audio_seconds': played / 2 / sample_rate,
+        'stall': stall,
+        'frames': len(arrivals),
+    }
+
+
+async def bench(args) -> int:
+    host, _, port = args.gateway.rpartition(':')
+    port = int(port)
+    text = args.text or BENCH_TEXT
+    print(f"Load test of {args.gateway} over {args.transport}"
+          + (f", text streamed at {args.words_per_second:g} words/s" if args.words_per_second else ""))
+    for sessions in args.sessions:
+        before = await _http_json(host, port, '/stats')
+        wall_start = time.time()
+        results = await asyncio.gather(*[_bench_session(args, host, port, text) for _ in range(sessions)],
+                                       return_exceptions=True)
+        wall_time = time.time() - wall_start
+        after = await _http_json(host, port, '/stats')
+        done = [r for r in results if not isinstance(r, BaseException) and r['ttfb'] is not None]
+        if not done:
+            print(f"  {sessions:>4} sessions: all failed ({results[0]})")
+            continue
+        ttfb = np.asarray([r['ttfb'] for r in done])
+        audio_seconds = sum(r['audio_seconds'] for r in done)
+        cpu_seconds = after['cpu_time'] - before['cpu_time']
+        stalled = sum(1 for r in done if r['stall'] > 0.05)
+        # One core keeps this many listeners fed in real time, at the gateway's measured cost
+        per_core = audio_seconds / cpu_seconds if cpu_seconds > 0 else float('inf')
+        print(f"  {sessions:>4} sessions: TTFB p50 {np.median(ttfb):.3f}s p95 {np.percentile(ttfb, 95):.3f}s; "
+              f"{audio_seconds:.1f}s audio in {wall_time:.1f}s; {stalled} stalled; "
+              f"gateway CPU {cpu_seconds:.2f}s -> {per_core:.0f} real-time sessions per core"
+              + (f"; {len(results) - len(done)} failed" if len(done) < len(results) else ""))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Streaming HTTP/WebSocket TTS gateway over the Triton streaming client',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run the gateway',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    serve_parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='HTTP port to listen on')
+    serve_parser.add_argument('--server-addr', type=str, default='speechlab-tunnel.southeastasia.cloudapp.azure.com', help='Server address')
+    serve_parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    serve_parser.add_argument('--model-name', type=str, default='cosyvoice2',
+                             help='Default model name (any decoupled TTS model on the server)')
+    serve_parser.add_argument('--reference-audio', type=str, default=None,
+                             help='Reference audio of the default voice (omit to use the server spk2info cache)')
+    serve_parser.add_argument('--reference-text', type=str, default='',
+                             help='Reference text (transcript of reference audio)')
+    serve_parser.add_argument('--default-speaker', type=str, default='default',
+                             help='Speaker name of the default voice, for jobs and prompt archives')
+    serve_parser.add_argument('--speakers', type=str, default=None,
+                             help='JSON of speaker -> reference_audio/reference_text: further voices jobs may '
+                                  'pick with "speaker" (as for prompt_archive.py build)')
+    serve_parser.add_argument('--target-sr', type=int, default=None,
+                             help="Sample rate of the frames sent to clients (default: the default model's probed rate)")
+    serve_parser.add_argument('--chunk-overlap-duration', type=float, default=0.1,
+                             help='Chunk overlap duration for streaming (seconds)')
+    serve_parser.add_argument('--model-cache', type=str, default=None,
+                             help="File caching the model probe results a job's output rate comes from "
+                                  "(default: the client's cache)")
+    serve_parser.add_argument('--min-words', type=int, default=10,
+                             help='Minimum words per segment when splitting')
+    serve_parser.add_argument('--max-words', type=int, default=30,
+                             help='Maximum words per segment when splitting')
+    serve_parser.add_argument('--frame-ms', type=int, default=DEFAULT_FRAME_MS,
+                             help='Audio frame size sent to clients (milliseconds)')
+    serve_parser.add_argument('--pool-size', type=int, default=4,
+                             help='Warm gRPC channels kept open')
+    serve_parser.add_argument('--max-streams', type=int, default=256,
+                             help='Segment streams in flight across all sessions; later ones wait for a thread')
+    serve_parser.add_argument('--max-in-flight', type=int, default=0,
+                             help='Segment streams admitted at once across sessions by the fair scheduler '
+                                  '(0: no scheduling, every segment starts at once)')
+    serve_parser.add_argument('--tenant-weights', type=str, nargs='*', default=[],
+                             help='Scheduler shares as tenant=weight; unlisted tenants weigh 1')
+    serve_parser.add_argument('--interactive-reserve', type=int, default=1,
+                             help='Scheduler slots bulk sessions never take')
+    serve_parser.add_argument('--warmup-text', type=str, default='Hello.',
+                             help='Throwaway text synthesized per speaker at startup')
+    serve_parser.add_argument('--prompt-archive', type=str, nargs='*', default=[],
+                             help='Prompt archives (prompt_archive.py build), one per speaker, at --target-sr')
+    serve_parser.add_argument('--log-level', type=str, default='INFO', choices=['DEBUG', 'INFO', 'WARNING'],
+                             help='Per-chunk client logs are INFO; WARNING keeps them out of load tests')
+
+    bench_parser = subparsers.add_parser('bench', help='Load-test a running gateway',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    bench_parser.add_argument('--gateway', type=str, default=f'127.0.0.1:{DEFAULT_PORT}', help='Gateway host:port')
+    bench_parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16],
+                             help='Concurrent sessions per load level')
+    bench_parser.add_argument('--transport', type=str, default='http', choices=['http', 'ws'],
+                             help='HTTP chunked responses or WebSocket frames')
+    bench_parser.add_argument('--words-per-second', type=float, default=0.0,
+                             help='With ws, send the text word by word at this rate like an LLM (0: all at once)')
+    bench_parser.add_argument('--text', type=str, default=None, help='Text each session synthesizes')
+    bench_parser.add_argument('--tenant', type=str, default='default', help='Tenant the sessions belong to')
+    bench_parser.add_argument('--priority', type=str, default='interactive', choices=PRIORITY_CLASSES,
+                             help='Scheduling class of the sessions')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        try:
+            args.tenant_weights = parse_tenant_weights(args.tenant_weights)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.command == 'bench':
+        return asyncio.run(bench(args))
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+"""
+Tune --min-words/--max-words and segment concurrency against a target server.
+
+Replays a text corpus through synthesize_with_splitting() for every combination
+of split parameters and concurrency limit, against a configured server or an
+in-process Triton stand-in. Each run measures time to first audio, playback
+underruns (audio simulated to play from the first chunk), total time and RTF.
+The Pareto-optimal configurations are reported, and the recommended one is
+saved as JSON that client_grpc_simple.py loads with --split-config.
+
+Usage:
+# Tune against the local stand-in
+python3 tune_split.py --stand-in --corpus texts.txt --output split_config.json
+
+# Tune against a real server, then use the result
+python3 tune_split.py --server-addr localhost --model-name cosyvoice2 --output split_config.json
+python3 client_grpc_simple.py --split-config split_config.json --target-text "..."
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+import client_grpc_simple as tts
+from adaptive_concurrency import EndpointLimiters
+from audio_sinks import TimelineSink
+from model_introspection import DEFAULT_CACHE_PATH, ModelInfoCache, model_output_rate
+
+DEFAULT_CORPUS = [
+    'Hello, this is a test of the simulated streaming synthesis system. '
+    'It will split long text into smaller segments based on punctuation marks. '
+    'Each segment will be synthesized concurrently with a delay to simulate '
+    'real-time text generation from an LLM. The final audio will be combined '
+    'in the correct chronological order!',
+    'Thanks for calling. Your order shipped yesterday and should arrive on Friday, '
+    'although deliveries in your area are running about a day late this week. '
+    'Is there anything else I can help you with?',
+]
+
+
+def simulate_playout(events: List[Tuple[float, int]], sample_rate: int) -> Tuple[int, float]:
+    """
+    Play recorded writes back in real time from the first one.
+
+    Returns:
+        (underruns, total stall seconds); playback pauses on an underrun and resumes
+        when the next audio arrives
+    """
+    underruns = 0
+    stall_time = 0.0
+    playhead_end = None
+    for arrival, samples in events:
+        if playhead_end is None:
+            playhead_end = arrival
+        elif arrival > playhead_end:
+            underruns += 1
+            stall_time += arrival - playhead_end
+            playhead_end = arrival
+        playhead_end += samples / sample_rate
+    return underruns, stall_time
+
+
+async def run_config(args, text: str, min_words: int, max_words: int, concurrency: int) -> dict:
+    """Synthesize one corpus text with one configuration and measure it"""
+    run_args = argparse.Namespace(**vars(args))
+    run_args.min_words = min_words
+    run_args.max_words = max_words
+    sink = TimelineSink(args.target_sr)
+    limiters = EndpointLimiters(initial_limit=concurrency, min_limit=concurrency, max_limit=concurrency)
+    start_time = time.time()
+    sink.start_time = start_time
+    _, total_time, stats = await tts.synthesize_with_splitting(
+        run_args, args.waveform, args.reference_text, text, args.sample_rate,
+        simulate_llm_delay=args.simulate_llm_delay,
+        sink=sink,
+        limiters=limiters,
+    )
+    duration = sink.samples_written / args.target_sr
+    underruns, stall_time = simulate_playout(sink.events, args.target_sr)
+    return {
+        'ttfb': sink.time_to_first_byte,
+        'underruns': underruns,
+        'stall_time': stall_time,
+        'total_time': total_time,
+        'rtf': total_time / duration if duration else None,
+        'segments': stats['num_segments'],
+    }
+
+
+def pareto_front(results: List[dict], objectives=('ttfb', 'underruns', 'rtf')) -> List[dict]:
+    """Configurations not dominated on any of the (minimized) objectives"""
+    front = []
+    for candidate in results:
+        dominated = any(
+            all(other[key] <= candidate[key] for key in objectives)
+            and any(other[key] < candidate[key] for key in objectives)
+            for other in results if other is not candidate
+        )
+        if not dominated:
+            front.append(candidate)
+    return front
+
+
+def recommend(front: List[dict], ttfb_tolerance: float = 0.05) -> dict:
+    """Fewest underruns, then lowest RTF among configurations within `ttfb_tolerance` of the best TTFB"""
+    fewest_underruns = min(r['underruns'] for r in front)
+    candidates = [r for r in front if r['underruns'] == fewest_underruns]
+    best_ttfb = min(r['ttfb'] for r in candidates)
+    return min((r for r in candidates if r['ttfb'] <= best_ttfb + ttfb_tolerance), key=lambda r: r['rtf'])
+
+
+async def tune(args) -> dict:
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f:
+            corpus = [line.strip() for line in f if line.strip()]
+
+    results = []
+    grid = [
+        (min_words, max_words, concurrency)
+        for min_words, max_words, concurrency in itertools.product(args.min_words, args.max_words, args.concurrency)
+        if min_words <= max_words
+    ]
+    for index, (min_words, max_words, concurrency) in enumerate(grid, 1):
+        runs = []
+        for _ in range(args.repeats):
+            for text in corpus:
+                runs.append(await run_config(args, text, min_words, max_words, concurrency))
+        runs = [run for run in runs if run['ttfb'] is not None and run['rtf'] is not None]
+        if not runs:
+            logging.error(f"min_words={min_words} max_words={max_words} concurrency={concurrency}: no audio")
+            continue
+        result = {
+            'min_words': min_words,
+            'max_words': max_words,
+            'concurrency': concurrency,
+            'ttfb': float(np.mean([run['ttfb'] for run in runs])),
+            'underruns': float(np.mean([run['underruns'] for run in runs])),
+            'stall_time': float(np.mean([run['stall_time'] for run in runs])),
+            'total_time': float(np.mean([run['total_time'] for run in runs])),
+            'rtf': float(np.mean([run['rtf'] for run in runs])),
+        }
+        results.append(result)
+        print(f"[{index}/{len(grid)}] min {min_words:>2} max {max_words:>2} concurrency {concurrency:>2}: "
+              f"TTFB {result['ttfb']:.3f}s, underruns {result['underruns']:.1f} "
+              f"({result['stall_time']:.2f}s stalled), total {result['total_time']:.2f}s, "
+              f"RTF {result['rtf']:.3f}", flush=True)
+
+    front = pareto_front(results)
+    best = recommend(front, args.ttfb_tolerance)
+    return {
+        'server': f"{args.server_addr}:{args.server_port}",
+        'model_name': args.model_name,
+        'recommended': {key: best[key] for key in ('min_words', 'max_words', 'concurrency')},
+        'pareto_front': front,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Sweep split parameters and concurrency, recommend the Pareto-optimal configuration',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='localhost', help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--stand-in', action='store_true',
+                       help='Tune against an in-process Triton stand-in instead of the server')
+    parser.add_argument('--model-name', type=str, default='cosyvoice2', help='Model name')
+    parser.add_argument('--reference-audio', type=str, default=None,
+                       help='Reference audio (omit to use the server spk2info cache)')
+    parser.add_argument('--reference-text', type=str, default='', help='Transcript of the reference audio')
+    parser.add_argument('--target-sr', type=int, default=None,
+                       help='Model output sample rate (default: probed from the model)')
+    parser.add_argument('--model-cache', type=str, default=DEFAULT_CACHE_PATH,
+                       help='File caching model probe results')
+    parser.add_argument('--chunk-overlap-duration', type=float, default=0.1,
+                       help='Chunk overlap duration for streaming (seconds)')
+    parser.add_argument('--corpus', type=str, default=None, help='Text file, one utterance per line')
+    parser.add_argument('--min-words', type=int, nargs='+', default=[3, 5, 10], help='min_words values to try')
+    parser.add_argument('--max-words', type=int, nargs='+', default=[10, 20, 30], help='max_words values to try')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[2, 4, 8],
+                       help='Concurrent segment streams to try')
+    parser.add_argument('--repeats', type=int, default=1, help='Runs per configuration and text')
+    parser.add_argument('--simulate-llm-delay', action='store_true',
+                       help='Delay segment launches like an LLM producing the text')
+    parser.add_argument('--ttfb-tolerance', type=float, default=0.05,
+                       help='TTFB differences below this are treated as noise when recommending (seconds)')
+    parser.add_argument('--output', type=str, default='split_config.json', help='Where to save the result')
+    args = parser.parse_args()
+
+    args.use_spk2info_cache = not args.reference_audio
+    args.waveform, args.sample_rate = None, 16000
+    if args.reference_audio:
+        args.waveform, args.sample_rate = tts.load_audio(args.reference_audio, target_sample_rate=16000)
+
+    stand_in = None
+    if args.stand_in:
+        from triton_stand_in import StandInServer
+        stand_in = StandInServer().start()
+        args.server_addr, args.server_port = '127.0.0.1', stand_in.port
+    if args.target_sr is None:
+        args.target_sr = model_output_rate(
+            ModelInfoCache(args.model_cache), f"{args.server_addr}:{args.server_port}", args.model_name)
+        if args.target_sr is None:
+            if stand_in:
+                stand_in.stop()
+            parser.error(f"unknown output rate of {args.model_name}; pass --target-sr")
+    # Per-segment client logs would drown the sweep progress
+    logging.getLogger().setLevel(logging.ERROR)
+    try:
+        report = asyncio.run(tune(args))
+    finally:
+        if stand_in:
+            stand_in.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nPareto front ({len(report['pareto_front'])} of {len(report['results'])} configurations):")
+    for result in sorted(report['pareto_front'], key=lambda r: r['ttfb']):
+        print(f"  min {result['min_words']:>2} max {result['max_words']:>2} "
+              f"concurrency {result['concurrency']:>2}: TTFB {result['ttfb']:.3f}s, "
+              f"underruns {result['underruns']:.1f}, RTF {result['rtf']:.3f}")
+    print(f"Recommended: {report['recommended']} (saved to {args.output})")
+
+
+if __name__ == "__main__":
+    main()
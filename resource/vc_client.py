@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""
+Streaming voice conversion client for Triton.
+
+lib/triton-vc-client.ts uploads a whole recording in one request, so nothing
+comes back until the recording is finished and the model has converted all of
+it. StreamingVoiceConverter instead sends the source audio in fixed-size chunks
+over one ModelStreamInfer stream, as the audio is captured. The chunks are one
+Triton sequence: the first carries the target voice (reference_wav or
+preset_voice) and sequence_start, and the last carries sequence_end. Converted
+chunks are put back in capture order by request id, reconstructed, resampled
+and written to a sink while the rest is still uploading. Latency then depends
+on the chunk size, not the recording length.
+
+Connection handling (TritonClientPool, channel profiles), response callback,
+chunk reconstruction, resampling and sinks are shared with client_grpc_simple.py.
+
+Usage:
+# Convert a recording, paced as if captured live, in 500 ms chunks
+python3 vc_client.py --server-addr localhost --model-name seed_vc \\
+    --source-audio recording.wav --reference-audio target_voice.wav --output-path converted.wav
+
+# Upload the whole recording in one request instead, as the TypeScript client does
+python3 vc_client.py --model-name seed_vc --source-audio recording.wav --whole
+"""
+
+import argparse
+import functools
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+import soundfile as sf
+import tritonclient.grpc as grpcclient_sync
+from tritonclient.utils import InferenceServerException
+
+from audio_sinks import SINK_FORMATS, open_sink
+from channel_profiles import parse_channel_profile
+from client_grpc_simple import (
+    ChunkReconstructor, SegmentBuffer, TritonClientPool, UserData, callback, decode_waveform_chunk, load_audio,
+)
+from model_introspection import DEFAULT_CACHE_PATH, ModelInfoCache, accepts_reference
+from telephony import StreamingResampler
+
+SOURCE_SAMPLE_RATE = 16000
+
+
+def capture_chunks(path: str, chunk_ms: int = 500, realtime: bool = True) -> Iterator[Tuple[np.ndarray, bool]]:
+    """
+    Source audio as it would be captured: 16 kHz chunks of chunk_ms, each flagged if last.
+
+    With realtime, a chunk is yielded only once its last sample would have been
+    recorded, so upload and conversion overlap with capture as they would live.
+    """
+    with sf.SoundFile(path) as source:
+        block = source.samplerate * chunk_ms // 1000
+        resampler = StreamingResampler(source.samplerate, SOURCE_SAMPLE_RATE)
+        start = time.time()
+        captured = 0
+        for samples in source.blocks(blocksize=block, dtype='float32', always_2d=True):
+            captured += len(samples)
+            if realtime:
+                time.sleep(max(start + captured / source.samplerate - time.time(), 0.0))
+            # The file length is known, so the last chunk is flagged without waiting for another
+            last = captured >= source.frames
+            chunk = resampler.process(samples[:, 0])
+            yield (np.concatenate([chunk, resampler.flush()]) if last else chunk), last
+
+
+class StreamingVoiceConverter:
+    """
+    One recording converted over one stream, one request per captured chunk.
+
+    Responses may arrive out of order across requests. They are held per chunk
+    index and released in capture order as soon as every earlier chunk has
+    completed.
+    """
+    def __init__(
+        self,
+        client: grpcclient_sync.InferenceServerClient,
+        model_name: str,
+        model_rate: int,
+        output_rate: int,
+        on_audio: Callable[[np.ndarray], None],
+        reference: np.ndarray = None,
+        preset_voice: str = None,
+        cross_fade_samples: int = 0,
+    ):
+        self.client = client
+        self.model_name = model_name
+        self.on_audio = on_audio
+        self.reference = reference
+        self.preset_voice = preset_voice
+        self.sequence_id = random.getrandbits(63) or 1
+        self.user_data = UserData()
+        self.reconstructor = ChunkReconstructor(SegmentBuffer(model_rate * 10), cross_fade_samples)
+        self.resampler = StreamingResampler(model_rate, output_rate) if model_rate != output_rate else None
+        self._lock = threading.Lock()
+        self._sent_at = []
+        self._held = {}
+        self._completed = set()
+        self._next = 0
+        self._last_sent = False
+        self._done = threading.Event()
+        self.error = None
+        # chunk index -> seconds from its upload to its first converted audio
+        self.latencies = {}
+        self.finished_at = None
+        self._receiver = threading.Thread(target=self._receive, name='vc-receive', daemon=True)
+
+    def start(self):
+        self.client.start_stream(callback=functools.partial(callback, self.user_data))
+        self.user_data.record_start_time()
+        self._receiver.start()
+
+    def send(self, chunk: np.ndarray, last: bool = False) -> bool:
+        """
+        Upload one captured 16 kHz chunk; the first carries the voice, the last ends the sequence.
+
+        Returns False once the stream has failed; the chunk is not sent and finish() reports the error.
+        """
+        if self.error is not None:
+            return False
+        with self._lock:
+            index = len(self._sent_at)
+            self._sent_at.append(time.time())
+            self._last_sent = last
+        source = np.asarray(chunk, dtype=np.float32).reshape(1, -1)
+        inputs = [
+            grpcclient_sync.InferInput('source_wav', source.shape, 'FP32'),
+            grpcclient_sync.InferInput('source_wav_len', [1, 1], 'INT32'),
+        ]
+        inputs[0].set_data_from_numpy(source)
+        inputs[1].set_data_from_numpy(np.array([[source.shape[1]]], dtype=np.int32))
+        if index == 0 and self.reference is not None:
+            reference = np.asarray(self.reference, dtype=np.float32).reshape(1, -1)
+            inputs.append(grpcclient_sync.InferInput('reference_wav', reference.shape, 'FP32'))
+            inputs[-1].set_data_from_numpy(reference)
+            inputs.append(grpcclient_sync.InferInput('reference_wav_len', [1, 1], 'INT32'))
+            inputs[-1].set_data_from_numpy(np.array([[reference.shape[1]]], dtype=np.int32))
+        elif index == 0 and self.preset_voice:
+            inputs.append(grpcclient_sync.InferInput('preset_voice', [1, 1], 'BYTES'))
+            inputs[-1].set_data_from_numpy(np.array([[self.preset_voice]], dtype=object))
+        try:
+            self.client.async_stream_infer(
+                self.model_name,
+                inputs,
+                request_id=f"vc-{self.sequence_id}-{index}",
+                outputs=[grpcclient_sync.InferRequestedOutput('waveform')],
+                sequence_id=self.sequence_id,
+                sequence_start=index == 0,
+                sequence_end=last,
+                enable_empty_final_response=True,
+            )
+        except InferenceServerException as e:
+            # The stream already failed (its error may not have reached the receiver yet)
+            self.error = self.error or e
+            return False
+        return True
+
+    def _emit(self, index: int, samples: np.ndarray):
+        if index not in self.latencies:
+            self.latencies[index] = time.time() - self._sent_at[index]
+        finalized = self.reconstructor.push(samples)
+        self.on_audio(self.resampler.process(finalized) if self.resampler else finalized)
+
+    def _receive(self):
+        last_activity = time.time()
+        while True:
+            try:
+                result = self.user_data._completed_requests.get(timeout=1.0)
+            except queue.Empty:
+                if self.error is not None:
+                    # send() found the stream broken
+                    break
+                with self._lock:
+                    # Only outstanding requests count towards the timeout, not a capture still in progress
+                    waiting = self._next < len(self._sent_at)
+                    last_activity = max(last_activity, self._sent_at[-1] if self._sent_at else 0.0)
+                if waiting and time.time() - last_activity > 30:
+                    self.error = InferenceServerException("timed out waiting for converted audio")
+                    break
+                continue
+            last_activity = time.time()
+            if isinstance(result, InferenceServerException):
+                self.error = result
+                break
+            response = result.get_response()
+            index = int(response.id.rsplit('-', 1)[1])
+            with self._lock:
+                if response.parameters['triton_final_response'].bool_param:
+                    self._completed.add(index)
+                else:
+                    chunk = decode_waveform_chunk(response)
+                    if index == self._next:
+                        self._emit(index, chunk)
+                    else:
+                        self._held.setdefault(index, []).append(chunk)
+                # Release later chunks that were waiting on this one
+                while self._next in self._completed:
+                    self._completed.discard(self._next)
+                    self._next += 1
+                    for chunk in self._held.pop(self._next, []):
+                        self._emit(self._next, chunk)
+                if self._last_sent and self._next == len(self._sent_at):
+                    self.finished_at = time.time()
+                    break
+        self._done.set()
+
+    def finish(self, timeout: float = None) -> dict:
+        """Wait for the last converted chunk, flush the pipeline and close the stream"""
+        self._done.wait(timeout)
+        self.client.stop_stream(cancel_requests=self.error is not None)
+        if self.error is None:
+            tail = self.reconstructor.finish()
+            tail = self.resampler.process(tail) if self.resampler else tail
+            if self.resampler:
+                tail = np.concatenate([tail, self.resampler.flush()])
+            self.on_audio(tail)
+        latencies = np.asarray(list(self.latencies.values())) if self.latencies else np.zeros(1)
+        return {
+            'chunks': len(self._sent_at),
+            'error': str(self.error) if self.error else None,
+            'first_output_latency': self.user_data.get_first_chunk_latency(),
+            'mean_chunk_latency': float(latencies.mean()),
+            'p95_chunk_latency': float(np.percentile(latencies, 95)),
+            'max_chunk_latency': float(latencies.max()),
+            # From the end of capture (last chunk sent) to the last converted sample
+            'tail_latency': (self.finished_at - self._sent_at[-1]) if self.finished_at and self._sent_at else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Streaming voice conversion: upload source audio in chunks as it is captured',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--server-addr', type=str, default='speechlab-tunnel.southeastasia.cloudapp.azure.com',
+                       help='Server address')
+    parser.add_argument('--server-port', type=int, default=8001, help='Server gRPC port')
+    parser.add_argument('--model-name', type=str, required=True,
+                       help='Voice conversion model name (a model with a source_wav input, e.g. seed_vc)')
+    parser.add_argument('--source-audio', type=str, required=True, help='Recording to convert')
+    parser.add_argument('--reference-audio', type=str, default=None,
+                       help='Target voice sample (omit to use --preset-voice)')
+    parser.add_argument('--preset-voice', type=str, default='default',
+                       help='Server-side voice used when no reference audio is given')
+    parser.add_argument('--chunk-ms', type=int, default=500, help='Source chunk size in milliseconds')
+    parser.add_argument('--no-realtime', action='store_true',
+                       help='Send chunks as fast as the file is read instead of at capture pace')
+    parser.add_argument('--whole', action='store_true',
+                       help='Upload the whole recording in one request after capture (for comparison)')
+    parser.add_argument('--cross-fade-ms', type=float, default=0.0,
+                       help='Cross-fade between converted chunks, for models that return overlapping chunks')
+    parser.add_argument('--target-sr', type=int, default=None, help='Output sample rate (default: the model\'s)')
+    parser.add_argument('--output-path', type=str, default='converted.wav', help='Output audio file path')
+    parser.add_argument('--output-format', type=str, default='wav16', choices=list(SINK_FORMATS),
+                       help='Output encoding')
+    parser.add_argument('--channel-profile', type=str, default=None,
+                       help='gRPC channel profile (default, tunnel, lan), as in client_grpc_simple.py')
+    parser.add_argument('--model-cache', type=str, default=DEFAULT_CACHE_PATH, help='Model info cache file')
+    args = parser.parse_args()
+
+    server_url = f"{args.server_addr}:{args.server_port}"
+    try:
+        channel_profile = parse_channel_profile(args.channel_profile) if args.channel_profile else None
+    except ValueError as e:
+        parser.error(str(e))
+    info = ModelInfoCache(args.model_cache).get(server_url, args.model_name)
+    if 'source_wav' not in info['inputs']:
+        logging.error(f"{args.model_name} takes no source_wav input; it is not a voice conversion model")
+        return
+    model_rate = info['sample_rate'] or 24000
+    output_rate = args.target_sr or model_rate
+    reference = None
+    if args.reference_audio:
+        if not accepts_reference(info):
+            parser.error(f"{args.model_name} takes no reference_wav; use --preset-voice")
+        reference, _ = load_audio(args.reference_audio, target_sample_rate=SOURCE_SAMPLE_RATE)
+    preset_voice = args.preset_voice if 'preset_voice' in info['inputs'] else None
+
+    pool = TritonClientPool(server_url, channel_profile=channel_profile)
+    client = pool.acquire()
+    sink = open_sink(args.output_path, args.output_format, output_rate)
+    converter = StreamingVoiceConverter(
+        client, args.model_name, model_rate, output_rate, sink.write,
+        reference=reference, preset_voice=preset_voice,
+        cross_fade_samples=int(args.cross_fade_ms * model_rate / 1000),
+    )
+    converter.start()
+    chunks = capture_chunks(args.source_audio, args.chunk_ms, realtime=not args.no_realtime)
+    source_samples = 0
+    if args.whole:
+        captured = np.concatenate([chunk for chunk, _ in chunks])
+        source_samples = len(captured)
+        converter.send(captured, last=True)
+    else:
+        for chunk, last in chunks:
+            source_samples += len(chunk)
+            if not converter.send(chunk, last):
+                break
+    stats = converter.finish()
+    sink.close()
+    if stats['error']:
+        pool.discard(client)
+    else:
+        pool.release(client)
+    pool.close()
+
+    logging.info(f"\n{'='*60}")
+    if stats['error']:
+        logging.error(f"Conversion failed: {stats['error']}")
+        return
+    logging.info("✓ Voice conversion completed")
+    logging.info(f"{'='*60}")
+    logging.info(f"  Source: {source_samples / SOURCE_SAMPLE_RATE:.2f}s, sent as {stats['chunks']} "
+                 f"{'request' if args.whole else f'{args.chunk_ms} ms chunks'}")
+    logging.info(f"  Output: {sink.samples_written / output_rate:.2f}s at {output_rate} Hz -> {args.output_path}")
+    logging.info(f"  First converted audio: {stats['first_output_latency']:.3f}s after capture started")
+    logging.info(f"  Chunk latency (sent -> converted, in order): mean {stats['mean_chunk_latency']:.3f}s, "
+                 f"p95 {stats['p95_chunk_latency']:.3f}s, max {stats['max_chunk_latency']:.3f}s")
+    logging.info(f"  Tail latency (end of capture -> last converted sample): {stats['tail_latency']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()